@@ -1,15 +1,43 @@
+import numpy as np
 import pandas as pd
-from typing import Dict, Any, List, Set
-from utils import safe_rate
+from typing import Dict, Any, Iterator, List, Set, Tuple
+from utils import safe_rate_series, combined_series, combine_causes_frame
+from llm_dispatcher import LLMDispatcher, LLMJob, SUMMARY, CHEF_FEEDBACK
+from llm import generate_cluster_llm_prompt
+from feedback_sanitizer import sanitize_record_feedback
+from instrumentation import timed
+from analysis_cache import AnalysisResultCache, record_fingerprints, context_fingerprint
+from supplier_scorecard import supplier_scorecard, scorecard_metrics, expiry_flags
+from timeseries_detection import timeseries_scores, Baselines, TS_COLUMNS
 from config import (
-    STATION_MULT, SHIFT_MULT, PEAK_MULT, HOT_TEMP, HOT_MULT, COLD_TEMP, 
-    SUPPLIER_MULT, REPEATED_EXPIRY_COUNT, BRANCH_COLUMN
+    EXPECTED_THRESHOLD, RATE_THRESHOLD, STATION_MULT, SHIFT_MULT, PEAK_MULT, HOT_TEMP, HOT_MULT, COLD_TEMP,
+    BRANCH_COLUMN, ANALYZE_STREAM_BATCH_SIZE, DETECTION_MODE, TS_MIN_HISTORY, COST_CRITICAL_THRESHOLD,
+    COST_IGNORE_THRESHOLD, LLM_SUMMARY_GROUPING, LLM_SUMMARY_GROUP_COLUMNS
 )
 
+DETECTION_MODES = ("static", "timeseries")
+# Columns written by analysis_and_llm_node / the router, in the order the graph adds them.
+FLAG_COLUMNS = [
+    "Waste_Deviation_Flag", "High_Waste_Flag", "Combined_Flag", "Expiry_Flag",
+    "Station_Inefficiency", "Shift_Issue", "Peak_Pressure_Issue", "Heat_Spoilage_Flag",
+    "Cold_Overprep_Flag", "Supplier_Quality_Issue", "Supplier_Rotation_Issue", "Root_Causes",
+]
+LLM_COLUMNS = ["LLM_Prompt", "LLM_Summary", "Chef_Feedback_Prompt", "Chef_Feedback_Summary", "Status"]
+OUTPUT_COLUMNS = ["Waste Rate"] + FLAG_COLUMNS + LLM_COLUMNS
+# Columns summary_cluster_prompts reads
+CLUSTER_COLUMNS = set(LLM_SUMMARY_GROUP_COLUMNS) | {"Date", "Waste Rate", "Wastage Qty", "Expected Waste Qty",
+                                                   "Wastage Cost", "Supplier Name"}
+# Shared summary prompt of each row (assign_summary_clusters); "" = own prompt
+SUMMARY_CLUSTER_COLUMN = "Summary_Cluster_Prompt"
+# Columns of the /analyze response, in order
+RESPONSE_COLUMNS = [
+    'ID', 'Date', 'Time', 'Weekday', 'Recipe', 'Ingredient',
+    'Kitchen Station', 'Branch', 'Branch Manager', 'Chef',
+    'Status', 'Chef_Feedback_Summary'
+]
+
 def calculate_branch_metrics(df_branch: pd.DataFrame) -> Dict[str, Any]:
-    df_branch["Waste Rate"] = df_branch.apply(
-        lambda r: safe_rate(r.get("Wastage Qty"), r.get("Planned Qty")), axis=1
-    )
+    df_branch["Waste Rate"] = safe_rate_series(df_branch["Wastage Qty"], df_branch["Planned Qty"])
     mask_planned = df_branch["Planned Qty"].notna() & (df_branch["Planned Qty"] > 0)
     
     metrics = {}
@@ -17,8 +45,8 @@ def calculate_branch_metrics(df_branch: pd.DataFrame) -> Dict[str, Any]:
     metrics['branch_avg'] = branch_avg
     overall_avg = branch_avg
     
-    metrics['station_avg_map'] = df_branch.loc[mask_planned].groupby("Kitchen Station")["Waste Rate"].mean().fillna(0).to_dict() if "Kitchen Station" in df_branch.columns else {}
-    metrics['shift_avg_map'] = df_branch.loc[mask_planned].groupby("Shift")["Waste Rate"].mean().fillna(0).to_dict() if "Shift" in df_branch.columns else {}
+    metrics['station_avg_map'] = df_branch.loc[mask_planned].groupby("Kitchen Station", observed=True)["Waste Rate"].mean().fillna(0).to_dict() if "Kitchen Station" in df_branch.columns else {}
+    metrics['shift_avg_map'] = df_branch.loc[mask_planned].groupby("Shift", observed=True)["Waste Rate"].mean().fillna(0).to_dict() if "Shift" in df_branch.columns else {}
     
     if "Peak Hour Flag" in df_branch.columns:
         nonpeak_mask = (~df_branch["Peak Hour Flag"].astype(bool)) & mask_planned
@@ -34,52 +62,325 @@ def calculate_branch_metrics(df_branch: pd.DataFrame) -> Dict[str, Any]:
     
     metrics['sales_med'] = df_branch["Sales Qty"].median() if "Sales Qty" in df_branch.columns else None
     
-    if "Supplier Name" in df_branch.columns:
-        supplier_avg = df_branch.loc[mask_planned].groupby("Supplier Name")["Waste Rate"].mean().fillna(0)
-        bad_quality_suppliers = supplier_avg[supplier_avg > (overall_avg * SUPPLIER_MULT)].index.tolist()
-        metrics['bad_quality_suppliers_list'] = bad_quality_suppliers
-        
-        df_temp = df_branch.copy()
-        df_temp["Expiry_Flag"] = False
-        if "Date" in df_temp.columns and "Expiry Date" in df_temp.columns:
-            date_col = pd.to_datetime(df_temp["Date"], errors='coerce').dt.normalize()
-            expiry_col = pd.to_datetime(df_temp["Expiry Date"], errors='coerce').dt.normalize()
-            df_temp["Expiry_Flag"] = date_col > expiry_col
-        expiry_counts = df_temp.groupby("Supplier Name")["Expiry_Flag"].sum()
-        supplier_total = df_temp.groupby("Supplier Name")["Expiry_Flag"].size()
-        
-        supplier_rotation_history = set()
-        for sup in expiry_counts.index:
-            cnt = int(expiry_counts.get(sup, 0))
-            total = int(supplier_total.get(sup, 0))
-            prop = (cnt / total) if total and total > 0 else 0
-            if (cnt >= REPEATED_EXPIRY_COUNT) or (prop > 0.2):
-                supplier_rotation_history.add(sup)
-        
-        metrics['supplier_rotation_history_set'] = supplier_rotation_history
-    else:
-        metrics['bad_quality_suppliers_list'] = []
-        metrics['supplier_rotation_history_set'] = set()
+    card = supplier_scorecard(df_branch, branch_avg=overall_avg, waste_rate=df_branch["Waste Rate"])
+    metrics.update(scorecard_metrics(card))
     
     return metrics
 
-def run_branch_analysis(df: pd.DataFrame, branch_name: str, app) -> pd.DataFrame:
+def score_timeseries(df_branch: pd.DataFrame, ts_baselines: Baselines = None) -> pd.DataFrame:
+    """
+    In the "timeseries" DETECTION_MODE, adds the TS_COLUMNS of every row,
+    scored against `ts_baselines` (history before the frame) and the earlier
+    rows of the frame. Runs before the result cache lookup and before any
+    batching, so a row's scores never depend on which rows it is analyzed
+    with, and they are part of its cache fingerprint. No-op in "static" mode
+    or when the frame is already scored.
+    """
+    if DETECTION_MODE not in DETECTION_MODES:
+        raise ValueError(f"Unknown DETECTION_MODE '{DETECTION_MODE}' (expected one of {', '.join(DETECTION_MODES)})")
+    if DETECTION_MODE != "timeseries" or TS_COLUMNS[-1] in df_branch.columns:
+        return df_branch
+    with timed("timeseries", rows=len(df_branch)):
+        df_branch[TS_COLUMNS] = timeseries_scores(df_branch, baselines=ts_baselines)
+    return df_branch
+
+def assign_summary_clusters(df_branch: pd.DataFrame, branch_metrics: Dict[str, Any]) -> pd.DataFrame:
+    """
+    With LLM_SUMMARY_GROUPING, adds SUMMARY_CLUSTER_COLUMN: the prompt a
+    flagged row shares with the rest of its root-cause cluster in the frame
+    (summary_cluster_prompts). Like score_timeseries it runs over the whole
+    branch frame, before the result cache lookup and before any batching, so
+    a row's summary never depends on which rows it is analyzed with and its
+    cluster prompt is part of its cache fingerprint. No-op when grouping is
+    off or the frame already has the column.
+    """
+    if not LLM_SUMMARY_GROUPING or SUMMARY_CLUSTER_COLUMN in df_branch.columns:
+        return df_branch
+    with timed("summary_groups", rows=len(df_branch)):
+        flagged = detect_branch_flags(df_branch.copy(), branch_metrics)
+        flagged = flagged[(flagged["Combined_Flag"] != "None") | (flagged["Root_Causes"] != "None")]
+        prompts = summary_cluster_prompts(flagged, branch_metrics.get("branch_avg", 0.0))
+        df_branch[SUMMARY_CLUSTER_COLUMN] = prompts.reindex(df_branch.index, fill_value="")
+    return df_branch
+
+def _column(df: pd.DataFrame, name: str) -> pd.Series:
+    if name in df.columns:
+        return df[name]
+    return pd.Series(None, index=df.index, dtype=object)
+
+def detect_branch_flags(df_branch: pd.DataFrame, metrics: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Columnar equivalent of graph_nodes.detect_record_flags: computes the waste
+    and root-cause flags for every row of the branch frame in one pass.
+    """
+    branch_avg = metrics.get("branch_avg", 0.0)
+    nonpeak_rate = metrics.get("nonpeak_rate", 0.0)
+    moderate_temp_rate = metrics.get("moderate_temp_rate", 0.0)
+    sales_med = metrics.get("sales_med", 0.0)
+    station_avg_map: Dict[str, float] = metrics.get("station_avg_map", {})
+    shift_avg_map: Dict[str, float] = metrics.get("shift_avg_map", {})
+    bad_quality_suppliers_list: List[str] = metrics.get("bad_quality_suppliers_list", [])
+    supplier_rotation_history_set: Set[str] = metrics.get("supplier_rotation_history_set", set())
+    overall_avg = branch_avg
+
+    out = df_branch
+    wastage_qty = pd.to_numeric(_column(out, "Wastage Qty"), errors='coerce')
+    expected_qty = pd.to_numeric(_column(out, "Expected Waste Qty"), errors='coerce')
+    rate = safe_rate_series(wastage_qty, _column(out, "Planned Qty"))
+    out["Waste Rate"] = rate
+
+    # --- Waste Detection ---
+    out["Waste_Deviation_Flag"] = wastage_qty > expected_qty * EXPECTED_THRESHOLD
+    out["High_Waste_Flag"] = rate > (branch_avg * RATE_THRESHOLD if branch_avg > 0 else 0.0)
+    out = score_timeseries(out)
+    if "TS_Anomaly_Flag" in out.columns:
+        # Series with enough history are judged against it, the others keep the static flag
+        out["High_Waste_Flag"] = out["High_Waste_Flag"].where(out["TS_History"] < TS_MIN_HISTORY,
+                                                              out["TS_Anomaly_Flag"])
+    out["Combined_Flag"] = combined_series(out["Waste_Deviation_Flag"], out["High_Waste_Flag"])
+
+    # --- Root Cause Flags ---
+    out["Expiry_Flag"] = expiry_flags(out)
+
+    out["Station_Inefficiency"] = (
+        _column(out, "Kitchen Station").astype(object).map(station_avg_map) > overall_avg * STATION_MULT
+    ).astype(bool)
+    out["Shift_Issue"] = (_column(out, "Shift").astype(object).map(shift_avg_map) > overall_avg * SHIFT_MULT).astype(bool)
+
+    peak = _column(out, "Peak Hour Flag").fillna(False).astype(bool) if "Peak Hour Flag" in out.columns \
+        else pd.Series(False, index=out.index)
+    out["Peak_Pressure_Issue"] = peak & (nonpeak_rate > 0) & (rate > nonpeak_rate * PEAK_MULT)
+
+    temp = pd.to_numeric(_column(out, "Temperature (°C)"), errors='coerce')
+    sales = pd.to_numeric(_column(out, "Sales Qty"), errors='coerce')
+    out["Heat_Spoilage_Flag"] = (temp > HOT_TEMP) & (rate > moderate_temp_rate * HOT_MULT)
+    if sales_med is not None:
+        out["Cold_Overprep_Flag"] = (temp <= COLD_TEMP) & (sales < sales_med) & (rate > overall_avg * 1.3)
+    else:
+        out["Cold_Overprep_Flag"] = False
+
+    supplier = _column(out, "Supplier Name")
+    out["Supplier_Quality_Issue"] = supplier.isin(bad_quality_suppliers_list)
+    out["Supplier_Rotation_Issue"] = supplier.isin(supplier_rotation_history_set) & out["High_Waste_Flag"]
+
+    out["Root_Causes"] = combine_causes_frame(out)
+    return out
+
+def route_statuses(df_branch: pd.DataFrame) -> pd.Series:
+    """
+    Columnar equivalent of graph_nodes.status_router_node over flagged rows
+    (detect_branch_flags output): "N/A (No Issue)" for rows the graph gives
+    no LLM prompt, else Ignore / Approved by Manager / Pending.
+    """
+    cost = pd.to_numeric(_column(df_branch, "Wastage Cost"), errors='coerce')
+    wastage_qty = pd.to_numeric(_column(df_branch, "Wastage Qty"), errors='coerce')
+    expected_qty = pd.to_numeric(_column(df_branch, "Expected Waste Qty"), errors='coerce')
+    causes = df_branch["Root_Causes"]
+    num_causes = causes.str.count(";").add(1).where(causes != "None", 0)
+    has_prompt = (df_branch["Combined_Flag"] != "None") | (causes != "None")
+
+    ignore = (cost < COST_IGNORE_THRESHOLD) | (wastage_qty <= expected_qty)
+    critical = (cost >= COST_CRITICAL_THRESHOLD) | (num_causes > 1)
+    status = np.select([~has_prompt, ignore, critical], ["N/A (No Issue)", "Ignore", "Approved by Manager"],
+                       default="Pending")
+    return pd.Series(status, index=df_branch.index, dtype=object)
+
+def run_branch_analysis(df: pd.DataFrame, branch_name: str, app, dispatcher: LLMDispatcher = None,
+                        branch_metrics: Dict[str, Any] = None, result_cache: AnalysisResultCache = None,
+                        ts_baselines: Baselines = None) -> pd.DataFrame:
+    """
+    Runs detection + the LangGraph workflow over one branch. `branch_metrics`
+    overrides the metrics computed from `df` itself (e.g. a multi-month
+    window from metrics_store.MetricsStore.branch_metrics). With a
+    `result_cache`, rows whose inputs and scoring context are unchanged since
+    the last run reuse their stored outputs and skip the pipeline.
+    `ts_baselines` is the series history for the "timeseries" DETECTION_MODE.
+    """
     df_branch = df[df[BRANCH_COLUMN] == branch_name].copy().reset_index(drop=True)
     
     if df_branch.empty:
         return pd.DataFrame()
     
-    branch_metrics = calculate_branch_metrics(df_branch)
-    
-    all_results = []
-    for index, record_series in df_branch.iterrows():
-        record = record_series.to_dict()
-        initial_state = {
-            "record": record,
-            "branch_metrics": branch_metrics,
-            "status": ""
+    if branch_metrics is None:
+        with timed("metrics", rows=len(df_branch)):
+            branch_metrics = calculate_branch_metrics(df_branch)
+    df_branch = score_timeseries(df_branch, ts_baselines)
+    df_branch = assign_summary_clusters(df_branch, branch_metrics)
+
+    if result_cache is None:
+        return _analyze_rows(df_branch, branch_metrics, app, dispatcher)
+
+    record_fps, context_fp, cached = lookup_cached_outputs(df_branch, branch_metrics, result_cache)
+    todo = df_branch.index.difference(list(cached))
+    analyzed = None
+    if len(todo):
+        rows = df_branch if len(todo) == len(df_branch) else df_branch.loc[todo].copy()
+        analyzed = _analyze_rows(rows, branch_metrics, app, dispatcher)
+        result_cache.store(analyzed, record_fps, context_fp, OUTPUT_COLUMNS)
+    return merge_cached_outputs(df_branch, cached, analyzed)
+
+def lookup_cached_outputs(df_branch: pd.DataFrame, branch_metrics: Dict[str, Any],
+                          result_cache: AnalysisResultCache) -> Tuple[pd.Series, str, Dict[Any, Dict[str, Any]]]:
+    """(record fingerprints, context fingerprint, index label -> stored outputs) for one branch frame."""
+    with timed("result_cache", rows=len(df_branch)):
+        record_fps = record_fingerprints(df_branch)
+        context_fp = context_fingerprint(branch_metrics)
+        cached = result_cache.lookup(df_branch["ID"], record_fps, context_fp)
+    return record_fps, context_fp, cached
+
+def merge_cached_outputs(df_branch: pd.DataFrame, cached: Dict[Any, Dict[str, Any]],
+                         analyzed: pd.DataFrame = None) -> pd.DataFrame:
+    """df_branch with OUTPUT_COLUMNS taken from cached outputs and the freshly analyzed rows."""
+    if not cached:
+        return analyzed
+    outputs = [pd.DataFrame.from_dict(cached, orient="index").reindex(columns=OUTPUT_COLUMNS)]
+    if analyzed is not None:
+        outputs.append(analyzed[OUTPUT_COLUMNS])
+    merged = pd.concat(outputs).loc[df_branch.index]
+    for col in OUTPUT_COLUMNS:
+        df_branch[col] = merged[col]
+    return df_branch
+
+def iter_branch_analysis(df: pd.DataFrame, branch_name: str, app, batch_size: int = ANALYZE_STREAM_BATCH_SIZE,
+                         dispatcher: LLMDispatcher = None, branch_metrics: Dict[str, Any] = None,
+                         result_cache: AnalysisResultCache = None,
+                         ts_baselines: Baselines = None) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """
+    run_branch_analysis in batches of `batch_size` rows, yielding (input rows,
+    analyzed rows) per batch. Metrics and time-series scores are still computed
+    over the whole branch first, so every row is scored exactly as in a single run;
+    so are the summary clusters.
+    """
+    df_branch = df[df[BRANCH_COLUMN] == branch_name].reset_index(drop=True)
+    if df_branch.empty:
+        return
+    if branch_metrics is None:
+        with timed("metrics", rows=len(df_branch)):
+            branch_metrics = calculate_branch_metrics(df_branch)
+    df_branch = score_timeseries(df_branch, ts_baselines)
+    df_branch = assign_summary_clusters(df_branch, branch_metrics)
+    for start in range(0, len(df_branch), batch_size):
+        rows = df_branch.iloc[start:start + batch_size]
+        yield rows, run_branch_analysis(rows, branch_name, app, dispatcher=dispatcher,
+                                        branch_metrics=branch_metrics, result_cache=result_cache)
+
+def prepare_rows(df_branch: pd.DataFrame, branch_metrics: Dict[str, Any], app) -> Tuple[pd.DataFrame, List[LLMJob]]:
+    """
+    CPU-bound part of the analysis: flags for every row and the graph run for
+    flagged ones. LLM outputs the graph deferred stay None in the frame and
+    come back as jobs keyed by (row label, column) for apply_llm_results.
+    Rows given a shared cluster prompt by assign_summary_clusters are
+    summarized from that prompt.
+    """
+    with timed("detect", rows=len(df_branch)):
+        df_branch = detect_branch_flags(df_branch, branch_metrics)
+
+    # Rows with no deviation and no root cause get no LLM prompt, so the graph
+    # would only route them to "N/A (No Issue)"; fill those without invoking it.
+    needs_llm = (df_branch["Combined_Flag"] != "None") | (df_branch["Root_Causes"] != "None")
+    df_branch["LLM_Prompt"] = ""
+    df_branch["LLM_Summary"] = "N/A (No major issue detected)"
+    df_branch["Chef_Feedback_Prompt"] = "N/A"
+    df_branch["Chef_Feedback_Summary"] = "N/A"
+    df_branch["Status"] = "N/A (No Issue)"
+
+    flagged = df_branch.loc[needs_llm]
+    records = flagged.to_dict(orient='records')
+    llm_results = []
+    with timed("graph_invoke", rows=len(records)):
+        for record in records:
+            initial_state = {
+                "record": record,
+                "branch_metrics": branch_metrics,
+                "status": "",
+                "flags_precomputed": True,
+                "defer_llm": True,
+            }
+            final_state = app.invoke(initial_state)
+            llm_results.append({col: final_state['record'].get(col) for col in LLM_COLUMNS})
+
+    if llm_results:
+        df_branch.loc[needs_llm, LLM_COLUMNS] = pd.DataFrame(llm_results, index=flagged.index)[LLM_COLUMNS]
+
+    summary_labels = [label for label, result in zip(flagged.index, llm_results) if result["LLM_Summary"] is None]
+    if SUMMARY_CLUSTER_COLUMN in df_branch.columns and summary_labels:
+        cluster_prompts = df_branch.loc[summary_labels, SUMMARY_CLUSTER_COLUMN]
+        shared = cluster_prompts.fillna("") != ""
+        df_branch.loc[shared.index[shared], "LLM_Prompt"] = cluster_prompts[shared]
+
+    # The graph only built the prompts; the caller sends them all in one concurrent batch.
+    jobs = [LLMJob(key=(label, "LLM_Summary"), kind=SUMMARY, prompt=df_branch.at[label, "LLM_Prompt"])
+            for label in summary_labels]
+    for label, result in zip(flagged.index, llm_results):
+        if result["Chef_Feedback_Summary"] is None:
+            jobs.append(LLMJob(key=(label, "Chef_Feedback_Summary"), kind=CHEF_FEEDBACK, prompt=result["Chef_Feedback_Prompt"]))
+    return df_branch, jobs
+
+def summary_cluster_prompts(rows: pd.DataFrame, avg_rate: float) -> pd.Series:
+    """
+    The shared summary prompt of every flagged row in `rows` whose
+    LLM_SUMMARY_GROUP_COLUMNS cluster has other members, built from the
+    cluster's aggregated stats; "" for rows alone in their cluster.
+    """
+    rows = rows[[col for col in rows.columns if col in CLUSTER_COLUMNS]]
+    keys = [_column(rows, col).astype(object) for col in LLM_SUMMARY_GROUP_COLUMNS]
+    clusters = rows.groupby(keys, dropna=False, sort=False).indices
+
+    dates = pd.to_datetime(_column(rows, "Date"), errors='coerce').to_numpy(dtype="datetime64[ns]")
+    rate = pd.to_numeric(_column(rows, "Waste Rate"), errors='coerce').to_numpy(dtype=float)
+    wastage_qty = pd.to_numeric(_column(rows, "Wastage Qty"), errors='coerce').to_numpy(dtype=float)
+    expected_qty = pd.to_numeric(_column(rows, "Expected Waste Qty"), errors='coerce').to_numpy(dtype=float)
+    cost = pd.to_numeric(rows["Wastage Cost"], errors='coerce').to_numpy(dtype=float) \
+        if "Wastage Cost" in rows.columns else None
+    suppliers = _column(rows, "Supplier Name").to_numpy(dtype=object)
+    prompts = np.full(len(rows), "", dtype=object)
+
+    for key, positions in clusters.items():
+        if len(positions) < 2:
+            continue
+        row = dict(zip(LLM_SUMMARY_GROUP_COLUMNS, key))
+        row["Supplier Name"] = ", ".join(str(name) for name in pd.unique(suppliers[positions]) if pd.notna(name)) or "N/A"
+        cluster_dates = dates[positions]
+        cluster_dates = cluster_dates[~np.isnat(cluster_dates)]
+        cluster = {
+            "instances": len(positions),
+            "first_date": str(cluster_dates.min())[:10] if len(cluster_dates) else "N/A",
+            "last_date": str(cluster_dates.max())[:10] if len(cluster_dates) else "N/A",
+            "mean_rate": np.nanmean(rate[positions]),
+            "max_rate": np.nanmax(rate[positions]),
+            "wastage_qty": np.nansum(wastage_qty[positions]),
+            "expected_qty": np.nansum(expected_qty[positions]),
+            "wastage_cost": np.nansum(cost[positions]) if cost is not None else None,
         }
-        final_state = app.invoke(initial_state)
-        all_results.append(final_state['record'])
-    
-    return pd.DataFrame(all_results)
\ No newline at end of file
+        prompts[positions] = generate_cluster_llm_prompt(row, cluster, avg_rate)
+    return pd.Series(prompts, index=rows.index, dtype=object)
+
+def apply_llm_results(df_branch: pd.DataFrame, jobs: List[LLMJob]) -> pd.DataFrame:
+    """Writes dispatched job results into their rows; chef feedback is sanitized with the row's names."""
+    for job in jobs:
+        label, col = job.key
+        result = job.result
+        if job.kind == CHEF_FEEDBACK:
+            result = sanitize_record_feedback(result, df_branch.loc[label].to_dict())
+        df_branch.at[label, col] = result
+    return df_branch
+
+def _analyze_rows(df_branch: pd.DataFrame, branch_metrics: Dict[str, Any], app,
+                  dispatcher: LLMDispatcher = None) -> pd.DataFrame:
+    df_branch, jobs = prepare_rows(df_branch, branch_metrics, app)
+    if jobs:
+        dispatcher = dispatcher or LLMDispatcher()
+        with timed("llm_dispatch", rows=len(jobs)):
+            dispatcher.run(jobs)
+    return apply_llm_results(df_branch, jobs)
+
+def build_response_frame(final_df: pd.DataFrame) -> pd.DataFrame:
+    """Shapes analyzed rows into the /analyze response columns."""
+    output_df = final_df.reindex(columns=RESPONSE_COLUMNS, fill_value='N/A')
+    if 'Date' in final_df.columns:
+        dates = pd.to_datetime(final_df['Date'])
+        output_df['Date'] = dates.dt.strftime('%Y-%m-%d')
+        # Time has always been taken from the day-formatted Date, i.e. midnight
+        output_df['Time'] = dates.dt.normalize().dt.strftime('%H:%M')
+        output_df['Weekday'] = dates.dt.strftime('%A')
+    return output_df.rename(columns={'Chef_Feedback_Summary': 'Chef_Feedback'})
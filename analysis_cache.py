@@ -0,0 +1,142 @@
+# analysis_cache.py
+"""
+Per-record result cache for run_branch_analysis.
+
+A record's outputs depend on its own input columns, on the branch metrics it
+was scored against, on the thresholds in config.py, on the LLM prompt
+templates and on the summary grouping settings. The first is captured by a per-row fingerprint, the rest by one
+context fingerprint per run; a stored result is reused only when both match.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+import config
+from config import ANALYSIS_CACHE_ENABLED, ANALYSIS_CACHE_PATH
+from feedback_sanitizer import SANITIZER_VERSION
+from llm import LLM_PROMPT_SPECS, llm_enabled, llm_model_id, llm_template_hash
+
+# Thresholds that change what detection/routing produce
+THRESHOLD_SETTINGS = [
+    "EXPECTED_THRESHOLD", "RATE_THRESHOLD", "STATION_MULT", "SHIFT_MULT", "PEAK_MULT",
+    "HOT_TEMP", "HOT_MULT", "COLD_TEMP", "SUPPLIER_MULT", "REPEATED_EXPIRY_COUNT",
+    "COST_CRITICAL_THRESHOLD", "COST_IGNORE_THRESHOLD", "DETECTION_MODE", "TS_MIN_HISTORY",
+]
+
+# Columns that are outputs of a previous run rather than inputs to this one
+NON_INPUT_COLUMNS = {"Status", "Chef_Feedback", "Chef_Feedback_MD5", "Analyzed_Date", "Waste Rate"}
+
+
+def _json_default(value):
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def config_fingerprint() -> str:
+    payload = {
+        "thresholds": {name: getattr(config, name) for name in THRESHOLD_SETTINGS},
+        "llm": [llm_model_id(), llm_enabled()] + [llm_template_hash(k) for k in sorted(LLM_PROMPT_SPECS)],
+        "sanitizer": SANITIZER_VERSION,
+        "summary_grouping": [config.LLM_SUMMARY_GROUPING, list(config.LLM_SUMMARY_GROUP_COLUMNS)],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def context_fingerprint(branch_metrics: Dict[str, Any]) -> str:
+    """Hash of the config thresholds/prompt templates plus the branch metrics of this run."""
+    payload = json.dumps(branch_metrics, sort_keys=True, default=_json_default)
+    return hashlib.sha256((config_fingerprint() + payload).encode("utf-8")).hexdigest()
+
+
+def record_fingerprints(df: pd.DataFrame, exclude: Optional[List[str]] = None) -> pd.Series:
+    """One hex fingerprint per row over its input columns (column order independent)."""
+    skip = NON_INPUT_COLUMNS | set(exclude or [])
+    cols = sorted(c for c in df.columns if c not in skip)
+    hashes = pd.util.hash_pandas_object(df[cols], index=False)
+    return hashes.map("{:016x}".format)
+
+
+class AnalysisResultCache:
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_results (
+                id INTEGER PRIMARY KEY,
+                record_fp TEXT NOT NULL,
+                context_fp TEXT NOT NULL,
+                outputs TEXT NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, ids: pd.Series, record_fps: pd.Series, context_fp: str) -> Dict[Any, Dict[str, Any]]:
+        """Maps index label -> stored outputs for rows whose fingerprints still match."""
+        wanted = {int(i): label for label, i in ids.items()}
+        found: Dict[Any, Dict[str, Any]] = {}
+        keys = list(wanted)
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, record_fp, outputs FROM analysis_results "
+                    f"WHERE context_fp = ? AND id IN ({','.join('?' * len(chunk))})",
+                    (context_fp, *chunk),
+                ).fetchall()
+                for record_id, record_fp, outputs in rows:
+                    label = wanted[record_id]
+                    if record_fps[label] == record_fp:
+                        found[label] = json.loads(outputs)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def store(self, df: pd.DataFrame, record_fps: pd.Series, context_fp: str, output_columns: List[str]):
+        """Saves outputs of freshly analyzed rows; rows with LLM errors are left uncached."""
+        entries = []
+        rows = df[["ID"] + output_columns].to_dict(orient="records")
+        for label, row in zip(df.index, rows):
+            record_id = int(row.pop("ID"))
+            if any(isinstance(v, str) and v.startswith("LLM Error") for v in row.values()):
+                continue
+            entries.append((record_id, record_fps[label], context_fp, json.dumps(row, default=_json_default)))
+        if not entries:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO analysis_results (id, record_fp, context_fp, outputs) VALUES (?, ?, ?, ?)",
+                entries,
+            )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_cache: Optional[AnalysisResultCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_analysis_cache() -> Optional[AnalysisResultCache]:
+    """Process-wide result cache, or None when disabled."""
+    global _cache
+    if not ANALYSIS_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = AnalysisResultCache()
+    return _cache
@@ -0,0 +1,125 @@
+# async_analysis.py
+"""
+Non-blocking version of the /analyze request path.
+
+Blocking MySQL calls run on a small thread pool sized like the connection
+pool, metrics / detection / the per-row graph run in the batch worker
+processes (batch.get_executor), and the LLM calls are awaited on the event
+loop itself through LLMDispatcher.arun (chain.ainvoke). A request therefore
+holds no server thread while it waits on the database, the LLM or CPU work,
+and concurrent requests are no longer capped by the threadpool size.
+
+Results are identical to analysis.run_branch_analysis.
+"""
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config import BRANCH_COLUMN, ANALYZE_IO_THREADS, ANALYZE_CPU_IN_PROCESSES, DETECTION_MODE, LLM_SUMMARY_GROUPING
+from db import load_mysql_data, update_mysql_data
+from analysis import (
+    OUTPUT_COLUMNS, calculate_branch_metrics, score_timeseries, assign_summary_clusters, prepare_rows,
+    apply_llm_results, lookup_cached_outputs, merge_cached_outputs, build_response_frame,
+)
+from analysis_cache import AnalysisResultCache
+from batch import get_executor
+from graph import get_graph
+from instrumentation import timed
+from llm_dispatcher import LLMDispatcher, LLMJob
+from timeseries_detection import Baselines
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+_io_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    global _io_executor
+    with _io_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=max(1, ANALYZE_IO_THREADS), thread_name_prefix="analyze-io")
+    return _io_executor
+
+
+def shutdown_io_executor():
+    global _io_executor
+    with _io_lock:
+        if _io_executor is not None:
+            _io_executor.shutdown(wait=True)
+            _io_executor = None
+
+
+def cpu_executor() -> Executor:
+    return get_executor() if ANALYZE_CPU_IN_PROCESSES else get_io_executor()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Runs fn on the I/O thread pool; request timings (contextvars) follow it into the thread."""
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(get_io_executor(), call)
+
+
+def warm_worker():
+    # Imports the analysis modules and compiles the graph ahead of the first request
+    get_graph()
+
+
+def _prepare_in_worker(df_rows: pd.DataFrame, branch_metrics: Dict[str, Any]) -> Tuple[pd.DataFrame, List[LLMJob]]:
+    return prepare_rows(df_rows, branch_metrics, get_graph())
+
+
+async def aload_mysql_data(branch_name: str, year: int, month_name: str) -> pd.DataFrame:
+    return await run_blocking(load_mysql_data, branch_name, year, month_name)
+
+
+async def aupdate_mysql_data(df_results: pd.DataFrame, df_loaded: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+    return await run_blocking(update_mysql_data, df_results, df_loaded=df_loaded)
+
+
+async def arun_branch_analysis(df: pd.DataFrame, branch_name: str, dispatcher: LLMDispatcher = None,
+                               branch_metrics: Dict[str, Any] = None, result_cache: AnalysisResultCache = None,
+                               executor: Optional[Executor] = None, ts_baselines: Baselines = None) -> pd.DataFrame:
+    """run_branch_analysis with the CPU work on `executor` (default cpu_executor()) and awaited LLM calls."""
+    loop = asyncio.get_running_loop()
+    executor = executor or cpu_executor()
+    df_branch = df[df[BRANCH_COLUMN] == branch_name].copy().reset_index(drop=True)
+    if df_branch.empty:
+        return pd.DataFrame()
+
+    if branch_metrics is None:
+        with timed("metrics", rows=len(df_branch)):
+            branch_metrics = await loop.run_in_executor(executor, calculate_branch_metrics, df_branch)
+    if DETECTION_MODE == "timeseries":
+        df_branch = await loop.run_in_executor(executor, score_timeseries, df_branch, ts_baselines)
+    if LLM_SUMMARY_GROUPING:
+        df_branch = await loop.run_in_executor(executor, assign_summary_clusters, df_branch, branch_metrics)
+
+    cached: Dict[Any, Dict[str, Any]] = {}
+    if result_cache is not None:
+        record_fps, context_fp, cached = await run_blocking(lookup_cached_outputs, df_branch, branch_metrics,
+                                                            result_cache)
+    todo = df_branch.index.difference(list(cached))
+    analyzed = None
+    if len(todo):
+        rows = df_branch if len(todo) == len(df_branch) else df_branch.loc[todo].copy()
+        # Worker-side detect/graph_invoke timings stay in the worker; this covers both plus the transfer
+        with timed("prepare", rows=len(rows)):
+            analyzed, jobs = await loop.run_in_executor(executor, _prepare_in_worker, rows, branch_metrics)
+        if jobs:
+            dispatcher = dispatcher or LLMDispatcher()
+            with timed("llm_dispatch", rows=len(jobs)):
+                await dispatcher.arun(jobs)
+        analyzed = apply_llm_results(analyzed, jobs)
+        if result_cache is not None:
+            await run_blocking(result_cache.store, analyzed, record_fps, context_fp, OUTPUT_COLUMNS)
+    return merge_cached_outputs(df_branch, cached, analyzed)
+
+
+def response_json(final_df: pd.DataFrame) -> str:
+    """The /analyze response body (a JSON array in the build_response_frame shape)."""
+    return build_response_frame(final_df).to_json(orient="records", force_ascii=False)
@@ -0,0 +1,101 @@
+# backfill_feedback.py
+"""
+One-off cleanup of Chef_Feedback stored before feedback was sanitized when
+generated. Adds the MYSQL_FEEDBACK_VERSION_COLUMN that marks sanitized rows,
+runs feedback_sanitizer.sanitize_feedback over every unmarked row in
+ID-range batches and stamps it with SANITIZER_VERSION; /send-chef-feedback
+sends marked rows as stored and refuses the others. Safe to re-run: marked
+rows are skipped, and cleaning is idempotent for rows written unmarked by
+processes started before the column existed.
+
+    python backfill_feedback.py [--batch-size 5000]
+"""
+import argparse
+import time
+
+import mysql.connector
+
+from config import MYSQL_TABLE_NAME, MYSQL_FEEDBACK_VERSION_COLUMN
+from db_pool import get_pool
+from feedback_sanitizer import SANITIZER_VERSION, sanitize_record_feedback
+from snapshot_cache import get_snapshot_cache
+
+
+def _column_exists(cursor, column: str) -> bool:
+    try:
+        cursor.execute(f"SELECT `{column}` FROM {MYSQL_TABLE_NAME} LIMIT 0")
+        cursor.fetchall()
+        return True
+    except mysql.connector.Error:
+        return False
+
+
+def add_column(conn, column: str = MYSQL_FEEDBACK_VERSION_COLUMN) -> bool:
+    cursor = conn.cursor()
+    try:
+        if _column_exists(cursor, column):
+            return False
+        cursor.execute(f"ALTER TABLE {MYSQL_TABLE_NAME} ADD COLUMN `{column}` INT NULL")
+        conn.commit()
+        return True
+    finally:
+        cursor.close()
+
+
+def backfill(conn, column: str = MYSQL_FEEDBACK_VERSION_COLUMN, batch_size: int = 5000) -> dict:
+    """Sanitizes and marks unmarked rows, committing after every ID batch."""
+    cursor = conn.cursor(dictionary=True)
+    counts = {"rows_marked": 0, "feedback_changed": 0}
+    try:
+        cursor.execute(f"SELECT MIN(ID) AS low, MAX(ID) AS high FROM {MYSQL_TABLE_NAME}")
+        bounds = cursor.fetchone()
+        if bounds["low"] is None:
+            return counts
+        for start in range(int(bounds["low"]), int(bounds["high"]) + 1, batch_size):
+            cursor.execute(
+                f"""
+                SELECT ID, Chef, `Branch Manager`, Chef_Feedback
+                FROM {MYSQL_TABLE_NAME}
+                WHERE ID >= %s AND ID < %s AND `{column}` IS NULL
+                """,
+                (start, start + batch_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                continue
+            updates = []
+            for row in rows:
+                feedback = sanitize_record_feedback(row["Chef_Feedback"], row)
+                counts["feedback_changed"] += feedback != row["Chef_Feedback"]
+                updates.append((feedback, SANITIZER_VERSION, row["ID"]))
+            cursor.executemany(
+                f"UPDATE {MYSQL_TABLE_NAME} SET Chef_Feedback = %s, `{column}` = %s WHERE ID = %s", updates
+            )
+            counts["rows_marked"] += len(updates)
+            conn.commit()
+        return counts
+    finally:
+        cursor.close()
+
+
+def migrate(batch_size: int = 5000) -> dict:
+    start = time.perf_counter()
+    with get_pool().connection() as conn:
+        added = add_column(conn)
+        counts = backfill(conn, batch_size=batch_size)
+    # Load snapshots still hold digests of the old feedback
+    cache = get_snapshot_cache()
+    if cache is not None and counts["feedback_changed"]:
+        cache.invalidate()
+    return {
+        "column_added": added,
+        **counts,
+        "elapsed_seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    print(migrate(batch_size=args.batch_size))
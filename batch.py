@@ -0,0 +1,300 @@
+# batch.py
+"""
+Multi-branch / multi-month analysis.
+
+All requested branch-months are read with one query, partitioned by
+(branch, year, month) and analyzed in parallel worker processes; each
+partition's result is yielded as soon as its worker finishes, together with
+its timings. Every partition is analyzed exactly like one /analyze call.
+
+    python batch.py --branches "New York - Main" "LA - Downtown" \\
+        --months 2025-01 2025-02 [--workers 4] [--no-write-back] [--output out.ndjson]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from config import (
+    BRANCH_COLUMN,
+    BATCH_MAX_WORKERS,
+    BATCH_START_METHOD,
+    LLM_MAX_CONCURRENCY,
+    LLM_RATE_LIMIT_PER_SEC,
+    LLM_RATE_LIMIT_BURST,
+)
+from db import load_mysql_batch, update_mysql_data
+from analysis import run_branch_analysis, calculate_branch_metrics, build_response_frame
+from analysis_cache import get_analysis_cache
+from rollup_cube import refresh_rollup
+from llm_dispatcher import LLMDispatcher, skipped_chains
+from llm_registry import get_llm_registry
+from timeseries_detection import Baselines, load_history_baselines
+from graph import get_graph
+
+PartitionKey = Tuple[str, int, str]
+
+def analyze_partition(df_part: pd.DataFrame, key: PartitionKey, workers: int = 1,
+                      use_cache: bool = True, use_llm: bool = True,
+                      ts_baselines: Optional[Baselines] = None,
+                      rate_shares: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Worker entry point: metrics + detection + LLM for one branch-month. Each
+    worker process's rate limiter gets 1/`rate_shares` of the configured LLM
+    rate (default `workers`; `workers + 1` when the API process keeps a share
+    for itself), and each run 1/`workers` of the concurrency, so the pool as a
+    whole stays within the provider limits. With `use_llm=False`
+    prompts are still built but summaries are left empty. `ts_baselines` is
+    the series history before the month ("timeseries" detection mode).
+    """
+    branch, year, month = key
+    started = time.perf_counter()
+    metrics = calculate_branch_metrics(df_part)
+    metrics_done = time.perf_counter()
+    shares = rate_shares or workers
+    get_llm_registry().set_rate_limit(LLM_RATE_LIMIT_PER_SEC / shares, max(1, LLM_RATE_LIMIT_BURST // shares))
+    dispatcher = LLMDispatcher(
+        chains=None if use_llm else skipped_chains(),
+        max_concurrency=max(1, LLM_MAX_CONCURRENCY // workers),
+        rate_per_sec=None if use_llm else 0,
+    )
+    result = run_branch_analysis(df_part, branch, get_graph(), dispatcher=dispatcher,
+                                 branch_metrics=metrics,
+                                 # Empty summaries must never be cached as real results
+                                 result_cache=get_analysis_cache() if use_cache and use_llm else None,
+                                 ts_baselines=ts_baselines)
+    finished = time.perf_counter()
+    return {
+        "result": result,
+        "worker_pid": os.getpid(),
+        "timings": {
+            "metrics_seconds": round(metrics_done - started, 4),
+            "analysis_seconds": round(finished - metrics_done, 4),
+            "llm_seconds": round(dispatcher.stats.elapsed_seconds, 4),
+        },
+    }
+
+
+def parse_month(value: str) -> Tuple[int, str]:
+    """'2025-02' -> (2025, 'February')."""
+    try:
+        parsed = datetime.strptime(value.strip(), "%Y-%m")
+    except ValueError:
+        raise ValueError(f"Invalid month {value!r}; expected YYYY-MM.")
+    return parsed.year, parsed.strftime("%B")
+
+
+def load_partitions(branch_names: List[str], months: List[Tuple[int, str]]) -> Tuple[Dict[PartitionKey, pd.DataFrame], Dict[str, Any]]:
+    """
+    Loads every branch x month in one query and splits it by (branch, year,
+    month). Requested combinations without rows map to an empty frame.
+    """
+    started = time.perf_counter()
+    df = load_mysql_batch(branch_names, months)
+    load_seconds = time.perf_counter() - started
+
+    partitions: Dict[PartitionKey, pd.DataFrame] = {}
+    if not df.empty:
+        dates = pd.to_datetime(df["Date"])
+        groups = df.groupby([df[BRANCH_COLUMN].astype(object), dates.dt.year, dates.dt.month_name()],
+                            sort=False, dropna=True)
+        for (branch, year, month), part in groups:
+            partitions[(branch, int(year), month)] = part.reset_index(drop=True)
+    for branch in branch_names:
+        for year, month in months:
+            month = datetime.strptime(month.strip(), "%B").strftime("%B")
+            partitions.setdefault((branch, int(year), month), df.iloc[0:0])
+
+    info = {
+        "rows": len(df),
+        "partitions": len(partitions),
+        "load_seconds": round(load_seconds, 4),
+        "load_stats": df.attrs.get("load_stats", {}),
+    }
+    return partitions, info
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor(max_workers: int = BATCH_MAX_WORKERS) -> ProcessPoolExecutor:
+    """Process pool shared by batch runs; workers are spawned once and reused."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=max(1, max_workers),
+                mp_context=multiprocessing.get_context(BATCH_START_METHOD),
+            )
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+
+_shared_runs = 0
+_shared_runs_lock = threading.Lock()
+
+
+@contextmanager
+def _rate_shared_with_pool(workers: int):
+    """
+    While a batch runs on the shared pool, the API process's own rate limiter
+    (/analyze, ingestion follow-ups) drops to 1/(`workers` + 1) of the
+    configured LLM rate, the workers taking the other shares; the full rate
+    comes back when the last concurrent batch finishes.
+    """
+    global _shared_runs
+    shares = workers + 1
+    with _shared_runs_lock:
+        _shared_runs += 1
+        if _shared_runs == 1:
+            get_llm_registry().set_rate_limit(LLM_RATE_LIMIT_PER_SEC / shares, max(1, LLM_RATE_LIMIT_BURST // shares))
+    try:
+        yield shares
+    finally:
+        with _shared_runs_lock:
+            _shared_runs -= 1
+            if _shared_runs == 0:
+                get_llm_registry().set_rate_limit(LLM_RATE_LIMIT_PER_SEC, LLM_RATE_LIMIT_BURST)
+
+
+def iter_partition_results(partitions: Dict[PartitionKey, pd.DataFrame],
+                           executor: Optional[ProcessPoolExecutor] = None,
+                           write_back: bool = True,
+                           use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Submits every non-empty partition to the process pool and yields one
+    result dict per partition in completion order. A failing partition
+    yields an "error" entry instead of stopping the batch.
+
+    Without `executor` the batch runs on the shared pool of the API process,
+    which keeps a share of the LLM rate for its own calls; a private pool
+    (the batch.py CLI) splits the whole rate among its workers.
+    """
+    if executor is None:
+        executor = get_executor()
+        workers = getattr(executor, "_max_workers", 1)
+        with _rate_shared_with_pool(workers) as shares:
+            yield from _iter_pool_results(partitions, executor, workers, shares, write_back, use_cache)
+    else:
+        workers = getattr(executor, "_max_workers", 1)
+        yield from _iter_pool_results(partitions, executor, workers, workers, write_back, use_cache)
+
+
+def _iter_pool_results(partitions: Dict[PartitionKey, pd.DataFrame], executor: ProcessPoolExecutor,
+                       workers: int, rate_shares: int, write_back: bool,
+                       use_cache: bool) -> Iterator[Dict[str, Any]]:
+    total = len(partitions)
+    done = 0
+    batch_started = time.perf_counter()
+
+    def entry(key: PartitionKey, **fields) -> Dict[str, Any]:
+        nonlocal done
+        done += 1
+        branch, year, month = key
+        return {
+            "branch": branch,
+            "year": year,
+            "month": month,
+            "progress": {"done": done, "total": total,
+                         "elapsed_seconds": round(time.perf_counter() - batch_started, 4)},
+            **fields,
+        }
+
+    futures = {}
+    for key, part in partitions.items():
+        if part.empty:
+            yield entry(key, rows=0, error="No data found for the specified branch, year, and month.")
+            continue
+        try:
+            ts_baselines = load_history_baselines(*key)
+        except Exception as e:
+            yield entry(key, rows=len(part), error=f"Loading series history failed: {e}")
+            continue
+        submitted = time.perf_counter()
+        futures[executor.submit(analyze_partition, part, key, workers, use_cache, True, ts_baselines,
+                                 rate_shares)] = (key, submitted)
+
+    for future in as_completed(futures):
+        key, submitted = futures[future]
+        part = partitions[key]
+        try:
+            outcome = future.result()
+        except Exception as e:
+            yield entry(key, rows=len(part), error=f"Partition failed: {e}")
+            continue
+        result = outcome["result"]
+        timings = outcome["timings"]
+        timings["wall_seconds"] = round(time.perf_counter() - submitted, 4)
+        write_stats = None
+        if write_back and not result.empty:
+            try:
+                write_stats = update_mysql_data(result, df_loaded=part)
+                refresh_rollup(result)
+            except ValueError as e:
+                yield entry(key, rows=len(part), error=str(e), timings=timings)
+                continue
+        yield entry(
+            key,
+            rows=len(result),
+            worker_pid=outcome["worker_pid"],
+            timings=timings,
+            write_back=write_stats,
+            status_counts={str(k): int(v) for k, v in result["Status"].value_counts().items()},
+            records=build_response_frame(result).to_dict(orient="records"),
+        )
+
+
+def run_batch(branch_names: List[str], months: List[Tuple[int, str]], max_workers: int = BATCH_MAX_WORKERS,
+              write_back: bool = True, use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+    """Load + analyze with a private pool; yields a "loaded" entry, then one entry per partition."""
+    partitions, info = load_partitions(branch_names, months)
+    yield {"event": "loaded", **info}
+    ctx = multiprocessing.get_context(BATCH_START_METHOD)
+    with ProcessPoolExecutor(max_workers=max(1, max_workers), mp_context=ctx) as executor:
+        yield from iter_partition_results(partitions, executor, write_back=write_back, use_cache=use_cache)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--branches", nargs="+", required=True)
+    parser.add_argument("--months", nargs="+", required=True, help="YYYY-MM")
+    parser.add_argument("--workers", type=int, default=BATCH_MAX_WORKERS)
+    parser.add_argument("--no-write-back", action="store_true")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--output", help="NDJSON file for the per-partition results (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for item in run_batch(args.branches, [parse_month(m) for m in args.months], max_workers=args.workers,
+                              write_back=not args.no_write_back, use_cache=not args.no_cache):
+            out.write(json.dumps(item, default=str) + "\n")
+            out.flush()
+            if "event" in item:
+                print(f"loaded {item['rows']} rows into {item['partitions']} partitions "
+                      f"in {item['load_seconds']}s", file=sys.stderr)
+            else:
+                progress = item["progress"]
+                detail = item.get("error") or f"{item['rows']} rows, {item['timings']['wall_seconds']}s"
+                print(f"[{progress['done']}/{progress['total']}] {item['branch']} {item['month']} "
+                      f"{item['year']}: {detail}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
@@ -0,0 +1,240 @@
+# benchmarks/bench_async_analyze.py
+"""
+Load test of GET /analyze: the async handler against the previous blocking
+one, served side by side by the same uvicorn process.
+
+- /analyze       the async handler (async_analysis.py)
+- /analyze-sync  the previous handler: a plain `def` endpoint on Starlette's
+                 threadpool doing load -> run_branch_analysis -> update
+
+The database is a SQLite stand-in (benchmarks.synthetic rows, --branches
+branches x one month) whose every execute() sleeps --db-latency seconds like
+a blocking network round-trip; the LLM chains answer after --llm-latency
+seconds. Snapshot, analysis and LLM caches are disabled and the LLM rate
+limit is off, so every request does the full load / detect / LLM / write
+cycle. Requests cycle over the branches.
+
+    python -m benchmarks.bench_async_analyze --concurrency 64 256 --llm-latency 2 --output async.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+YEAR, MONTH = 2025, "February"
+ENDPOINTS = {"sync": "/analyze-sync", "async": "/analyze"}
+
+
+def serve(args):
+    # Every request must do the full cycle; set before config is imported
+    os.environ.update(SNAPSHOT_CACHE_ENABLED="false", ANALYSIS_CACHE_ENABLED="false",
+                      LLM_CACHE_ENABLED="false", LLM_RATE_LIMIT_PER_SEC="0")
+    if args.cpu_mode:
+        os.environ["ANALYZE_CPU_IN_PROCESSES"] = str(args.cpu_mode == "processes").lower()
+
+    import uvicorn
+    from fastapi import HTTPException, Query
+    from langchain_core.messages import AIMessage
+
+    import main
+    from analysis import run_branch_analysis, build_response_frame
+    from analysis_cache import get_analysis_cache
+    from db import load_mysql_data, update_mysql_data
+    from db_pool import init_pool, SQLiteStandInConnection
+    from llm import SUMMARY, CHEF_FEEDBACK, SIMULATED_SUMMARY, SIMULATED_CHEF_FEEDBACK
+    from llm_dispatcher import LLMDispatcher
+
+    class SlowCursor:
+        def __init__(self, cursor):
+            self._cursor = cursor
+
+        def execute(self, *a, **kw):
+            time.sleep(args.db_latency)
+            return self._cursor.execute(*a, **kw)
+
+        def executemany(self, *a, **kw):
+            time.sleep(args.db_latency)
+            return self._cursor.executemany(*a, **kw)
+
+        def __getattr__(self, name):
+            return getattr(self._cursor, name)
+
+    class SlowConnection(SQLiteStandInConnection):
+        def cursor(self, dictionary: bool = False, **kwargs):
+            return SlowCursor(super().cursor(dictionary=dictionary, **kwargs))
+
+    class SlowChain:
+        def __init__(self, text: str):
+            self.text = text
+
+        async def ainvoke(self, _inputs):
+            await asyncio.sleep(args.llm_latency)
+            return AIMessage(content=self.text)
+
+    chains = {SUMMARY: SlowChain(SIMULATED_SUMMARY), CHEF_FEEDBACK: SlowChain(SIMULATED_CHEF_FEEDBACK)}
+    LLMDispatcher._get_chains = lambda self: self.chains or chains
+
+    # Registered after main's own startup hook, which created the MySQL pool
+    @main.app.on_event("startup")
+    def use_stand_in_db():
+        init_pool(lambda: SlowConnection(args.db))
+
+    @main.app.get("/analyze-sync")
+    def analyze_sync(branch: str = Query(...), year: int = Query(...), month: str = Query(...)):
+        try:
+            df_data = load_mysql_data(branch_name=branch, year=year, month_name=month)
+            if df_data.empty:
+                raise ValueError("No data found for the specified branch, year, and month.")
+            final_df = run_branch_analysis(df=df_data, branch_name=branch, app=main.graph_app,
+                                           result_cache=get_analysis_cache())
+            update_mysql_data(final_df, df_loaded=df_data)
+            return build_response_frame(final_df).to_dict(orient="records")
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+
+    # Idle keep-alive connections outlive the client's, so a reused connection is never reset
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning", timeout_keep_alive=30)
+
+
+def build_database(path: str, branches: int, rows_per_request: int, seed: int) -> list:
+    from benchmarks.synthetic import generate_waste_logs, write_sqlite_table
+    from db_pool import sqlite_stand_in_factory
+    import migrate_date_column
+
+    names = [f"Bench Branch {i:02d}" for i in range(branches)]
+    write_sqlite_table(generate_waste_logs(branches * rows_per_request, YEAR, MONTH, branches=names, seed=seed), path)
+    conn = sqlite_stand_in_factory(path)()
+    try:
+        migrate_date_column.add_index(conn)
+    finally:
+        conn.close()
+    return names
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(client, base: str, proc, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited with {proc.returncode}")
+        try:
+            await client.get(f"{base}/metrics")
+            return
+        except Exception:
+            await asyncio.sleep(0.5)
+    raise RuntimeError("server did not start")
+
+
+async def load_test(client, base: str, path: str, branches: list, concurrency: int, requests: int) -> dict:
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def user():
+        nonlocal errors
+        for i in counter:
+            params = {"branch": branches[i % len(branches)], "year": YEAR, "month": MONTH}
+            start = time.perf_counter()
+            try:
+                response = await client.get(f"{base}{path}", params=params)
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "req_per_sec": round(requests / elapsed, 2),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "max_ms": round(float(ms.max()), 1),
+    }
+
+
+async def run_client(args, base: str, proc, branches: list) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 8, keepalive_expiry=10)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, base, proc)
+        results = {}
+        for name, path in ENDPOINTS.items():
+            # Warm-up: worker processes, graph compilation, connection pool
+            await load_test(client, base, path, branches, len(branches), len(branches))
+            for concurrency in args.concurrency:
+                results.setdefault(str(concurrency), {})[name] = await load_test(
+                    client, base, path, branches, concurrency, args.requests)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--requests", type=int, default=256, help="requests per endpoint and concurrency level")
+    parser.add_argument("--branches", type=int, default=8)
+    parser.add_argument("--rows-per-request", type=int, default=20, help="rows of each branch-month")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="seconds slept per DB execute()")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per LLM call")
+    parser.add_argument("--cpu-mode", choices=["processes", "threads"],
+                        help="override ANALYZE_CPU_IN_PROCESSES for the async handler")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here as well")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    report = {
+        "benchmark": "async_analyze",
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {k: getattr(args, k) for k in ("requests", "branches", "rows_per_request", "db_latency",
+                                                   "llm_latency", "cpu_mode", "seed")},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "waste_logs.sqlite3")
+        branches = build_database(db_path, args.branches, args.rows_per_request, args.seed)
+        port = free_port()
+        command = [sys.executable, "-m", "benchmarks.bench_async_analyze", "--serve", "--db", db_path,
+                   "--port", str(port), "--db-latency", str(args.db_latency), "--llm-latency", str(args.llm_latency)]
+        if args.cpu_mode:
+            command += ["--cpu-mode", args.cpu_mode]
+        proc = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        try:
+            report["results"] = asyncio.run(run_client(args, f"http://127.0.0.1:{port}", proc, branches))
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
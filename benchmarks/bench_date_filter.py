@@ -0,0 +1,106 @@
+# benchmarks/bench_date_filter.py
+"""
+Branch-month scan time with the legacy STR_TO_DATE/YEAR/MONTHNAME filter vs.
+the typed-column range filter + (Branch, date) index.
+
+Runs against a SQLite stand-in table built from the bundled CSV, replicated
+and spread over `--months` months until it reaches `--rows` rows:
+
+    python -m benchmarks.bench_date_filter --rows 200000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+import pandas as pd
+
+from config import MYSQL_TABLE_NAME, MYSQL_TYPED_DATE_COLUMN
+from db import build_month_query
+from db_pool import ConnectionPool, sqlite_stand_in_factory
+import migrate_date_column
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "Food & Beverage Waste_Pattern_Dataset.csv")
+
+
+def build_table(path: str, rows: int, months: int):
+    base = pd.read_csv(CSV_PATH, dtype=str, keep_default_na=False)
+    stamp = pd.to_datetime(base["Date"] + " " + base["Time"], format="%d-%b-%y %H:%M")
+    parts, copy = [], 0
+    while sum(len(p) for p in parts) < rows:
+        part = base.copy()
+        shifted = stamp + pd.DateOffset(months=copy % months)
+        part["Date"] = shifted.dt.strftime("%d-%b-%Y %H:%M")
+        part["ID"] = range(copy * len(base) + 1, (copy + 1) * len(base) + 1)
+        parts.append(part)
+        copy += 1
+    table = pd.concat(parts, ignore_index=True).head(rows)
+    conn = sqlite3.connect(path)
+    table.to_sql(MYSQL_TABLE_NAME, conn, index=False, if_exists="replace")
+    conn.execute(f"CREATE UNIQUE INDEX pk_{MYSQL_TABLE_NAME} ON {MYSQL_TABLE_NAME} (ID)")
+    conn.commit()
+    conn.close()
+
+
+def time_query(pool: ConnectionPool, query: str, params: tuple, repeat: int) -> dict:
+    timings, n_rows = [], 0
+    with pool.connection() as conn:
+        for _ in range(repeat):
+            cursor = conn.cursor()
+            start = time.perf_counter()
+            cursor.execute(query, params)
+            n_rows = len(cursor.fetchall())
+            timings.append(time.perf_counter() - start)
+            cursor.close()
+    timings.sort()
+    return {"rows": n_rows, "median_seconds": round(timings[len(timings) // 2], 5),
+            "min_seconds": round(timings[0], 5)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--months", type=int, default=24)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--branch", default="New York - Main")
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--month", default="February")
+    parser.add_argument("--output", help="write the JSON result here as well")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "waste_logs.sqlite3")
+        build_table(path, args.rows, args.months)
+        pool = ConnectionPool(sqlite_stand_in_factory(path), size=1)
+
+        legacy = time_query(pool, *build_month_query(args.branch, args.year, args.month, typed_date_column=None),
+                            repeat=args.repeat)
+
+        with pool.connection() as conn:
+            migrate_date_column.add_column(conn)
+            backfilled = migrate_date_column.backfill(conn)
+            migrate_date_column.add_index(conn)
+        typed = time_query(pool, *build_month_query(args.branch, args.year, args.month,
+                                                    typed_date_column=MYSQL_TYPED_DATE_COLUMN),
+                           repeat=args.repeat)
+        pool.close()
+
+    result = {
+        "benchmark": "date_filter",
+        "table_rows": args.rows,
+        "rows_backfilled": backfilled,
+        "legacy_str_to_date": legacy,
+        "typed_range_indexed": typed,
+        "speedup": round(legacy["median_seconds"] / typed["median_seconds"], 1) if typed["median_seconds"] else None,
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
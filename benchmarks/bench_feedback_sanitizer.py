@@ -0,0 +1,141 @@
+# benchmarks/bench_feedback_sanitizer.py
+"""
+feedback_sanitizer.parse_feedback vs. the line-by-line cleanup that used to
+run inline in /send-chef-feedback.
+
+Both are timed over SAMPLES (typical LLM outputs: subject lines, greetings,
+placeholders, sign-offs, blank lines, CRLF); the outputs they must give are
+pinned in tests/test_feedback_sanitizer.py.
+
+    python -m benchmarks.bench_feedback_sanitizer --repeat 20000
+"""
+import argparse
+import json
+import time
+
+from feedback_sanitizer import parse_feedback
+
+CHEF, MANAGER, BRANCH = "Maria Garcia", "Robert", "LA - Downtown"
+
+SAMPLES = [
+    "Subject: Let's Fix Our $513 Milk Waste – FIFO Alert!\n\n"
+    "Hi [Station Chef's Name],\n\n"
+    "We wasted 12.0 units of Milk at the Dessert Station, 3x the expected amount.\n"
+    "Please rotate stock using FIFO and check expiry dates before prep.\n\n"
+    "Best regards,\n[Your Name]",
+
+    "Subject: Prime Beef expiry issue\n"
+    "Hello Chef Maria,\n"
+    "Dear team,\n"
+    "The Night Shift used Prime Beef two days past expiry.\n"
+    "Thanks,\n"
+    "Robert",
+
+    "Team, we need to address the waste on our Prime Beef. We wasted 5.0 units, "
+    "which is five times the expected amount.",
+
+    "  \n\nsubject:   Heat spoilage on the Grill   \n\n"
+    "Hi\n"
+    "Temperatures reached 31°C during lunch.\n"
+    "   Keep proteins refrigerated until service.   \n"
+    "Regards,\n"
+    "[Your Name]\n"
+    "Kitchen Ops",
+
+    "Subject: Overprep on cold days\r\n"
+    "Dear [Station Chef's Name],\r\n"
+    "\r\n"
+    "Sales dropped while prep stayed the same.\r\n"
+    "Hello again - please scale prep to the forecast.\r\n"
+    "Thank you,\r\n"
+    "[Your Name]\r\n",
+
+    "Subject: Supplier quality\n"
+    "Our SupplierX deliveries show 40% more waste.\n"
+    "Hi-temperature storage is not the cause.\n"
+    "Hello [Station Chef's Name], please log rejected items.\n"
+    "Best,\n",
+
+    "Subject: Nothing else\n",
+
+    "",
+
+    "Hi Chef,\nBEST REGARDS,\nEverything below is a signature.",
+
+    "Subject: Station inefficiency\n"
+    "1. Weigh trim waste per batch.\n"
+    "2. Report to [Your Name] daily.\n"
+    "Hello from the ops team\n"
+    "best,\n"
+    "[Your Name]",
+]
+
+
+def legacy_parse(raw_feedback: str, chef_name: str, manager_name: str, branch: str):
+    """The inline cleanup from main.send_chef_feedback before feedback_sanitizer existed."""
+    lines = raw_feedback.strip().split('\n')
+    subject_line = lines[0].strip()
+    if subject_line.lower().startswith("subject:"):
+        email_subject = subject_line[8:].strip()
+        body_lines = lines[1:]
+    else:
+        email_subject = f"Waste Feedback Required – Item ({branch})"
+        body_lines = lines
+
+    body_text = '\n'.join(line.strip() for line in body_lines if line.strip())
+    body_text = body_text.replace("[Station Chef's Name]", (chef_name or "Chef").split()[0])
+    body_text = body_text.replace("[Your Name]", manager_name)
+
+    lines = body_text.splitlines()
+    cleaned_lines = []
+    for idx, line in enumerate(lines):
+        lower = line.strip().lower()
+        is_greeting = (
+            lower.startswith("hi ") or lower == "hi" or
+            lower.startswith("hello ") or lower == "hello" or
+            lower.startswith("dear ") or lower == "dear"
+        )
+        if idx <= 2 and is_greeting:
+            continue
+        cleaned_lines.append(line)
+    lines = cleaned_lines
+
+    closers = ("best,", "best regards,", "regards,", "thanks,", "thank you,")
+    for i, line in enumerate(lines):
+        if line.strip().lower() in closers:
+            lines = lines[:i]
+            break
+    return email_subject, "\n".join(l for l in lines if l.strip())
+
+
+def time_per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for sample in SAMPLES:
+            fn(sample, CHEF, MANAGER, BRANCH)
+    return (time.perf_counter() - start) / (repeat * len(SAMPLES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--output", help="write the JSON result here as well")
+    args = parser.parse_args()
+
+    legacy = time_per_call(legacy_parse, args.repeat)
+    current = time_per_call(parse_feedback, args.repeat)
+    result = {
+        "samples": len(SAMPLES),
+        "calls": args.repeat * len(SAMPLES),
+        "legacy_us_per_call": round(legacy * 1e6, 3),
+        "sanitizer_us_per_call": round(current * 1e6, 3),
+        "speedup": round(legacy / current, 2),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(result, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# benchmarks/bench_ingest.py
+"""
+Load test of POST /ingest (ingestion.py): concurrent clients posting
+waste-log events one per request and in batches, against one uvicorn process.
+
+The database is a SQLite stand-in holding --history-rows rows per branch for
+the month before the events (benchmarks.synthetic rows); the LLM chains of the
+critical-event follow-ups answer after --llm-latency seconds, with the LLM
+rate limit off. Every scenario posts --events new events (unique IDs), in
+requests of --events-per-request events from --concurrency clients, and
+reports events/sec, request latencies and the ingester's batching
+(GET /ingest/stats) over the scenario. A last scenario re-posts events
+already stored, which are answered as duplicates.
+
+    python -m benchmarks.bench_ingest --events-per-request 1 20 500 --concurrency 64 --output ingest.json
+
+Single-event requests are bounded by per-request HTTP cost (client and
+server share the host); the ingester's batches grow with the events in
+flight, so throughput comes from concurrency x events per request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_async_analyze import free_port, wait_ready
+
+YEAR, HISTORY_MONTH, MONTH = 2025, "February", "March"
+
+
+def serve(args):
+    os.environ.update(LLM_RATE_LIMIT_PER_SEC="0", DETECTION_MODE=args.detection_mode)
+
+    import uvicorn
+    from langchain_core.messages import AIMessage
+
+    import main
+    from db_pool import init_pool, sqlite_stand_in_factory
+    from llm import SUMMARY, CHEF_FEEDBACK, SIMULATED_SUMMARY, SIMULATED_CHEF_FEEDBACK
+    from llm_dispatcher import LLMDispatcher
+
+    class SlowChain:
+        def __init__(self, text: str):
+            self.text = text
+
+        async def ainvoke(self, _inputs):
+            await asyncio.sleep(args.llm_latency)
+            return AIMessage(content=self.text)
+
+    chains = {SUMMARY: SlowChain(SIMULATED_SUMMARY), CHEF_FEEDBACK: SlowChain(SIMULATED_CHEF_FEEDBACK)}
+    LLMDispatcher._get_chains = lambda self: self.chains or chains
+
+    # Registered after main's own startup hook, which created the MySQL pool
+    @main.app.on_event("startup")
+    def use_stand_in_db():
+        init_pool(sqlite_stand_in_factory(args.db))
+
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning", timeout_keep_alive=30)
+
+
+def build_database(path: str, branches: int, history_rows: int, seed: int) -> list:
+    from benchmarks.synthetic import generate_waste_logs, write_sqlite_table
+    from db_pool import sqlite_stand_in_factory
+    import migrate_date_column
+
+    names = [f"Bench Branch {i:02d}" for i in range(branches)]
+    write_sqlite_table(generate_waste_logs(branches * history_rows, YEAR, HISTORY_MONTH, branches=names, seed=seed), path)
+    conn = sqlite_stand_in_factory(path)()
+    try:
+        migrate_date_column.add_index(conn)
+    finally:
+        conn.close()
+    return names
+
+
+def generate_events(rows: int, branches: list, seed: int, start_id: int) -> list:
+    from benchmarks.synthetic import generate_waste_logs
+
+    df = generate_waste_logs(rows, YEAR, MONTH, branches=branches, seed=seed, start_id=start_id)
+    return json.loads(df.to_json(orient="records"))
+
+
+async def load_test(client, base: str, events: list, per_request: int, concurrency: int) -> dict:
+    latencies, errors, accepted, duplicates = [], 0, 0, 0
+    bodies = iter([events[i:i + per_request] for i in range(0, len(events), per_request)])
+
+    async def user():
+        nonlocal errors, accepted, duplicates
+        for body in bodies:
+            start = time.perf_counter()
+            try:
+                response = await client.post(f"{base}/ingest", json=body[0] if per_request == 1 else body)
+                ok = response.status_code == 200
+                if ok:
+                    result = response.json()
+                    accepted += result["accepted"]
+                    duplicates += len(result["duplicates"])
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            errors += not ok
+
+    before = (await client.get(f"{base}/ingest/stats")).json()
+    start = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    after = (await client.get(f"{base}/ingest/stats")).json()
+    ms = np.asarray(latencies) * 1000
+    batches = after["batches"] - before["batches"]
+    return {
+        "events": len(events),
+        "requests": len(latencies),
+        "errors": errors,
+        "accepted": accepted,
+        "duplicates": duplicates,
+        "seconds": round(elapsed, 3),
+        "events_per_sec": round(len(events) / elapsed, 1),
+        "req_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 1),
+        "p99_ms": round(float(np.percentile(ms, 99)), 1),
+        "max_ms": round(float(ms.max()), 1),
+        "batches": batches,
+        "mean_batch_events": round((after["events"] - before["events"]) / batches, 1) if batches else 0.0,
+        "critical": after["critical"] - before["critical"],
+        "followup_dropped": after["followup_dropped"] - before["followup_dropped"],
+    }
+
+
+async def run_client(args, base: str, proc, branches: list) -> dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency + 8, keepalive_expiry=10)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        await wait_ready(client, base, proc)
+        # Warm-up: first metrics sync, TS seeding, connection pool
+        await load_test(client, base, generate_events(len(branches), branches, args.seed, 1_000_000), 1, 1)
+        results, start_id = {}, 2_000_000
+        for per_request in args.events_per_request:
+            events = generate_events(args.events, branches, args.seed + per_request, start_id)
+            results[f"{per_request}_per_request"] = await load_test(client, base, events, per_request,
+                                                                    args.concurrency)
+            start_id += args.events
+        results["duplicates_resent"] = await load_test(client, base, events, args.events_per_request[-1],
+                                                       args.concurrency)
+        # Critical events still waiting for their LLM follow-up are dropped at shutdown
+        deadline = time.monotonic() + args.timeout
+        while time.monotonic() < deadline:
+            stats = (await client.get(f"{base}/ingest/stats")).json()
+            if stats["followup_done"] + stats["followup_failed"] + stats["followup_dropped"] >= stats["followup_queued"]:
+                break
+            await asyncio.sleep(0.5)
+        results["ingest_stats"] = stats
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=10_000, help="events per scenario")
+    parser.add_argument("--events-per-request", type=int, nargs="+", default=[20, 100, 500])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--branches", type=int, default=8)
+    parser.add_argument("--history-rows", type=int, default=2_000, help="stored rows per branch before the events")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds per LLM call")
+    parser.add_argument("--detection-mode", choices=["static", "timeseries"], default="static")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here as well")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    report = {
+        "benchmark": "ingest",
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {k: getattr(args, k) for k in ("events", "events_per_request", "concurrency", "branches",
+                                                   "history_rows", "llm_latency", "detection_mode", "seed")},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "waste_logs.sqlite3")
+        branches = build_database(db_path, args.branches, args.history_rows, args.seed)
+        port = free_port()
+        command = [sys.executable, "-m", "benchmarks.bench_ingest", "--serve", "--db", db_path, "--port", str(port),
+                   "--llm-latency", str(args.llm_latency), "--detection-mode", args.detection_mode]
+        # Caches live with the database, so every run starts cold
+        env = dict(os.environ, SNAPSHOT_CACHE_DIR=os.path.join(tmp, "snapshots"),
+                   METRICS_STORE_PATH=os.path.join(tmp, "metrics.sqlite3"),
+                   ROLLUP_PATH=os.path.join(tmp, "rollup.sqlite3"),
+                   ANALYSIS_CACHE_PATH=os.path.join(tmp, "analysis.sqlite3"),
+                   LLM_CACHE_PATH=os.path.join(tmp, "llm.sqlite3"), JOBS_DB_PATH=os.path.join(tmp, "jobs.sqlite3"))
+        proc = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env)
+        try:
+            report["results"] = asyncio.run(run_client(args, f"http://127.0.0.1:{port}", proc, branches))
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# benchmarks/bench_llm_clients.py
+"""
+Client setup and per-call overhead of the LLM chains, before and after the
+process-wide registry (llm_registry.py).
+
+Calls go to a local Groq-compatible endpoint (stdlib HTTP server speaking
+HTTP/1.1 keep-alive, answering instantly), so every number is client-side
+overhead: building ChatGroq + its SDK clients, the chain, TCP connects. The
+server counts the TCP connections it accepts.
+
+- build:        one ChatGroq + prompt chain, as the helpers did per call,
+                against a cached registry lookup
+- sync_calls:   generate_llm_summary-style blocking calls; before = new
+                chain per call, after = registry chain
+- dispatch_runs: LLMDispatcher.run over --jobs prompts, repeated; before =
+                chains built per dispatcher and a fresh event loop per run,
+                after = registry chains on its long-lived loop
+
+    python -m benchmarks.bench_llm_clients --calls 200 --runs 20 --output llm_clients.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETION = json.dumps({
+    "id": "bench", "object": "chat.completion", "created": 0, "model": "bench",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode("utf-8")
+
+
+class CompletionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+
+class CompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive clients wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, *_args):
+        pass
+
+
+def start_server() -> CompletionServer:
+    server = CompletionServer(("127.0.0.1", 0), CompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def measure(server: CompletionServer, fn, count: int) -> dict:
+    before = server.connections
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 4), "per_call_ms": round(seconds / count * 1000, 3),
+            "tcp_connections": server.connections - before}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200, help="blocking calls per variant")
+    parser.add_argument("--runs", type=int, default=20, help="dispatcher runs per variant")
+    parser.add_argument("--jobs", type=int, default=20, help="prompts per dispatcher run")
+    parser.add_argument("--output", help="write the JSON result here as well")
+    args = parser.parse_args()
+
+    server = start_server()
+    # Set before config / langchain_groq read them
+    os.environ.update(GROQ_API_KEY="bench", GROQ_API_BASE=f"http://127.0.0.1:{server.server_address[1]}",
+                      LLM_PROVIDER="groq", LLM_CACHE_ENABLED="false", LLM_RATE_LIMIT_PER_SEC="0")
+
+    start = time.perf_counter()
+    from langchain_groq import ChatGroq
+    from llm import LLM_PROMPT_SPECS, SUMMARY, get_chain, _build_chain
+    from llm_dispatcher import LLMDispatcher, LLMJob
+    from llm_registry import get_llm_registry
+    import_seconds = time.perf_counter() - start
+
+    registry = get_llm_registry()
+
+    def old_chain(kind):
+        _, temperature = LLM_PROMPT_SPECS[kind]
+        return _build_chain(kind, ChatGroq(temperature=temperature, groq_api_key=registry.api_key,
+                                           model_name=registry.model_name))
+
+    report = {
+        "benchmark": "llm_clients",
+        "python": platform.python_version(),
+        "settings": {"calls": args.calls, "runs": args.runs, "jobs": args.jobs},
+        "import_seconds": round(import_seconds, 4),
+    }
+
+    start = time.perf_counter()
+    get_chain(SUMMARY)
+    first = time.perf_counter() - start
+    report["build"] = {
+        "before_ms": round(measure(server, lambda: [old_chain(SUMMARY) for _ in range(20)], 20)["per_call_ms"], 3),
+        "after_first_ms": round(first * 1000, 3),
+        "after_cached_ms": measure(server, lambda: [get_chain(SUMMARY) for _ in range(1000)], 1000)["per_call_ms"],
+    }
+
+    prompt = {"prompt": "Waste Analysis Summary for Item: Milk"}
+    report["sync_calls"] = {
+        "before": measure(server, lambda: [old_chain(SUMMARY).invoke(prompt) for _ in range(args.calls)], args.calls),
+        "after": measure(server, lambda: [get_chain(SUMMARY).invoke(prompt) for _ in range(args.calls)], args.calls),
+    }
+
+    def jobs():
+        return [LLMJob(key=i, kind=SUMMARY, prompt=f"prompt {i}") for i in range(args.jobs)]
+
+    def dispatch_before():
+        for _ in range(args.runs):
+            dispatcher = LLMDispatcher(chains={kind: old_chain(kind) for kind in LLM_PROMPT_SPECS}, rate_per_sec=0)
+            asyncio.run(dispatcher.arun(jobs()))
+
+    def dispatch_after():
+        for _ in range(args.runs):
+            LLMDispatcher(rate_per_sec=0).run(jobs())
+
+    calls = args.runs * args.jobs
+    report["dispatch_runs"] = {"before": measure(server, dispatch_before, calls),
+                               "after": measure(server, dispatch_after, calls)}
+    report["registry"] = registry.stats()
+    server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
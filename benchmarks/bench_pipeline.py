@@ -0,0 +1,195 @@
+# benchmarks/bench_pipeline.py
+"""
+End-to-end pipeline timings on synthetic branch-months (benchmarks.synthetic).
+
+For every size, all rows belong to one branch and one month, i.e. the
+worst case for a single /analyze call:
+
+- metrics:   calculate_branch_metrics
+- analysis:  run_branch_analysis with a stubbed LLM (instant responses, no
+             rate limit, no caches), capped by --analysis-max-rows
+- load:      load_mysql_data from a SQLite stand-in table with the typed
+             date column and (Branch, date) index, snapshot cache emptied
+             before every repeat (includes writing the snapshot)
+- load_snapshot: the same call served from the snapshot cache
+- update:    update_mysql_data writing every row, then again with df_loaded
+             so only the ~10% of rows whose Status changed are written
+
+    python -m benchmarks.bench_pipeline --sizes 1000 100000 1000000 --output bench.json
+    python -m benchmarks.bench_pipeline --sizes 1000 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from langchain_core.messages import AIMessage
+
+from db import load_mysql_data, update_mysql_data
+from db_pool import init_pool, sqlite_stand_in_factory
+from analysis import calculate_branch_metrics, run_branch_analysis
+from graph import build_graph
+from llm import SUMMARY, CHEF_FEEDBACK, SIMULATED_SUMMARY, SIMULATED_CHEF_FEEDBACK
+from llm_dispatcher import LLMDispatcher
+from snapshot_cache import get_snapshot_cache
+import migrate_date_column
+from benchmarks.synthetic import generate_waste_logs, to_analysis_frame, write_sqlite_table
+
+BRANCH = "New York - Main"
+YEAR, MONTH = 2025, "February"
+STATUSES = ["Approved by Manager", "Pending", "Ignore", "N/A (No Issue)"]
+
+
+class StubChain:
+    """Async chain stand-in that answers immediately."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+    async def ainvoke(self, _inputs):
+        return AIMessage(content=self.text)
+
+
+def stub_dispatcher() -> LLMDispatcher:
+    chains = {SUMMARY: StubChain(SIMULATED_SUMMARY), CHEF_FEEDBACK: StubChain(SIMULATED_CHEF_FEEDBACK)}
+    return LLMDispatcher(chains=chains, rate_per_sec=0, max_concurrency=64)
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_size(rows: int, repeat: int, analysis_max_rows: int, seed: int, workdir: str) -> dict:
+    raw = generate_waste_logs(rows, YEAR, MONTH, branches=[BRANCH], seed=seed)
+    frame = to_analysis_frame(raw)
+    result = {"rows": rows}
+
+    seconds = best_of(lambda: calculate_branch_metrics(frame), repeat)
+    result["metrics"] = {"seconds": round(seconds, 4), "rows_per_sec": round(rows / seconds)}
+
+    analyzed = {}
+    if analysis_max_rows and rows > analysis_max_rows:
+        result["analysis"] = {"skipped": f"rows > --analysis-max-rows ({analysis_max_rows})"}
+    else:
+        app = build_graph()
+
+        def analyze():
+            analyzed["df"] = run_branch_analysis(frame, BRANCH, app, dispatcher=stub_dispatcher())
+
+        seconds = best_of(analyze, 1)
+        flagged = int((analyzed["df"]["LLM_Prompt"] != "").sum())
+        result["analysis"] = {"seconds": round(seconds, 4), "rows_per_sec": round(rows / seconds),
+                              "graph_invocations": flagged}
+
+    # Keep peak memory down at 1M rows: only one copy of the rows alive at a time
+    del frame, analyzed
+    path = os.path.join(workdir, f"waste_logs_{rows}.sqlite3")
+    write_sqlite_table(raw, path)
+    del raw
+    pool = init_pool(sqlite_stand_in_factory(path), size=1)
+    with pool.connection() as db_conn:
+        migrate_date_column.add_index(db_conn)
+
+    loaded = {}
+    snapshots = get_snapshot_cache()
+
+    def load():
+        if snapshots is not None:
+            snapshots.invalidate()
+        loaded["df"] = load_mysql_data(BRANCH, YEAR, MONTH)
+
+    seconds = best_of(load, repeat)
+    df_loaded = loaded["df"]
+    result["load"] = {"seconds": round(seconds, 4), "rows_per_sec": round(len(df_loaded) / seconds),
+                      "rows_loaded": len(df_loaded),
+                      "bytes_compact": df_loaded.attrs["load_stats"]["bytes_compact"]}
+    if snapshots is not None:
+        seconds = best_of(lambda: load_mysql_data(BRANCH, YEAR, MONTH), repeat)
+        result["load_snapshot"] = {"seconds": round(seconds, 4), "rows_per_sec": round(len(df_loaded) / seconds)}
+
+    rng = np.random.default_rng(seed)
+    updates = pd.DataFrame({
+        "ID": df_loaded["ID"].to_numpy(),
+        "Status": np.asarray(STATUSES, dtype=object)[rng.integers(0, len(STATUSES), len(df_loaded))],
+    })
+    updates["Chef_Feedback_Summary"] = np.where(updates["Status"] == "Approved by Manager",
+                                                SIMULATED_CHEF_FEEDBACK, "N/A")
+    full = update_mysql_data(updates)
+    result["update_all"] = {k: full[k] for k in ("rows_written", "statements", "elapsed_seconds", "rows_per_sec")}
+
+    del loaded, df_loaded
+    df_reloaded = load_mysql_data(BRANCH, YEAR, MONTH)
+    changed = rng.random(len(updates)) < 0.10
+    updates.loc[changed, "Status"] = "Pending"
+    updates.loc[changed, "Chef_Feedback_Summary"] = "N/A"
+    start = time.perf_counter()
+    incremental = update_mysql_data(updates, df_loaded=df_reloaded)
+    result["update_changed_only"] = {
+        "rows_written": incremental["rows_written"],
+        "seconds_incl_change_detection": round(time.perf_counter() - start, 4),
+    }
+    pool.close()
+    return result
+
+
+def compare(current: dict, baseline: dict) -> dict:
+    """seconds ratio current/baseline per size and stage (> 1 means slower)."""
+    ratios = {}
+    for size, stages in current["results"].items():
+        base = baseline.get("results", {}).get(size)
+        if not base:
+            continue
+        for stage, values in stages.items():
+            if not isinstance(values, dict):
+                continue
+            key = "seconds" if "seconds" in values else "elapsed_seconds"
+            old = base.get(stage, {}).get(key)
+            new = values.get(key)
+            if old and new:
+                ratios[f"{size}/{stage}"] = round(new / old, 2)
+    return ratios
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3, help="best-of repeats for metrics and load")
+    parser.add_argument("--analysis-max-rows", type=int, default=100_000,
+                        help="skip run_branch_analysis above this many rows (0: never skip)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here as well")
+    parser.add_argument("--compare", help="earlier JSON result to compute time ratios against")
+    args = parser.parse_args()
+
+    report = {
+        "benchmark": "pipeline",
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "branch": BRANCH,
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.sizes:
+            report["results"][str(rows)] = bench_size(rows, args.repeat, args.analysis_max_rows, args.seed, tmp)
+    if args.compare:
+        with open(args.compare) as f:
+            report["ratios_vs_baseline"] = compare(report, json.load(f))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+# benchmarks/bench_rollups.py
+"""
+Rollup cube (rollup_cube.py) refresh and query timings on synthetic
+analyzed rows.
+
+Rows come from benchmarks.synthetic over --branches x --months; flags are
+computed with detect_branch_flags per branch-month and statuses are drawn at
+random (the graph and LLM do not change the cube's cost), then:
+
+- refresh:     RollupCube.refresh per branch-month, as after each /analyze
+- refresh_again: the same months re-analyzed with 10% of statuses changed
+- queries:     typical dashboard slices, median of --repeat runs, against a
+               pandas groupby over the analyzed rows held in memory (the
+               lower bound of re-deriving them without the cube)
+
+    python -m benchmarks.bench_rollups --rows 200000 --output rollups.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis import calculate_branch_metrics, detect_branch_flags
+from rollup_cube import RollupCube, rollup_facts, MEASURES
+from benchmarks.synthetic import generate_waste_logs, to_analysis_frame
+
+STATUSES = ["Approved by Manager", "Pending", "Ignore", "N/A (No Issue)"]
+QUERIES = {
+    "branches": dict(group_by=["branch"]),
+    "branch_month_trend": dict(group_by=["branch", "month"]),
+    "one_branch_stations": dict(group_by=["station", "shift"], filters={"branch": ["Branch 00"]}),
+    "top_supplier_ingredients": dict(group_by=["supplier", "ingredient"], order_by="wastage_cost", limit=10),
+    "quarter_total": dict(group_by=[], month_from="2025-01", month_to="2025-03"),
+}
+
+
+def analyzed_months(rows: int, branches: int, months: int, seed: int):
+    names = [f"Branch {i:02d}" for i in range(branches)]
+    df = to_analysis_frame(generate_waste_logs(rows, 2025, "January", months=months, branches=names, seed=seed))
+    rng = np.random.default_rng(seed)
+    parts = []
+    for _, part in df.groupby([df["Branch"], df["Date"].dt.to_period("M")]):
+        part = part.copy()
+        flagged = detect_branch_flags(part, calculate_branch_metrics(part))
+        flagged["Status"] = np.asarray(STATUSES, dtype=object)[rng.integers(0, len(STATUSES), len(flagged))]
+        parts.append(flagged)
+    return parts
+
+
+def median_ms(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--branches", type=int, default=10)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here as well")
+    args = parser.parse_args()
+
+    parts = analyzed_months(args.rows, args.branches, args.months, args.seed)
+    report = {
+        "benchmark": "rollups",
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "settings": {k: getattr(args, k) for k in ("rows", "branches", "months", "repeat", "seed")},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        cube = RollupCube(os.path.join(tmp, "cube.sqlite3"))
+        start = time.perf_counter()
+        for part in parts:
+            cube.refresh(part)
+        seconds = time.perf_counter() - start
+        report["refresh"] = {"seconds": round(seconds, 3), "rows_per_sec": round(args.rows / seconds),
+                             "per_branch_month_ms": round(seconds / len(parts) * 1000, 2)}
+
+        rng = np.random.default_rng(args.seed + 1)
+        start = time.perf_counter()
+        for part in parts:
+            changed = rng.random(len(part)) < 0.10
+            part.loc[changed, "Status"] = "Pending"
+            cube.refresh(part)
+        seconds = time.perf_counter() - start
+        report["refresh_again"] = {"seconds": round(seconds, 3), "rows_per_sec": round(args.rows / seconds)}
+        report["cube"] = cube.stats()
+
+        facts = rollup_facts(pd.concat(parts, ignore_index=True))
+        assert cube.query([])[0]["rows"] == len(facts)
+        report["queries"] = {}
+        for name, kwargs in QUERIES.items():
+            def raw():
+                rows = facts
+                for dim, values in kwargs.get("filters", {}).items():
+                    rows = rows[rows[dim].isin(values)]
+                if "month_from" in kwargs:
+                    rows = rows[(rows["month"] >= kwargs["month_from"]) & (rows["month"] <= kwargs["month_to"])]
+                return rows.groupby(kwargs["group_by"])[MEASURES].sum() if kwargs["group_by"] else rows[MEASURES].sum()
+
+            report["queries"][name] = {
+                "groups": len(cube.query(**kwargs)),
+                "cube_ms": median_ms(lambda: cube.query(**kwargs), args.repeat),
+                "raw_groupby_ms": median_ms(raw, args.repeat),
+            }
+        cube.close()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
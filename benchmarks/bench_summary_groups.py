@@ -0,0 +1,114 @@
+# benchmarks/bench_summary_groups.py
+"""
+LLM calls of one branch-month analysis with one summary per flagged row
+against one summary per root-cause cluster (LLM_SUMMARY_GROUPING,
+analysis.assign_summary_clusters).
+
+For each --rows size, a synthetic branch-month (benchmarks.synthetic) goes
+through analysis.assign_summary_clusters and prepare_rows with grouping off
+and on, and its jobs through an LLMDispatcher whose chains answer after
+--llm-latency seconds (no rate limit, no response cache). Reported per variant: summary / chef feedback
+calls actually sent, calls saved against one per job, dispatch seconds and
+the time the same calls take at the configured LLM_RATE_LIMIT_PER_SEC.
+
+    python -m benchmarks.bench_summary_groups --rows 500 2000 10000 --output summary_groups.json
+
+Chef feedback stays one call per row: it is addressed to the row's chef.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import time
+
+from langchain_core.messages import AIMessage
+
+import analysis
+from benchmarks.synthetic import generate_waste_logs, to_analysis_frame
+from config import LLM_RATE_LIMIT_PER_SEC
+from graph import get_graph
+from llm import SUMMARY, CHEF_FEEDBACK, SIMULATED_SUMMARY, SIMULATED_CHEF_FEEDBACK
+from llm_dispatcher import LLMDispatcher
+
+BRANCH = "Bench Branch"
+
+
+class SlowChain:
+    def __init__(self, text: str, latency: float):
+        self.text = text
+        self.latency = latency
+
+    async def ainvoke(self, _inputs):
+        await asyncio.sleep(self.latency)
+        return AIMessage(content=self.text)
+
+
+def run_variant(df, app, grouping: bool, latency: float) -> dict:
+    analysis.LLM_SUMMARY_GROUPING = grouping
+    metrics = analysis.calculate_branch_metrics(df.copy())
+    start = time.perf_counter()
+    rows = analysis.assign_summary_clusters(df.copy(), metrics)
+    rows, jobs = analysis.prepare_rows(rows, metrics, app)
+    prepare_seconds = time.perf_counter() - start
+
+    chains = {SUMMARY: SlowChain(SIMULATED_SUMMARY, latency),
+              CHEF_FEEDBACK: SlowChain(SIMULATED_CHEF_FEEDBACK, latency)}
+    dispatcher = LLMDispatcher(chains=chains, rate_per_sec=0)
+    stats = dispatcher.run(jobs)
+    analysis.apply_llm_results(rows, jobs)
+    if rows["LLM_Summary"].isna().any() or rows["Chef_Feedback_Summary"].isna().any():
+        raise RuntimeError("rows left without an LLM result")
+
+    summary_jobs = sum(job.kind == SUMMARY for job in jobs)
+    summary_calls = len({job.prompt for job in jobs if job.kind == SUMMARY})
+    calls = stats.submitted - stats.deduplicated
+    return {
+        "summary_jobs": summary_jobs,
+        "summary_calls": summary_calls,
+        "chef_feedback_calls": calls - summary_calls,
+        "calls": calls,
+        "calls_saved": stats.deduplicated,
+        "prepare_seconds": round(prepare_seconds, 3),
+        "dispatch_seconds": round(stats.elapsed_seconds, 3),
+        "seconds_at_rate_limit": round(calls / LLM_RATE_LIMIT_PER_SEC, 1) if LLM_RATE_LIMIT_PER_SEC > 0 else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[500, 2000, 10000], help="rows of the branch-month")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="seconds per LLM call")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here as well")
+    args = parser.parse_args()
+
+    app = get_graph()
+    report = {
+        "benchmark": "summary_groups",
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "settings": {"rows": args.rows, "llm_latency": args.llm_latency, "seed": args.seed,
+                     "llm_rate_limit_per_sec": LLM_RATE_LIMIT_PER_SEC},
+        "results": {},
+    }
+    for rows in args.rows:
+        df = to_analysis_frame(generate_waste_logs(rows, 2025, "March", branches=[BRANCH], seed=args.seed))
+        per_row = run_variant(df, app, False, args.llm_latency)
+        grouped = run_variant(df, app, True, args.llm_latency)
+        report["results"][str(rows)] = {
+            "flagged_rows": per_row["summary_jobs"],
+            "per_row": per_row,
+            "grouped": grouped,
+            "summary_call_reduction": round(per_row["summary_calls"] / max(grouped["summary_calls"], 1), 1),
+            "total_call_reduction": round(per_row["calls"] / max(grouped["calls"], 1), 2),
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
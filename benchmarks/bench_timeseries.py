@@ -0,0 +1,140 @@
+# benchmarks/bench_timeseries.py
+"""
+Time-series detection (timeseries_detection.py) timings and flag counts on
+synthetic multi-month rows (benchmarks.synthetic).
+
+- per_row_node: graph_nodes.detect_record_flags over row dicts, the scalar
+                reference node (capped by --node-max-rows)
+- static:       detect_branch_flags per branch-month (static mode)
+- timeseries:   timeseries_scores over all months at once
+- streaming:    StreamingDetector.score in micro-batches of --batch-rows, in
+                date order, with the detector's state size at the end
+
+Then injects waste spikes (--spike-share of the rows after the first month,
+waste x --spike-mult) and a level shift (the largest series at x1.5 for its
+last month) and counts which rows the static and the time-series flags catch.
+
+    python -m benchmarks.bench_timeseries --rows 200000 --output timeseries.json
+"""
+import argparse
+import json
+import platform
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis import calculate_branch_metrics, detect_branch_flags
+from config import TS_MIN_HISTORY
+from graph_nodes import detect_record_flags
+from timeseries_detection import SERIES_COLUMNS, StreamingDetector, timeseries_scores
+from benchmarks.synthetic import generate_waste_logs, to_analysis_frame, CSV_DATE_FORMAT
+
+
+def waste_frame(rows: int, branches: int, months: int, seed: int) -> pd.DataFrame:
+    names = [f"Branch {i:02d}" for i in range(branches)]
+    raw = generate_waste_logs(rows, 2025, "January", months=months, branches=names, seed=seed)
+    df = to_analysis_frame(raw)
+    # Time of day orders the rows of a series within a day
+    df["Date"] = pd.to_datetime(raw["Date"] + " " + raw["Time"], format=f"{CSV_DATE_FORMAT} %H:%M").to_numpy()
+    return df
+
+
+def static_flags(df: pd.DataFrame) -> pd.Series:
+    parts = [detect_branch_flags(part.copy(), calculate_branch_metrics(part))["High_Waste_Flag"]
+             for _, part in df.groupby([df["Branch"], df["Date"].dt.to_period("M")])]
+    return pd.concat(parts).reindex(df.index).astype(bool)
+
+
+def timeseries_flags(df: pd.DataFrame, static: pd.Series) -> pd.Series:
+    scores = timeseries_scores(df)
+    scored = scores["TS_History"] >= TS_MIN_HISTORY
+    return static.where(~scored, scores["TS_Anomaly_Flag"]).astype(bool)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--branches", type=int, default=10)
+    parser.add_argument("--months", type=int, default=3)
+    parser.add_argument("--batch-rows", type=int, default=500)
+    parser.add_argument("--node-max-rows", type=int, default=20_000)
+    parser.add_argument("--spike-share", type=float, default=0.005)
+    parser.add_argument("--spike-mult", type=float, default=4.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON result here as well")
+    args = parser.parse_args()
+
+    df = waste_frame(args.rows, args.branches, args.months, args.seed)
+    report = {
+        "benchmark": "timeseries",
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "settings": {k: getattr(args, k) for k in ("rows", "branches", "months", "batch_rows", "spike_share",
+                                                   "spike_mult", "seed")},
+    }
+
+    sample = df.head(args.node_max_rows)
+    metrics = calculate_branch_metrics(sample)
+    records = sample.to_dict(orient="records")
+    _, seconds = timed(lambda: [detect_record_flags(dict(r), metrics) for r in records])
+    report["per_row_node"] = {"rows": len(records), "rows_per_sec": round(len(records) / seconds)}
+
+    _, seconds = timed(static_flags, df)
+    report["static"] = {"seconds": round(seconds, 3), "rows_per_sec": round(len(df) / seconds)}
+    scores, seconds = timed(timeseries_scores, df)
+    report["timeseries"] = {"seconds": round(seconds, 3), "rows_per_sec": round(len(df) / seconds),
+                            "series": int(df.groupby(SERIES_COLUMNS, observed=True).ngroups)}
+
+    ordered = df.sort_values(["Date", "ID"], kind="stable")
+    detector = StreamingDetector()
+    start = time.perf_counter()
+    streamed = [detector.score(ordered.iloc[i:i + args.batch_rows]) for i in range(0, len(ordered), args.batch_rows)]
+    seconds = time.perf_counter() - start
+    streamed = pd.concat(streamed).reindex(df.index)
+    assert streamed["TS_Anomaly_Flag"].equals(scores["TS_Anomaly_Flag"])
+    stats = detector.stats()
+    report["streaming"] = {"seconds": round(seconds, 3), "rows_per_sec": round(len(df) / seconds),
+                           "batches": -(-len(df) // args.batch_rows), **stats,
+                           "state_mb": round(stats["rates_held"] * 8 / 2 ** 20, 2)}
+
+    # Injected anomalies: spikes after the first month (series have history by then) and a level shift
+    rng = np.random.default_rng(args.seed + 1)
+    month = df["Date"].dt.to_period("M")
+    eligible = np.flatnonzero((month > month.min()).to_numpy() & (df["Wastage Qty"] > 0).to_numpy())
+    spikes = df.index[rng.choice(eligible, size=int(len(df) * args.spike_share), replace=False)]
+    df["Wastage Qty"] = df["Wastage Qty"].astype(float)
+    df.loc[spikes, "Wastage Qty"] *= args.spike_mult
+    largest = df.groupby(SERIES_COLUMNS, observed=True).size().idxmax()
+    in_series = np.logical_and.reduce([(df[col] == value).to_numpy() for col, value in zip(SERIES_COLUMNS, largest)])
+    shifted = df.index[in_series & (month == month.max()).to_numpy() & ~df.index.isin(spikes)]
+    df.loc[shifted, "Wastage Qty"] *= 1.5
+
+    static = static_flags(df)
+    ts = timeseries_flags(df, static)
+    other = ~df.index.isin(spikes) & ~df.index.isin(shifted)
+    half = len(shifted) // 2
+    report["flags"] = {
+        name: {
+            "spikes_caught": f"{int(flags[spikes].sum())}/{len(spikes)}",
+            "level_shift_first_half": f"{int(flags[shifted[:half]].sum())}/{half}",
+            "level_shift_second_half": f"{int(flags[shifted[half:]].sum())}/{len(shifted) - half}",
+            "other_rows_flagged": int(flags[other].sum()),
+        }
+        for name, flags in (("static", static), ("timeseries", ts))
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
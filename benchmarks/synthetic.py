@@ -0,0 +1,146 @@
+# benchmarks/synthetic.py
+"""
+Synthetic waste logs with the schema and distributions of the bundled CSV.
+
+Rows are bootstrapped from the CSV, so recipe/ingredient/unit/cost, station,
+shift/peak, supplier, weather and branch/manager combinations keep their
+observed joint frequencies. Each row then gets a new date inside the
+requested month window (its original time of day is kept), quantities and
+temperature are jittered, costs are recomputed from the unit cost, and the
+expiry / stock-received dates keep the row's original offset from the log
+date, which preserves the expired-on-use pattern (~36% of rows).
+
+    from benchmarks.synthetic import generate_waste_logs
+    df = generate_waste_logs(100_000, year=2025, month="February", branches=["New York - Main"])
+"""
+import argparse
+import os
+import sqlite3
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import BRANCH_COLUMN, MYSQL_DATE_FORMAT, MYSQL_TABLE_NAME, MYSQL_TYPED_DATE_COLUMN
+from db import month_bounds
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        "Food & Beverage Waste_Pattern_Dataset.csv")
+CSV_DATE_FORMAT = "%d-%b-%y"
+# Multiplicative noise on quantities and additive noise on temperature
+QTY_SIGMA = 0.15
+TEMP_SIGMA = 1.5
+
+_source: Optional[pd.DataFrame] = None
+
+
+def _load_source() -> pd.DataFrame:
+    global _source
+    if _source is None:
+        _source = pd.read_csv(CSV_PATH)
+    return _source
+
+
+def generate_waste_logs(rows: int, year: int = 2025, month: str = "February", months: int = 1,
+                        branches: Optional[List[str]] = None, seed: int = 42, start_id: int = 1) -> pd.DataFrame:
+    """
+    `rows` CSV-shaped rows (same columns, same string date formats) spread
+    uniformly over `months` months starting at `month` `year`. `branches`
+    replaces the CSV branches (uniformly); managers follow the CSV mapping
+    where the branch is known.
+    """
+    src = _load_source()
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(src), size=rows)
+    df = src.iloc[picks].reset_index(drop=True)
+
+    src_dates = pd.to_datetime(df["Date"], format=CSV_DATE_FORMAT)
+    expiry_offset = pd.to_datetime(df["Expiry Date"], format=CSV_DATE_FORMAT) - src_dates
+    received_offset = pd.to_datetime(df["Stock Received Date"], format=CSV_DATE_FORMAT) - src_dates
+
+    start, _ = month_bounds(year, month)
+    end = start + pd.DateOffset(months=months)
+    days = (end - start).days
+    dates = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, size=rows), unit="D")
+
+    scale = rng.lognormal(0.0, QTY_SIGMA, size=rows)
+    planned = np.maximum(1, np.rint(df["Planned Qty"].to_numpy() * scale)).astype(int)
+    wastage = np.minimum(planned, np.rint(df["Wastage Qty"].to_numpy() * scale)).astype(int)
+    expected = np.rint(df["Expected Waste Qty"].to_numpy() * scale).astype(int)
+    sales = np.minimum(planned, np.rint(df["Sales Qty"].to_numpy() * scale)).astype(int)
+    temp_min, temp_max = src["Temperature (°C)"].min(), src["Temperature (°C)"].max()
+    temperature = np.clip(np.rint(df["Temperature (°C)"].to_numpy() + rng.normal(0, TEMP_SIGMA, rows)),
+                          temp_min, temp_max).astype(int)
+
+    df["ID"] = np.arange(start_id, start_id + rows)
+    df["Date"] = dates.strftime(CSV_DATE_FORMAT)
+    df["Weekday"] = dates.strftime("%A")
+    df["Planned Qty"] = planned
+    df["Wastage Qty"] = wastage
+    df["Expected Waste Qty"] = expected
+    df["Sales Qty"] = sales
+    df["Total Cost"] = planned * df["Unit Cost"].to_numpy()
+    df["Wastage Cost"] = wastage * df["Unit Cost"].to_numpy()
+    df["Temperature (°C)"] = temperature
+    df["Expiry Date"] = (dates + expiry_offset.to_numpy()).strftime(CSV_DATE_FORMAT)
+    df["Stock Received Date"] = (dates + received_offset.to_numpy()).strftime(CSV_DATE_FORMAT)
+
+    if branches:
+        managers = src.drop_duplicates(BRANCH_COLUMN).set_index(BRANCH_COLUMN)["Branch Manager"]
+        chosen = np.asarray(branches, dtype=object)[rng.integers(0, len(branches), size=rows)]
+        df[BRANCH_COLUMN] = chosen
+        df["Branch Manager"] = pd.Series(chosen).map(managers).fillna("Manager").to_numpy()
+    return df
+
+
+def to_analysis_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """CSV-shaped rows with numeric and datetime columns parsed, as analysis expects."""
+    out = df.copy()
+    for col in ["Planned Qty", "Wastage Qty", "Expected Waste Qty", "Wastage Cost",
+                "Sales Qty", "Temperature (°C)", "Unit Cost", "Total Cost"]:
+        out[col] = pd.to_numeric(out[col], errors="coerce")
+    for col in ["Date", "Expiry Date", "Stock Received Date"]:
+        out[col] = pd.to_datetime(out[col], errors="coerce", format=CSV_DATE_FORMAT)
+    return out
+
+
+def to_table_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    CSV-shaped rows as stored in waste_logs: `Date` as MYSQL_DATE_FORMAT text
+    (log date + time) plus the typed MYSQL_TYPED_DATE_COLUMN.
+    """
+    out = df.copy()
+    stamp = pd.to_datetime(out["Date"] + " " + out["Time"], format=f"{CSV_DATE_FORMAT} %H:%M")
+    python_format = MYSQL_DATE_FORMAT.replace("%i", "%M")
+    out["Date"] = stamp.dt.strftime(python_format)
+    if MYSQL_TYPED_DATE_COLUMN:
+        out[MYSQL_TYPED_DATE_COLUMN] = stamp.dt.strftime("%Y-%m-%d %H:%M:%S")
+    return out
+
+
+def write_sqlite_table(df: pd.DataFrame, path: str):
+    """
+    Writes CSV-shaped rows as the waste table of a SQLite file usable with
+    db_pool.sqlite_stand_in_factory (unique ID index; run
+    migrate_date_column.add_index for the (Branch, date) index).
+    """
+    conn = sqlite3.connect(path)
+    try:
+        to_table_rows(df).to_sql(MYSQL_TABLE_NAME, conn, index=False, if_exists="replace", chunksize=50_000)
+        conn.execute(f"CREATE UNIQUE INDEX pk_{MYSQL_TABLE_NAME} ON {MYSQL_TABLE_NAME} (ID)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--year", type=int, default=datetime.now().year)
+    parser.add_argument("--month", default="January")
+    parser.add_argument("--months", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", required=True, help="CSV file to write")
+    args = parser.parse_args()
+    generate_waste_logs(args.rows, args.year, args.month, args.months, seed=args.seed).to_csv(args.output, index=False)
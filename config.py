@@ -17,7 +17,126 @@ REPEATED_EXPIRY_COUNT = 2
 COST_CRITICAL_THRESHOLD = 100.0
 COST_IGNORE_THRESHOLD = 5.0
 BRANCH_COLUMN = "Branch"
+
+# Detection mode: "static" flags high waste against RATE_THRESHOLD x the
+# month's branch average; "timeseries" (timeseries_detection.py) against the
+# recent history of each branch x ingredient x station series, falling back
+# to the static flag until a series has TS_MIN_HISTORY earlier rows.
+DETECTION_MODE = os.getenv("DETECTION_MODE", "static").lower()
+TS_WINDOW = int(os.getenv("TS_WINDOW", "28"))
+TS_EWMA_SPAN = 14
+TS_Z_THRESHOLD = float(os.getenv("TS_Z_THRESHOLD", "3.5"))
+TS_MIN_HISTORY = 8
+TS_MIN_MAD = 0.01
+TS_HISTORY_MONTHS = int(os.getenv("TS_HISTORY_MONTHS", "2"))
+TS_STREAM_MAX_SERIES = 100_000
+
 MYSQL_TABLE_NAME = "waste_logs"
+# Format of the VARCHAR `Date` column, as a MySQL STR_TO_DATE pattern
+MYSQL_DATE_FORMAT = "%d-%b-%Y %H:%i"
+# Indexed DATETIME copy of `Date` added by migrate_date_column.py; tables
+# without it yet, or MYSQL_TYPED_DATE_COLUMN="", parse `Date` in the query.
+MYSQL_TYPED_DATE_COLUMN = os.getenv("MYSQL_TYPED_DATE_COLUMN", "Log_Datetime")
+# SANITIZER_VERSION of the stored Chef_Feedback (feedback_sanitizer.py), added
+# by backfill_feedback.py; /send-chef-feedback only sends rows that have one
+MYSQL_FEEDBACK_VERSION_COLUMN = "Chef_Feedback_Version"
+
+# Chat model clients (llm_registry.py). LLM_PROVIDER="fake" swaps in a local
+# model that answers the simulated texts after LLM_FAKE_LATENCY_SECONDS (load
+# tests, offline runs; no API key needed). One keep-alive HTTP connection pool
+# is shared by every chat model of the process.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "groq").lower()
+LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "llama-3.1-8b-instant")
+LLM_FAKE_LATENCY_SECONDS = float(os.getenv("LLM_FAKE_LATENCY_SECONDS", "0"))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+
+# LLM dispatch (llm_dispatcher.py)
+LLM_MAX_CONCURRENCY = 8
+LLM_RATE_LIMIT_PER_SEC = float(os.getenv("LLM_RATE_LIMIT_PER_SEC", "5.0"))
+LLM_RATE_LIMIT_BURST = 10
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BACKOFF_SECONDS = 1.0
+LLM_CALL_TIMEOUT_SECONDS = 30.0
+# Flagged rows analyzed together that share these columns get one summary,
+# written from the cluster's aggregated stats; the dispatcher sends each
+# distinct prompt once. LLM_SUMMARY_GROUPING=false keeps one summary per row.
+LLM_SUMMARY_GROUPING = os.getenv("LLM_SUMMARY_GROUPING", "true").lower() != "false"
+LLM_SUMMARY_GROUP_COLUMNS = ("Ingredient", "Kitchen Station", "Shift", "Combined_Flag", "Root_Causes")
+
+# LLM response cache (llm_cache.py)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() != "false"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3")
+LLM_CACHE_TTL_SECONDS = 30 * 24 * 3600
+LLM_CACHE_MAX_ENTRIES = 50_000
+
+# Per-record analysis result cache (analysis_cache.py)
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "true").lower() != "false"
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", ".cache/analysis_results.sqlite3")
+
+# Rollup cube of analyzed rows for cross-branch dashboards (rollup_cube.py)
+ROLLUP_ENABLED = os.getenv("ROLLUP_ENABLED", "true").lower() != "false"
+ROLLUP_PATH = os.getenv("ROLLUP_PATH", ".cache/rollup_cube.sqlite3")
+ROLLUP_QUERY_MAX_CELLS = 10_000
+
+# Incremental branch metrics (metrics_store.py)
+METRICS_STORE_PATH = os.getenv("METRICS_STORE_PATH", ".cache/metrics_store.sqlite3")
+METRICS_SKETCH_RELATIVE_ACCURACY = 0.01
+
+# Memory-mapped branch-month load snapshots (snapshot_cache.py)
+SNAPSHOT_CACHE_ENABLED = os.getenv("SNAPSHOT_CACHE_ENABLED", "true").lower() != "false"
+SNAPSHOT_CACHE_DIR = os.getenv("SNAPSHOT_CACHE_DIR", ".cache/snapshots")
+SNAPSHOT_CACHE_MAX_BYTES = int(os.getenv("SNAPSHOT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+# Per-request stage timings in a Server-Timing response header (instrumentation.py);
+# when off, only requests sending "X-Debug-Timing: 1" get the header
+TIMING_HEADER_ENABLED = os.getenv("TIMING_HEADER_ENABLED", "false").lower() == "true"
+
+# Rows per NDJSON batch for GET /analyze?stream=true
+ANALYZE_STREAM_BATCH_SIZE = 200
+
+# Multi-branch batch analysis (batch.py)
+BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+BATCH_START_METHOD = "spawn"
+
+# File-based analysis over CSV / Parquet exports (offline.py)
+OFFLINE_CHUNK_ROWS = 100_000
+# Tried in order on the first value of a text date column; CSV exports keep
+# the day in `Date` and the time of day in a separate `Time` column
+OFFLINE_DATE_FORMATS = ("%d-%b-%y %H:%M", "%d-%b-%Y %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M",
+                        "%d-%b-%y", "%d-%b-%Y", "%Y-%m-%d")
+# Hive partition key written by `offline.py convert`, e.g. Year_Month=2025-02
+OFFLINE_PARTITION_COLUMN = "Year_Month"
+
+# Real-time event ingestion (ingestion.py): events of concurrent POST /ingest
+# requests are scored and inserted together, in batches of up to
+# INGEST_BATCH_MAX_EVENTS collected for at most INGEST_BATCH_MAX_WAIT_SECONDS
+INGEST_BATCH_MAX_EVENTS = int(os.getenv("INGEST_BATCH_MAX_EVENTS", "2000"))
+INGEST_BATCH_MAX_WAIT_SECONDS = float(os.getenv("INGEST_BATCH_MAX_WAIT_SECONDS", "0.02"))
+INGEST_MAX_EVENTS_PER_REQUEST = 10_000
+# Events are scored against branch metrics of their month and the months
+# before it (metrics_store.py), re-read at most every INGEST_METRICS_TTL_SECONDS
+INGEST_METRICS_MONTHS = int(os.getenv("INGEST_METRICS_MONTHS", "2"))
+INGEST_METRICS_TTL_SECONDS = 5.0
+# Critical events waiting for their LLM summary / chef feedback
+INGEST_FOLLOWUP_ENABLED = os.getenv("INGEST_FOLLOWUP_ENABLED", "true").lower() != "false"
+INGEST_FOLLOWUP_QUEUE_SIZE = 10_000
+
+# Background analysis jobs (jobs.py)
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", ".cache/jobs.sqlite3")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+# Chef feedback email delivery (email_delivery.py)
+EMAIL_SMTP_HOST = os.getenv("EMAIL_SMTP_HOST", "smtp.gmail.com")
+EMAIL_SMTP_PORT = int(os.getenv("EMAIL_SMTP_PORT", "465"))
+EMAIL_SMTP_SSL = os.getenv("EMAIL_SMTP_SSL", "true").lower() != "false"
+EMAIL_SMTP_TIMEOUT_SECONDS = 30.0
+EMAIL_MAX_CONCURRENCY = 3
+EMAIL_MAX_RETRIES = 3
+EMAIL_RETRY_BACKOFF_SECONDS = 2.0
+EMAIL_SESSION_MAX_MESSAGES = 100
+EMAIL_SESSION_IDLE_SECONDS = 60.0
+EMAIL_DELIVERY_LOG_PATH = os.getenv("EMAIL_DELIVERY_LOG_PATH", ".cache/email_deliveries.sqlite3")
 
 # MySQL configuration
 MYSQL_CONFIG = {
@@ -27,4 +146,19 @@ MYSQL_CONFIG = {
     "database": os.getenv("MYSQL_DATABASE"),
 }
 
+# MySQL connection pool (db_pool.py)
+MYSQL_POOL_SIZE = int(os.getenv("MYSQL_POOL_SIZE", "5"))
+MYSQL_POOL_CHECKOUT_TIMEOUT_SECONDS = 10.0
+MYSQL_POOL_HEALTH_CHECK_SECONDS = 30.0
+# Rows per batched UPDATE statement in update_mysql_data
+MYSQL_WRITE_CHUNK_SIZE = 500
+
+# Async /analyze path (async_analysis.py): threads for blocking MySQL calls,
+# and whether detection + graph runs in the batch worker processes (otherwise
+# on those threads; the default on single-core hosts, where the processes only
+# add transfer cost)
+ANALYZE_IO_THREADS = int(os.getenv("ANALYZE_IO_THREADS", str(MYSQL_POOL_SIZE)))
+ANALYZE_CPU_IN_PROCESSES = os.getenv("ANALYZE_CPU_IN_PROCESSES",
+                                     "true" if (os.cpu_count() or 1) > 1 else "false").lower() != "false"
+
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
\ No newline at end of file
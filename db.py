@@ -1,74 +1,459 @@
+import time
+from datetime import datetime
 import pandas as pd
 import mysql.connector
-from config import MYSQL_CONFIG, MYSQL_TABLE_NAME, BRANCH_COLUMN
+import hashlib
+from typing import Dict, Any, List, Optional, Tuple
+from config import (
+    MYSQL_TABLE_NAME, BRANCH_COLUMN, MYSQL_WRITE_CHUNK_SIZE, MYSQL_DATE_FORMAT, MYSQL_TYPED_DATE_COLUMN,
+    MYSQL_FEEDBACK_VERSION_COLUMN,
+)
+from db_pool import get_pool
+from feedback_sanitizer import SANITIZER_VERSION
+from instrumentation import record_stage
+from snapshot_cache import SnapshotKey, get_snapshot_cache
 
-def load_mysql_data(branch_name: str, year: int, month_name: str) -> pd.DataFrame:
+# Columns the analysis and the /analyze response actually read, with the dtype
+# each is decoded into. Everything else in the table stays on the server.
+LOAD_SCHEMA: Dict[str, str] = {
+    "ID": "int64",
+    "Date": "datetime",
+    "Recipe": "category",
+    "Ingredient": "category",
+    "Planned Qty": "float32",
+    "Wastage Qty": "float32",
+    "Expected Waste Qty": "float32",
+    "Sales Qty": "float32",
+    "Total Cost": "float64",
+    "Wastage Cost": "float64",
+    "Kitchen Station": "category",
+    "Shift": "category",
+    "Expiry Date": "datetime",
+    "Supplier Name": "category",
+    "Temperature (°C)": "float64",
+    "Peak Hour Flag": "raw",
+    "Branch": "category",
+    "Branch Manager": "category",
+    "Chef": "category",
+    "Status": "object",
+}
+# update_mysql_data only needs to know whether Chef_Feedback changed, so the
+# loader ships a digest of it instead of the text.
+FEEDBACK_DIGEST_COLUMN = "Chef_Feedback_MD5"
+# Columns rewritten in place (by update_mysql_data or other writers): their
+# checksum is part of the snapshot watermark
+WATERMARK_CHANGE_COLUMNS = ("Status", "Chef_Feedback")
+
+_table_columns: Optional[List[str]] = None
+
+def get_table_columns(conn) -> List[str]:
+    """Column names of the waste table (looked up once per process)."""
+    global _table_columns
+    if _table_columns is None:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT * FROM {MYSQL_TABLE_NAME} LIMIT 0")
+            cursor.fetchall()
+            _table_columns = [d[0] for d in cursor.description]
+        finally:
+            cursor.close()
+    return _table_columns
+
+def available_typed_date_column(table_columns: List[str]) -> Optional[str]:
+    """MYSQL_TYPED_DATE_COLUMN if the table has it yet (migrate_date_column.py), else None (legacy filter)."""
+    return MYSQL_TYPED_DATE_COLUMN if MYSQL_TYPED_DATE_COLUMN in table_columns else None
+
+def feedback_digest(text) -> str:
+    """Python twin of MD5(COALESCE(Chef_Feedback, '')) in the load query."""
+    return hashlib.md5(("" if text is None else str(text)).encode("utf-8")).hexdigest()
+
+def month_bounds(year: int, month_name: str) -> Tuple[datetime, datetime]:
+    """Half-open [start, end) datetime range covering `month_name` of `year`."""
+    try:
+        month = datetime.strptime(month_name.strip(), "%B").month
+    except ValueError:
+        raise ValueError(f"Invalid month name: {month_name!r}")
+    start = datetime(int(year), month, 1)
+    end = datetime(int(year) + (month == 12), month % 12 + 1, 1)
+    return start, end
+
+def build_select_list(columns: Optional[List[str]], typed_date_column: Optional[str]) -> str:
+    if columns is None:
+        date_expr = f"`{typed_date_column}`" if typed_date_column else f"STR_TO_DATE(Date, '{MYSQL_DATE_FORMAT}')"
+        return f"*, {date_expr} AS Analyzed_Date"
+    select = []
+    for col in columns:
+        if col == "Date" and typed_date_column:
+            select.append(f"`{typed_date_column}` AS `Date`")
+        elif col == FEEDBACK_DIGEST_COLUMN:
+            select.append(f"MD5(COALESCE(Chef_Feedback, '')) AS {FEEDBACK_DIGEST_COLUMN}")
+        else:
+            select.append(f"`{col}`")
+    return ", ".join(select)
+
+def _month_filter(branch_name: str, year: int, month_name: str,
+                  typed_date_column: Optional[str]) -> Tuple[str, tuple]:
+    """WHERE clause + params selecting one branch-month."""
+    if typed_date_column:
+        start, end = month_bounds(year, month_name)
+        where = f"""`{BRANCH_COLUMN}` = %s
+              AND `{typed_date_column}` >= %s
+              AND `{typed_date_column}` < %s"""
+        return where, (branch_name, start, end)
+    where = f"""`{BRANCH_COLUMN}` = %s
+              AND YEAR(STR_TO_DATE(Date, '{MYSQL_DATE_FORMAT}')) = %s
+              AND MONTHNAME(STR_TO_DATE(Date, '{MYSQL_DATE_FORMAT}')) = %s"""
+    return where, (branch_name, year, month_name)
+
+def build_month_query(branch_name: str, year: int, month_name: str,
+                      typed_date_column: Optional[str] = MYSQL_TYPED_DATE_COLUMN,
+                      columns: Optional[List[str]] = None) -> Tuple[str, tuple]:
+    """
+    Query + params for one branch-month. With a typed date column this is a
+    range predicate the (Branch, date) index can serve; without it, the
+    legacy form that parses `Date` on every row. `columns` projects the
+    select list (None keeps SELECT *).
+    """
+    where, params = _month_filter(branch_name, year, month_name, typed_date_column)
     query = f"""
-        SELECT *,
-               STR_TO_DATE(Date, '%d-%b-%Y %H:%i') AS Analyzed_Date
+        SELECT {build_select_list(columns, typed_date_column)}
         FROM {MYSQL_TABLE_NAME}
-        WHERE `{BRANCH_COLUMN}` = %s
-          AND YEAR(STR_TO_DATE(Date, '%d-%b-%Y %H:%i')) = %s
-          AND MONTHNAME(STR_TO_DATE(Date, '%d-%b-%Y %H:%i')) = %s
+        WHERE {where}
+    """
+    return query, params
+
+def build_watermark_query(branch_name: str, year: int, month_name: str,
+                          typed_date_column: Optional[str] = MYSQL_TYPED_DATE_COLUMN,
+                          change_columns: Tuple[str, ...] = WATERMARK_CHANGE_COLUMNS) -> Tuple[str, tuple]:
     """
-    conn = None
+    COUNT(*), MAX(ID) and a checksum of `change_columns` over one branch-month:
+    the rows are found through the (Branch, date) index, and the checksum
+    reads only the columns that are updated in place.
+    """
+    where, params = _month_filter(branch_name, year, month_name, typed_date_column)
+    values = ", ".join(["ID"] + [f"COALESCE(`{col}`, '')" for col in change_columns])
+    return f"""
+        SELECT COUNT(*), MAX(ID), SUM(CRC32(CONCAT_WS('|', {values})))
+        FROM {MYSQL_TABLE_NAME}
+        WHERE {where}
+    """, params
+
+def apply_load_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Decodes LOAD_SCHEMA columns in place into their compact dtypes."""
+    for col, kind in LOAD_SCHEMA.items():
+        if col not in df.columns or kind in ("raw", "object"):
+            continue
+        if kind == "datetime":
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif kind == "category":
+            df[col] = df[col].astype("category")
+        elif kind == "int64":
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype("Int64" if df[col].isna().any() else "int64")
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(kind)
+    return df
+
+def build_batch_query(branch_names: List[str], months: List[Tuple[int, str]],
+                      typed_date_column: Optional[str] = MYSQL_TYPED_DATE_COLUMN,
+                      columns: Optional[List[str]] = None) -> Tuple[str, tuple]:
+    """Query + params covering several branches and (year, month name) pairs in one scan."""
+    if not branch_names or not months:
+        raise ValueError("At least one branch and one month are required.")
+    select = build_select_list(columns, typed_date_column)
+    branch_in = ", ".join(["%s"] * len(branch_names))
+    params: List[Any] = list(branch_names)
+    ranges = []
+    for year, month_name in months:
+        if typed_date_column:
+            ranges.append(f"(`{typed_date_column}` >= %s AND `{typed_date_column}` < %s)")
+            params.extend(month_bounds(year, month_name))
+        else:
+            ranges.append(
+                f"(YEAR(STR_TO_DATE(Date, '{MYSQL_DATE_FORMAT}')) = %s"
+                f" AND MONTHNAME(STR_TO_DATE(Date, '{MYSQL_DATE_FORMAT}')) = %s)"
+            )
+            params.extend((year, month_name))
+    query = f"""
+        SELECT {select}
+        FROM {MYSQL_TABLE_NAME}
+        WHERE `{BRANCH_COLUMN}` IN ({branch_in})
+          AND ({" OR ".join(ranges)})
+    """
+    return query, tuple(params)
+
+def _load_projected(build_query) -> pd.DataFrame:
+    """
+    Runs build_query(columns, typed_date_column) -> (query, params) over the
+    LOAD_SCHEMA projection, with the typed date column only if the table has it.
+    """
+    start = time.perf_counter()
+    try:
+        with get_pool().connection() as conn:
+            table_columns = get_table_columns(conn)
+            columns = [c for c in LOAD_SCHEMA if c in table_columns]
+            if "Chef_Feedback" in table_columns:
+                columns.append(FEEDBACK_DIGEST_COLUMN)
+            query, params = build_query(columns, available_typed_date_column(table_columns))
+            df = pd.read_sql(query, conn, params=params)
+    except mysql.connector.Error as err:
+        raise ValueError(f"Could not read data from MySQL: {err}")
+
+    bytes_decoded = int(df.memory_usage(deep=True).sum())
+    df = apply_load_schema(df)
+    bytes_compact = int(df.memory_usage(deep=True).sum())
+    df.attrs["load_stats"] = {
+        "rows": len(df),
+        "columns_fetched": len(df.columns),
+        "columns_skipped": len(table_columns) - len(columns) + (FEEDBACK_DIGEST_COLUMN in columns),
+        "bytes_decoded": bytes_decoded,
+        "bytes_compact": bytes_compact,
+        "bytes_saved": bytes_decoded - bytes_compact,
+    }
+    record_stage("load", time.perf_counter() - start, rows=len(df))
+    return df
+
+def snapshot_key(branch_name: str, year: int, month_name: str) -> SnapshotKey:
+    return branch_name, int(year), month_bounds(year, month_name)[0].month
+
+def _month_watermark(branch_name: str, year: int, month_name: str) -> str:
+    """
+    Changes whenever rows of the branch-month are added/removed, their Status
+    or Chef_Feedback is updated, or the projected columns change.
+    """
+    cursor = None
     try:
-        conn = mysql.connector.connect(**MYSQL_CONFIG)
-        df = pd.read_sql(query, conn, params=(branch_name, year, month_name))
+        with get_pool().connection() as conn:
+            table_columns = get_table_columns(conn)
+            change_columns = tuple(c for c in WATERMARK_CHANGE_COLUMNS if c in table_columns)
+            query, params = build_watermark_query(branch_name, year, month_name,
+                                                  available_typed_date_column(table_columns), change_columns)
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            count, max_id, checksum = cursor.fetchone()
     except mysql.connector.Error as err:
         raise ValueError(f"Could not read data from MySQL: {err}")
     finally:
-        if conn and conn.is_connected():
-            conn.close()
-
-    # Post-processing: clean up date columns
-    numeric_cols = ["Planned Qty", "Wastage Qty", "Expected Waste Qty", "Wastage Cost",
-                    "Sales Qty", "Temperature (°C)", "Unit Cost", "Total Cost"]
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    date_cols = ['Date', 'Expiry Date', 'Stock Received Date']
-    for col in date_cols:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce')
+        if cursor:
+            cursor.close()
+    columns = [c for c in LOAD_SCHEMA if c in table_columns] + ["Chef_Feedback" in table_columns]
+    projection = hashlib.md5(repr(columns).encode("utf-8")).hexdigest()[:8]
+    return f"{count}:{max_id}:{checksum}:{projection}"
 
+def load_mysql_data(branch_name: str, year: int, month_name: str) -> pd.DataFrame:
+    """
+    Loads one branch-month, fetching only LOAD_SCHEMA columns and decoding
+    them into compact dtypes. Memory figures land in df.attrs["load_stats"].
+    Served from the local snapshot cache while the branch-month's watermark
+    is unchanged.
+    """
+    load = lambda: _load_projected(lambda columns, typed: build_month_query(branch_name, year, month_name,
+                                                                            typed_date_column=typed, columns=columns))
+    cache = get_snapshot_cache()
+    if cache is None:
+        return load()
+    start = time.perf_counter()
+    key = snapshot_key(branch_name, year, month_name)
+    watermark = _month_watermark(branch_name, year, month_name)
+    df = cache.get(key, watermark)
+    if df is not None:
+        record_stage("load", time.perf_counter() - start, rows=len(df))
+        return df
+    df = load()
+    cache.put(key, watermark, df)
     return df
 
-def update_mysql_data(df_results: pd.DataFrame):
+def load_mysql_batch(branch_names: List[str], months: List[Tuple[int, str]]) -> pd.DataFrame:
+    """Like load_mysql_data, but for every branch x month combination in a single query."""
+    return _load_projected(lambda columns, typed: build_batch_query(branch_names, months, typed_date_column=typed,
+                                                                    columns=columns))
+
+def _changed_rows(update_data: pd.DataFrame, df_loaded: pd.DataFrame) -> pd.DataFrame:
+    """Keeps only rows whose Status/Chef_Feedback differ from what was loaded."""
+    if 'ID' not in df_loaded.columns or 'Status' not in df_loaded.columns:
+        return update_data
+    if 'Chef_Feedback' in df_loaded.columns:
+        before_feedback = df_loaded['Chef_Feedback'].map(feedback_digest)
+    elif FEEDBACK_DIGEST_COLUMN in df_loaded.columns:
+        before_feedback = df_loaded[FEEDBACK_DIGEST_COLUMN]
+    else:
+        return update_data
+    before = pd.DataFrame({
+        'ID': df_loaded['ID'].values,
+        'Status': df_loaded['Status'].astype(object).fillna('').astype(str).values,
+        'Feedback': before_feedback.values,
+    }).drop_duplicates('ID').set_index('ID').reindex(update_data['ID'].values)
+    unchanged = (
+        (before['Status'].values == update_data['Status'].astype(str).values)
+        & (before['Feedback'].values == update_data['Chef_Feedback'].map(feedback_digest).values)
+    )
+    return update_data[~unchanged]
+
+def _invalidate_snapshots(written: pd.DataFrame):
+    """Drops the load snapshots of every branch-month a write-back touched."""
+    cache = get_snapshot_cache()
+    if cache is None or written.empty:
+        return
+    if BRANCH_COLUMN not in written.columns or "Date" not in written.columns:
+        cache.invalidate()
+        return
+    dates = pd.to_datetime(written["Date"], errors='coerce')
+    if dates.isna().any():
+        cache.invalidate()
+        return
+    keys = zip(written[BRANCH_COLUMN].astype(object), dates.dt.year, dates.dt.month)
+    cache.invalidate((branch, int(year), int(month)) for branch, year, month in keys)
+
+def _bulk_update_statement(n_rows: int, mark_version: bool = False) -> str:
+    cases = " ".join(["WHEN %s THEN %s"] * n_rows)
+    placeholders = ",".join(["%s"] * n_rows)
+    # Feedback written here comes out of sanitize_feedback
+    version = f",\n            `{MYSQL_FEEDBACK_VERSION_COLUMN}` = {SANITIZER_VERSION}" if mark_version else ""
+    return f"""
+        UPDATE {MYSQL_TABLE_NAME}
+        SET `Status` = CASE ID {cases} END,
+            `Chef_Feedback` = CASE ID {cases} END{version}
+        WHERE ID IN ({placeholders})
+    """
+
+def update_mysql_data(df_results: pd.DataFrame, df_loaded: Optional[pd.DataFrame] = None,
+                      chunk_size: int = MYSQL_WRITE_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Writes Status/Chef_Feedback back with one batched UPDATE per `chunk_size`
+    rows, stamping MYSQL_FEEDBACK_VERSION_COLUMN when the table has it. When
+    `df_loaded` (the frame returned by load_mysql_data) is given, rows whose
+    values did not change since the load are skipped.
+    """
     if not all(col in df_results.columns for col in ['ID', 'Status']):
         raise ValueError("Missing required columns (ID, Status) for DB update.")
 
     update_data = df_results[['ID', 'Status', 'Chef_Feedback_Summary']].copy()
     update_data = update_data.rename(columns={'Chef_Feedback_Summary': 'Chef_Feedback'})
     update_data['Chef_Feedback'] = update_data['Chef_Feedback'].fillna('').replace('N/A', '')
+    update_data['Status'] = update_data['Status'].fillna('')
+    update_data['ID'] = update_data['ID'].astype(int)
+
+    stats = {"rows_considered": len(update_data), "rows_written": 0, "statements": 0,
+             "elapsed_seconds": 0.0, "rows_per_sec": 0.0}
+    if df_loaded is not None and not update_data.empty:
+        update_data = _changed_rows(update_data, df_loaded)
 
     if update_data.empty:
-        return
+        return stats
 
-    conn, cursor = None, None
+    chunk_size = max(1, chunk_size)
+    rows = list(update_data[['ID', 'Status', 'Chef_Feedback']].itertuples(index=False, name=None))
+    start = time.perf_counter()
+    cursor = None
     try:
-        conn = mysql.connector.connect(**MYSQL_CONFIG)
-        cursor = conn.cursor()
-        update_query = f"""
-            UPDATE {MYSQL_TABLE_NAME}
-            SET `Status` = %s, `Chef_Feedback` = %s
-            WHERE ID = %s
-        """
-        
-        for _, row in update_data.iterrows():
-            params = (
-                row['Status'],
-                row['Chef_Feedback'] if pd.notna(row['Chef_Feedback']) else '',
-                int(row['ID'])
-            )
-            cursor.execute(update_query, params)
-        
-        conn.commit()
+        with get_pool().connection() as conn:
+            mark_version = MYSQL_FEEDBACK_VERSION_COLUMN in get_table_columns(conn)
+            cursor = conn.cursor()
+            for offset in range(0, len(rows), chunk_size):
+                chunk = rows[offset:offset + chunk_size]
+                params = []
+                for record_id, status, _ in chunk:
+                    params.extend((record_id, status))
+                for record_id, _, feedback in chunk:
+                    params.extend((record_id, feedback))
+                params.extend(record_id for record_id, _, _ in chunk)
+                cursor.execute(_bulk_update_statement(len(chunk), mark_version), params)
+                stats["statements"] += 1
+
+            conn.commit()
     except mysql.connector.Error as err:
         raise ValueError(f"Error updating database: {err}")
     finally:
         if cursor:
             cursor.close()
-        if conn and conn.is_connected():
-            conn.close()
\ No newline at end of file
+
+    elapsed = time.perf_counter() - start
+    record_stage("update", elapsed, rows=len(rows))
+    _invalidate_snapshots(df_results.loc[update_data.index])
+    stats["rows_written"] = len(rows)
+    stats["elapsed_seconds"] = round(elapsed, 4)
+    stats["rows_per_sec"] = round(len(rows) / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+def _bulk_insert_statement(columns: List[str], n_rows: int) -> str:
+    row = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    names = ", ".join(f"`{col}`" for col in columns)
+    return f"INSERT INTO {MYSQL_TABLE_NAME} ({names}) VALUES " + ", ".join([row] * n_rows)
+
+def _existing_ids(cursor, ids: List[int], chunk_size: int) -> set:
+    existing = set()
+    for offset in range(0, len(ids), chunk_size):
+        chunk = ids[offset:offset + chunk_size]
+        cursor.execute(f"SELECT ID FROM {MYSQL_TABLE_NAME} WHERE ID IN ({','.join(['%s'] * len(chunk))})", chunk)
+        existing.update(row[0] for row in cursor.fetchall())
+    return existing
+
+def existing_ids(ids: List[int], chunk_size: int = MYSQL_WRITE_CHUNK_SIZE) -> set:
+    """The subset of `ids` already stored in the waste table."""
+    if not ids:
+        return set()
+    cursor = None
+    try:
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            return _existing_ids(cursor, [int(i) for i in ids], max(1, chunk_size))
+    except mysql.connector.Error as err:
+        raise ValueError(f"Error reading from database: {err}")
+    finally:
+        if cursor:
+            cursor.close()
+
+def insert_mysql_data(df_rows: pd.DataFrame, chunk_size: int = MYSQL_WRITE_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Inserts new waste logs with one multi-row INSERT per `chunk_size` rows.
+    `Date` (datetime) is stored as MYSQL_DATE_FORMAT text plus the typed date
+    column; columns the table does not have are left out. Rows whose ID is
+    already in the table are skipped and listed in "duplicate_ids".
+    """
+    if not all(col in df_rows.columns for col in ['ID', 'Date', BRANCH_COLUMN]):
+        raise ValueError(f"Missing required columns (ID, Date, {BRANCH_COLUMN}) for DB insert.")
+
+    stats = {"rows_considered": len(df_rows), "rows_written": 0, "duplicate_ids": [], "statements": 0,
+             "elapsed_seconds": 0.0, "rows_per_sec": 0.0}
+    if df_rows.empty:
+        return stats
+
+    chunk_size = max(1, chunk_size)
+    start = time.perf_counter()
+    cursor = None
+    try:
+        with get_pool().connection() as conn:
+            table_columns = get_table_columns(conn)
+            dates = pd.to_datetime(df_rows['Date'])
+            values = df_rows[[c for c in df_rows.columns if c in table_columns and c != 'Date']].copy()
+            values['ID'] = values['ID'].astype(int)
+            values['Date'] = dates.dt.strftime(MYSQL_DATE_FORMAT.replace('%i', '%M'))
+            if MYSQL_TYPED_DATE_COLUMN and MYSQL_TYPED_DATE_COLUMN in table_columns:
+                values[MYSQL_TYPED_DATE_COLUMN] = dates.dt.strftime('%Y-%m-%d %H:%M:%S')
+
+            cursor = conn.cursor()
+            existing = _existing_ids(cursor, values['ID'].tolist(), chunk_size)
+            new = ~values['ID'].isin(existing)
+            values = values[new]
+
+            columns = list(values.columns)
+            rows = values.astype(object).where(values.notna(), None).to_numpy().tolist()
+            for offset in range(0, len(rows), chunk_size):
+                chunk = rows[offset:offset + chunk_size]
+                cursor.execute(_bulk_insert_statement(columns, len(chunk)), [v for row in chunk for v in row])
+                stats["statements"] += 1
+
+            conn.commit()
+    except mysql.connector.Error as err:
+        raise ValueError(f"Error inserting into database: {err}")
+    finally:
+        if cursor:
+            cursor.close()
+
+    elapsed = time.perf_counter() - start
+    record_stage("insert", elapsed, rows=len(rows))
+    _invalidate_snapshots(df_rows[new.to_numpy()])
+    stats["rows_written"] = len(rows)
+    stats["duplicate_ids"] = sorted(existing)
+    stats["elapsed_seconds"] = round(elapsed, 4)
+    stats["rows_per_sec"] = round(len(rows) / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
@@ -0,0 +1,292 @@
+# db_pool.py
+import calendar
+import hashlib
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+from config import (
+    MYSQL_CONFIG,
+    MYSQL_POOL_SIZE,
+    MYSQL_POOL_CHECKOUT_TIMEOUT_SECONDS,
+    MYSQL_POOL_HEALTH_CHECK_SECONDS,
+)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of DB-API connections shared by every request.
+
+    At most `size` connections are checked out at once; a checkout waits up
+    to `checkout_timeout` seconds and then raises PoolError (a
+    mysql.connector.Error, so existing handlers keep working). Idle
+    connections older than `health_check_interval` are pinged before reuse
+    and replaced when the ping fails.
+    """
+
+    def __init__(self, factory: Callable[[], Any], size: int = MYSQL_POOL_SIZE,
+                 checkout_timeout: float = MYSQL_POOL_CHECKOUT_TIMEOUT_SECONDS,
+                 health_check_interval: float = MYSQL_POOL_HEALTH_CHECK_SECONDS):
+        self.factory = factory
+        self.size = max(1, size)
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+        self._last_used: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.replaced = 0
+        self.in_use = 0
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            if hasattr(conn, "ping"):
+                conn.ping(reconnect=False)
+                return True
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _new_connection(self):
+        conn = self.factory()
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _checkout(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._new_connection()
+            idle_for = time.monotonic() - self._last_used.pop(id(conn), 0.0)
+            if idle_for < self.health_check_interval or self._is_healthy(conn):
+                return conn
+            self._close(conn)
+            with self._lock:
+                self.replaced += 1
+
+    def _release(self, conn, broken: bool):
+        if broken:
+            self._close(conn)
+            return
+        try:
+            # End any open transaction so the next borrower doesn't read a stale snapshot
+            conn.rollback()
+        except Exception:
+            self._close(conn)
+            return
+        self._last_used[id(conn)] = time.monotonic()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.checkout_timeout):
+            raise PoolError(f"Timed out after {self.checkout_timeout}s waiting for a database connection")
+        conn, broken = None, False
+        try:
+            conn = self._checkout()
+            with self._lock:
+                self.in_use += 1
+            yield conn
+        except (mysql.connector.errors.OperationalError, mysql.connector.errors.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self.in_use -= 1
+                self._release(conn, broken)
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        self._last_used.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "idle": self._idle.qsize(),
+            "created": self.created,
+            "replaced": self.replaced,
+        }
+
+
+def mysql_connection_factory():
+    return mysql.connector.connect(**MYSQL_CONFIG)
+
+
+# --- SQLite stand-in ---------------------------------------------------------
+# Lets the pool and the db.py queries run against a local SQLite file in tests
+# and benchmarks: `%s` placeholders, dictionary cursors, mysql.connector errors
+# and the handful of MySQL date / hash functions the loader uses.
+
+_MYSQL_TO_STRPTIME = {"%i": "%M", "%b": "%b", "%d": "%d", "%Y": "%Y", "%H": "%H", "%y": "%y", "%m": "%m", "%s": "%S"}
+
+
+def _str_to_date(value, fmt):
+    if value is None or fmt is None:
+        return None
+    py_fmt = re.sub(r"%[a-zA-Z]", lambda m: _MYSQL_TO_STRPTIME.get(m.group(0), m.group(0)), fmt)
+    for candidate in (py_fmt, py_fmt.split(" ")[0]):
+        try:
+            return datetime.strptime(str(value), candidate).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    return None
+
+
+def _md5(value):
+    return hashlib.md5(("" if value is None else str(value)).encode("utf-8")).hexdigest()
+
+
+def _crc32(value):
+    return None if value is None else zlib.crc32(str(value).encode("utf-8"))
+
+
+def _concat_ws(separator, *values):
+    return separator.join(str(v) for v in values if v is not None)
+
+
+def _year(value):
+    return int(str(value)[:4]) if value else None
+
+
+def _monthname(value):
+    return calendar.month_name[int(str(value)[5:7])] if value else None
+
+
+class _StandInCursor:
+    def __init__(self, cursor, dictionary: bool):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @staticmethod
+    def _translate(sql: str) -> str:
+        return sql.replace("%s", "?")
+
+    def execute(self, sql, params=()):
+        try:
+            self._cursor.execute(self._translate(sql), tuple(params or ()))
+        except sqlite3.Error as err:
+            raise mysql.connector.Error(msg=str(err))
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        try:
+            self._cursor.executemany(self._translate(sql), [tuple(p) for p in seq_of_params])
+        except sqlite3.Error as err:
+            raise mysql.connector.Error(msg=str(err))
+        return self
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {d[0]: v for d, v in zip(self._cursor.description, row)}
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size) if size else self._cursor.fetchmany()
+        return [self._row(r) for r in rows]
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteStandInConnection:
+    """Minimal mysql.connector-shaped wrapper around a sqlite3 connection."""
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.create_function("STR_TO_DATE", 2, _str_to_date)
+        self._conn.create_function("YEAR", 1, _year)
+        self._conn.create_function("MONTHNAME", 1, _monthname)
+        self._conn.create_function("MD5", 1, _md5)
+        self._conn.create_function("CRC32", 1, _crc32)
+        self._conn.create_function("CONCAT_WS", -1, _concat_ws)
+        self._open = True
+
+    def cursor(self, dictionary: bool = False, **_kwargs):
+        return _StandInCursor(self._conn.cursor(), dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def ping(self, reconnect: bool = False, **_kwargs):
+        if not self._open:
+            raise mysql.connector.errors.InterfaceError(msg="Connection is closed")
+        self._conn.execute("SELECT 1")
+
+    def is_connected(self) -> bool:
+        return self._open
+
+    def close(self):
+        self._open = False
+        self._conn.close()
+
+
+def sqlite_stand_in_factory(path: str) -> Callable[[], SQLiteStandInConnection]:
+    return lambda: SQLiteStandInConnection(path)
+
+
+# --- Process-wide pool -------------------------------------------------------
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def init_pool(factory: Optional[Callable[[], Any]] = None, **kwargs) -> ConnectionPool:
+    """Creates (or replaces) the shared pool; called once at app startup."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = ConnectionPool(factory or mysql_connection_factory, **kwargs)
+    return _pool
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(mysql_connection_factory)
+    return _pool
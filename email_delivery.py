@@ -0,0 +1,326 @@
+# email_delivery.py
+"""
+Chef feedback email delivery.
+
+Messages are queued in batches and sent by a fixed number of worker threads.
+Each worker keeps one authenticated SMTP session open and reuses it for many
+messages (reconnecting after EMAIL_SESSION_MAX_MESSAGES, after it sat idle,
+or when the server drops it). Temporary failures are retried with
+exponential backoff; every record's outcome is kept in a SQLite delivery
+log that can be queried by batch or record ID. The log also holds each
+queued message, so start() re-queues whatever a previous process (or a
+stop() that timed out) left unsent; a message cut off mid-send may go out
+twice.
+
+The transport is pluggable: anything with `connect()` returning an object
+with `send_message(msg)` and `quit()` works, e.g. an SMTPTransport pointed at
+a local aiosmtpd server (use_ssl=False, no credentials) in tests.
+"""
+import os
+import queue
+import random
+import smtplib
+import sqlite3
+import ssl
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from email import message_from_string, policy
+from email.message import EmailMessage
+from typing import Any, Dict, List, Optional
+
+from config import (
+    EMAIL_DELIVERY_LOG_PATH,
+    EMAIL_MAX_CONCURRENCY,
+    EMAIL_MAX_RETRIES,
+    EMAIL_RETRY_BACKOFF_SECONDS,
+    EMAIL_SESSION_MAX_MESSAGES,
+    EMAIL_SESSION_IDLE_SECONDS,
+    EMAIL_SMTP_TIMEOUT_SECONDS,
+)
+
+QUEUED = "queued"
+SENT = "sent"
+FAILED = "failed"
+
+
+def is_retryable(error: Exception) -> bool:
+    """Dropped connections, timeouts and 4xx replies are temporary; refusals and 5xx are not."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return False
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+class SMTPTransport:
+    """
+    smtplib sessions, logged in once per connect(). Without `use_ssl` the
+    session is upgraded with STARTTLS whenever the server offers it (port 587).
+    """
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 use_ssl: bool = True, timeout: float = EMAIL_SMTP_TIMEOUT_SECONDS):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+
+    def connect(self):
+        smtp_cls = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        session = smtp_cls(self.host, self.port, timeout=self.timeout)
+        try:
+            if not self.use_ssl:
+                session.ehlo()
+                if session.has_extn("starttls"):
+                    session.starttls(context=ssl.create_default_context())
+                    session.ehlo()
+            if self.username and self.password:
+                session.login(self.username, self.password)
+        except Exception:
+            session.close()
+            raise
+        return session
+
+
+@dataclass
+class EmailJob:
+    delivery_id: int
+    record_id: int
+    message: EmailMessage
+    attempts: int = 0
+
+
+class DeliveryLog:
+    def __init__(self, path: str = EMAIL_DELIVERY_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS email_deliveries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                batch_id TEXT NOT NULL,
+                record_id INTEGER NOT NULL,
+                recipient TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                queued_at REAL NOT NULL,
+                finished_at REAL,
+                message TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_email_deliveries_batch ON email_deliveries (batch_id);
+            CREATE INDEX IF NOT EXISTS idx_email_deliveries_record ON email_deliveries (record_id);
+            CREATE INDEX IF NOT EXISTS idx_email_deliveries_status ON email_deliveries (status);
+        """)
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(email_deliveries)")]
+        if "message" not in columns:
+            # Logs written before messages were kept
+            self._conn.execute("ALTER TABLE email_deliveries ADD COLUMN message TEXT")
+        self._conn.commit()
+
+    def add(self, batch_id: str, record_id: int, recipient: str, subject: str, message: str) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO email_deliveries (batch_id, record_id, recipient, subject, status, queued_at, message) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (batch_id, record_id, recipient, subject, QUEUED, time.time(), message),
+            )
+            self._conn.commit()
+            return cur.lastrowid
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Queued deliveries (id, record_id, attempts, message) in queue order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, record_id, attempts, message FROM email_deliveries WHERE status = ? ORDER BY id",
+                (QUEUED,),
+            ).fetchall()
+        return [dict(zip(("id", "record_id", "attempts", "message"), row)) for row in rows]
+
+    def finish(self, delivery_id: int, status: str, attempts: int, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE email_deliveries SET status = ?, attempts = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, attempts, error, time.time(), delivery_id),
+            )
+            self._conn.commit()
+
+    def query(self, batch_id: Optional[str] = None, record_ids: Optional[List[int]] = None,
+              status: Optional[str] = None, limit: int = 500) -> List[Dict[str, Any]]:
+        where, params = [], []
+        if batch_id:
+            where.append("batch_id = ?")
+            params.append(batch_id)
+        if record_ids:
+            where.append(f"record_id IN ({','.join('?' * len(record_ids))})")
+            params.extend(record_ids)
+        if status:
+            where.append("status = ?")
+            params.append(status)
+        sql = "SELECT * FROM email_deliveries"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id DESC LIMIT ?"
+        with self._lock:
+            cur = self._conn.execute(sql, (*params, limit))
+            names = [d[0] for d in cur.description]
+            return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    def counts(self, batch_id: str) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM email_deliveries WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall()
+        return {status: n for status, n in rows}
+
+
+class DeliveryWorker:
+    """
+    `max_concurrency` sender threads, each reusing one SMTP session. Start
+    with start(); enqueue(...) returns a batch ID for DeliveryLog lookups.
+    """
+
+    def __init__(self, transport, log: Optional[DeliveryLog] = None,
+                 max_concurrency: int = EMAIL_MAX_CONCURRENCY,
+                 max_retries: int = EMAIL_MAX_RETRIES,
+                 backoff_seconds: float = EMAIL_RETRY_BACKOFF_SECONDS,
+                 session_max_messages: int = EMAIL_SESSION_MAX_MESSAGES,
+                 session_idle_seconds: float = EMAIL_SESSION_IDLE_SECONDS):
+        self.transport = transport
+        self.log = log or DeliveryLog()
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.session_max_messages = session_max_messages
+        self.session_idle_seconds = session_idle_seconds
+        self._queue: "queue.Queue[Optional[EmailJob]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._recovered = False
+        self.sessions_opened = 0
+        self._stats_lock = threading.Lock()
+
+    def start(self) -> int:
+        """
+        Starts the sender threads; the first start also re-queues the messages
+        the delivery log still has as queued. Returns how many were re-queued.
+        """
+        requeued = 0
+        if not self._recovered:
+            self._recovered = True
+            for row in self.log.unfinished():
+                if row["message"] is None:
+                    self.log.finish(row["id"], FAILED, row["attempts"], "message lost before it was sent")
+                    continue
+                message = message_from_string(row["message"], policy=policy.default)
+                self._queue.put(EmailJob(delivery_id=row["id"], record_id=row["record_id"], message=message,
+                                         attempts=row["attempts"]))
+                requeued += 1
+        for i in range(self.max_concurrency - len(self._threads)):
+            thread = threading.Thread(target=self._worker, name=f"email-delivery-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return requeued
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Lets queued messages drain, then closes every session; messages still
+        queued when `timeout` expires stay queued in the log for the next start().
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, messages: List[Dict[str, Any]]) -> str:
+        """
+        Queues dicts with record_id, to, subject, body, sender and returns
+        the batch ID the delivery log files them under.
+        """
+        batch_id = uuid.uuid4().hex
+        for item in messages:
+            msg = EmailMessage()
+            msg["From"] = item["sender"]
+            msg["To"] = item["to"]
+            msg["Subject"] = item["subject"]
+            msg.set_content(item["body"])
+            delivery_id = self.log.add(batch_id, item["record_id"], item["to"], item["subject"], msg.as_string())
+            self._queue.put(EmailJob(delivery_id=delivery_id, record_id=item["record_id"], message=msg))
+        return batch_id
+
+    def join(self):
+        """Blocks until every queued message has been sent or given up on."""
+        self._queue.join()
+
+    def _open(self):
+        session = self.transport.connect()
+        with self._stats_lock:
+            self.sessions_opened += 1
+        return session
+
+    @staticmethod
+    def _close(session):
+        try:
+            session.quit()
+        except Exception:
+            pass
+
+    def _worker(self):
+        session = None
+        sent_on_session = 0
+        last_used = 0.0
+        while True:
+            try:
+                job = self._queue.get(timeout=self.session_idle_seconds)
+            except queue.Empty:
+                # Idle: don't hold a server connection open
+                if session is not None:
+                    self._close(session)
+                    session = None
+                continue
+            if job is None:
+                self._queue.task_done()
+                break
+            try:
+                while True:
+                    job.attempts += 1
+                    try:
+                        if session is not None and (
+                            sent_on_session >= self.session_max_messages
+                            or time.monotonic() - last_used > self.session_idle_seconds
+                        ):
+                            self._close(session)
+                            session = None
+                        if session is None:
+                            session = self._open()
+                            sent_on_session = 0
+                        session.send_message(job.message)
+                        sent_on_session += 1
+                        last_used = time.monotonic()
+                        self.log.finish(job.delivery_id, SENT, job.attempts)
+                        break
+                    except Exception as e:
+                        if not is_retryable(e) or job.attempts > self.max_retries:
+                            self.log.finish(job.delivery_id, FAILED, job.attempts, str(e))
+                            break
+                        # The session may be unusable now; retry on a fresh one
+                        if session is not None:
+                            self._close(session)
+                            session = None
+                        time.sleep(self.backoff_seconds * (2 ** (job.attempts - 1)) * (1 + random.random() * 0.25))
+            finally:
+                self._queue.task_done()
+        if session is not None:
+            self._close(session)
@@ -0,0 +1,104 @@
+# feedback_sanitizer.py
+"""
+Cleans LLM-written chef feedback into the form that gets stored and emailed.
+
+parse_feedback() pulls the subject out of a leading "Subject:" line,
+fills the [Station Chef's Name] / [Your Name] placeholders, drops greetings
+before the third kept body line (the email adds its own) and cuts
+everything from the first sign-off ("Best,", "Regards,", ...) on, in one
+pass over the lines. Cleaning is idempotent: greetings are judged by the
+lines kept before them, not by their position in the raw text.
+
+sanitize_feedback() stores the cleaned body, behind the model's own
+"Subject:" line when it wrote one, so Chef_Feedback keeps the shape of raw
+LLM feedback; db.update_mysql_data marks such rows with SANITIZER_VERSION.
+The send path only splits marked rows with stored_feedback_parts(); rows
+stored before sanitizing are cleaned once by backfill_feedback.py.
+"""
+import re
+from typing import Any, Dict, Optional, Tuple
+
+SUBJECT_PREFIX = "Subject:"
+# Bump when the output of sanitize_feedback changes (invalidates cached analysis results)
+SANITIZER_VERSION = 3
+
+_GREETING_RE = re.compile(r"(?:hi|hello|dear)(?: |$)", re.IGNORECASE)
+_CLOSER_RE = re.compile(r"(?:best|best regards|regards|thanks|thank you),", re.IGNORECASE)
+_PLACEHOLDER_RE = re.compile(r"\[Station Chef's Name\]|\[Your Name\]")
+# Greetings are only stripped until this many body lines are kept
+_GREETING_LINES = 3
+
+
+def default_subject(ingredient: Optional[str], branch: Optional[str]) -> str:
+    return f"Waste Feedback Required – {ingredient or 'Item'} ({branch})"
+
+
+def _parse(raw_feedback: str, chef_name: Optional[str], manager_name: Optional[str]) -> Tuple[Optional[str], str]:
+    lines = raw_feedback.strip().split("\n")
+    first = lines[0].strip()
+    subject = None
+    if first[:len(SUBJECT_PREFIX)].lower() == SUBJECT_PREFIX.lower():
+        subject = first[len(SUBJECT_PREFIX):].strip()
+        lines = lines[1:]
+
+    chef_tokens = (chef_name or "Chef").split()
+    replacements = {
+        "[Station Chef's Name]": chef_tokens[0] if chef_tokens else "Chef",
+        "[Your Name]": manager_name or "Management",
+    }
+
+    kept = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if "[" in line:
+            line = _PLACEHOLDER_RE.sub(lambda m: replacements[m.group(0)], line)
+        for piece in line.splitlines():
+            stripped = piece.strip()
+            if len(kept) < _GREETING_LINES and _GREETING_RE.match(stripped):
+                continue
+            if _CLOSER_RE.fullmatch(stripped):
+                return subject, "\n".join(kept)
+            if stripped:
+                kept.append(stripped)
+    return subject, "\n".join(kept)
+
+
+def parse_feedback(raw_feedback: str, chef_name: Optional[str] = None, manager_name: Optional[str] = None,
+                   branch: Optional[str] = None, ingredient: Optional[str] = None) -> Tuple[str, str]:
+    """Returns (subject, cleaned body) for raw or stored feedback; default_subject() when it has no Subject line."""
+    subject, body = _parse(raw_feedback, chef_name, manager_name)
+    return subject if subject is not None else default_subject(ingredient, branch), body
+
+
+def sanitize_feedback(raw_feedback: str, chef_name: Optional[str] = None, manager_name: Optional[str] = None) -> str:
+    """Raw LLM feedback -> stored form: the cleaned body, after the model's "Subject:" line if it wrote one."""
+    subject, body = _parse(raw_feedback, chef_name, manager_name)
+    return body if subject is None else f"{SUBJECT_PREFIX} {subject}\n{body}"
+
+
+def stored_feedback_parts(stored: str, branch: Optional[str] = None,
+                          ingredient: Optional[str] = None) -> Tuple[str, str]:
+    """(subject, body) of feedback stored by sanitize_feedback, without cleaning it again."""
+    first, _, rest = stored.partition("\n")
+    if first.startswith(SUBJECT_PREFIX):
+        return first[len(SUBJECT_PREFIX):].strip(), rest
+    return default_subject(ingredient, branch), stored
+
+
+def is_generated_feedback(text) -> bool:
+    """True for real feedback text, False for N/A placeholders and LLM error strings."""
+    return isinstance(text, str) and bool(text.strip()) and text != "N/A" and not text.startswith("LLM Error")
+
+
+def sanitize_record_feedback(feedback, record: Dict[str, Any]):
+    """sanitize_feedback with names taken from a waste-log record; placeholders/errors pass through."""
+    if not is_generated_feedback(feedback):
+        return feedback
+
+    def text(col):
+        value = record.get(col)
+        return value if isinstance(value, str) else None
+
+    return sanitize_feedback(feedback, text("Chef"), text("Branch Manager"))
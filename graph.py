@@ -1,4 +1,5 @@
 # graph.py
+import threading
 from langgraph.graph import StateGraph, END
 from graph_nodes import (
     AgentState,
@@ -9,6 +10,7 @@ from graph_nodes import (
     communication_node,
     router_edge,
 )
+from instrumentation import instrument_node
 
 def build_graph():
     """
@@ -18,13 +20,13 @@ def build_graph():
     workflow = StateGraph(AgentState)
 
     # === Add all nodes ===
-    workflow.add_node("analysis", analysis_and_llm_node)
-    workflow.add_node("router", status_router_node)
-    workflow.add_node("chef_feedback_gen", chef_feedback_node)
-    workflow.add_node("append_ignore", append_data_node)
-    workflow.add_node("append_pending", append_data_node)
-    workflow.add_node("append_approved", append_data_node)   # Still used for data append simulation
-    workflow.add_node("send_message", communication_node)
+    workflow.add_node("analysis", instrument_node("analysis", analysis_and_llm_node))
+    workflow.add_node("router", instrument_node("router", status_router_node))
+    workflow.add_node("chef_feedback_gen", instrument_node("chef_feedback_gen", chef_feedback_node))
+    workflow.add_node("append_ignore", instrument_node("append_ignore", append_data_node))
+    workflow.add_node("append_pending", instrument_node("append_pending", append_data_node))
+    workflow.add_node("append_approved", instrument_node("append_approved", append_data_node))   # Still used for data append simulation
+    workflow.add_node("send_message", instrument_node("send_message", communication_node))
 
     # === Entry point ===
     workflow.set_entry_point("analysis")
@@ -52,4 +54,15 @@ def build_graph():
     workflow.add_edge("chef_feedback_gen", "send_message")
     workflow.add_edge("send_message", END)
 
-    return workflow.compile()
\ No newline at end of file
+    return workflow.compile()
+
+_graph = None
+_graph_lock = threading.Lock()
+
+def get_graph():
+    """Process-wide compiled workflow, built on first use (once per worker process)."""
+    global _graph
+    with _graph_lock:
+        if _graph is None:
+            _graph = build_graph()
+    return _graph
@@ -10,6 +10,7 @@ from llm import (
     generate_chef_feedback_prompt,
     generate_chef_feedback_summary,
 )
+from feedback_sanitizer import sanitize_record_feedback
 from config import (
     EXPECTED_THRESHOLD,
     RATE_THRESHOLD,
@@ -29,12 +30,16 @@ class AgentState(TypedDict):
     record: Dict[str, Any]
     branch_metrics: Dict[str, Any]
     status: str
+    # Set when the deterministic flags were already computed in bulk
+    # (see analysis.detect_branch_flags); the node then only does the LLM part.
+    flags_precomputed: bool
+    # Set when the caller batches the LLM calls itself (see llm_dispatcher.py);
+    # nodes then only build prompts and leave the summaries as None.
+    defer_llm: bool
 
 
-def analysis_and_llm_node(state: AgentState) -> AgentState:
-    record = state["record"]
-    metrics = state["branch_metrics"]
-
+def detect_record_flags(record: Dict[str, Any], metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """Scalar waste/root-cause detection for one record (reference implementation)."""
     # Extract pre-calculated branch metrics
     branch_avg = metrics.get("branch_avg", 0.0)
     nonpeak_rate = metrics.get("nonpeak_rate", 0.0)
@@ -101,10 +106,24 @@ def analysis_and_llm_node(state: AgentState) -> AgentState:
     record["Supplier_Rotation_Issue"] = supplier in supplier_rotation_history_set and record["High_Waste_Flag"]
 
     record["Root_Causes"] = combine_causes(record)
+    return record
+
+
+def analysis_and_llm_node(state: AgentState) -> AgentState:
+    record = state["record"]
+    branch_avg = state["branch_metrics"].get("branch_avg", 0.0)
+
+    if not state.get("flags_precomputed"):
+        record = detect_record_flags(record, state["branch_metrics"])
 
     # --- LLM Summaries ---
     record["LLM_Prompt"] = generate_llm_prompt(record, branch_avg)
-    record["LLM_Summary"] = generate_llm_summary(record["LLM_Prompt"]) if record["LLM_Prompt"] else "N/A (No major issue detected)"
+    if not record["LLM_Prompt"]:
+        record["LLM_Summary"] = "N/A (No major issue detected)"
+    elif state.get("defer_llm"):
+        record["LLM_Summary"] = None
+    else:
+        record["LLM_Summary"] = generate_llm_summary(record["LLM_Prompt"])
 
     # Chef feedback placeholders
     record["Chef_Feedback_Prompt"] = "N/A"
@@ -143,7 +162,8 @@ def chef_feedback_node(state: AgentState) -> AgentState:
     if state["status"] == "Approved by Manager":
         prompt = generate_chef_feedback_prompt(record)
         record["Chef_Feedback_Prompt"] = prompt
-        record["Chef_Feedback_Summary"] = generate_chef_feedback_summary(prompt)
+        record["Chef_Feedback_Summary"] = None if state.get("defer_llm") else sanitize_record_feedback(
+            generate_chef_feedback_summary(prompt), record)
     else:
         record["Chef_Feedback_Summary"] = "N/A"
 
@@ -0,0 +1,432 @@
+# ingestion.py
+"""
+Real-time ingestion of waste-log events (POST /ingest).
+
+Requests hand their events to one EventIngester, whose worker thread takes
+everything queued (up to INGEST_BATCH_MAX_EVENTS, waiting at most
+INGEST_BATCH_MAX_WAIT_SECONDS for more) and handles it as one micro-batch:
+
+1. parse and validate the events; a request with an invalid event fails as
+   a whole, the other requests of the batch go on
+2. drop events whose ID is already stored (client retries) or repeated
+3. score the new events with the detection rules of /analyze
+   (detect_branch_flags, and route_statuses for the status_router_node
+   rules) against the branch metrics of their month and the
+   INGEST_METRICS_MONTHS - 1 months before it, read from metrics_store.py
+   and cached for INGEST_METRICS_TTL_SECONDS; in the "timeseries" detection
+   mode a StreamingDetector seeded from each branch's history scores them
+   against their series
+4. insert them into waste_logs with multi-row INSERTs, scored Status
+   included, then fold them into the metrics store and the rollup cube
+
+Critical events (status "Approved by Manager": wastage cost of at least
+COST_CRITICAL_THRESHOLD or several root causes) are put on a bounded
+follow-up queue. A second thread runs them through the LangGraph workflow
+and the LLM dispatcher, in groups that share a branch and its metrics,
+writes the chef feedback of the rows it changed back and refreshes their
+rollup cube cells. Events finding the queue full, or still queued at
+shutdown, are counted as dropped; the next /analyze of their month still
+covers them.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config import (
+    BRANCH_COLUMN,
+    DETECTION_MODE,
+    INGEST_BATCH_MAX_EVENTS,
+    INGEST_BATCH_MAX_WAIT_SECONDS,
+    INGEST_MAX_EVENTS_PER_REQUEST,
+    INGEST_METRICS_MONTHS,
+    INGEST_METRICS_TTL_SECONDS,
+    INGEST_FOLLOWUP_ENABLED,
+    INGEST_FOLLOWUP_QUEUE_SIZE,
+    ANALYZE_STREAM_BATCH_SIZE,
+)
+from analysis import (
+    OUTPUT_COLUMNS, SUMMARY_CLUSTER_COLUMN, detect_branch_flags, route_statuses, run_branch_analysis,
+)
+from analysis_cache import get_analysis_cache
+from db import existing_ids, insert_mysql_data, load_mysql_data, update_mysql_data
+from instrumentation import timed
+from metrics_store import MetricsStore, get_metrics_store, sync_from_mysql
+from offline import parse_dates
+from rollup_cube import refresh_rollup
+from timeseries_detection import StreamingDetector, TS_COLUMNS, load_history_baselines
+
+REQUIRED_FIELDS = ["ID", "Date", BRANCH_COLUMN, "Ingredient", "Planned Qty", "Wastage Qty"]
+NUMERIC_FIELDS = ["Planned Qty", "Wastage Qty", "Expected Waste Qty", "Sales Qty", "Unit Cost", "Total Cost",
+                  "Wastage Cost", "Temperature (°C)"]
+# Stored as sent, parsed for scoring
+TEXT_DATE_FIELDS = ["Expiry Date", "Stock Received Date"]
+# Per-event fields of the /ingest response
+RESULT_COLUMNS = ["ID", "Status", "Combined_Flag", "Root_Causes", "Waste Rate"]
+CRITICAL_STATUS = "Approved by Manager"
+
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    # One format for the whole batch (the first value's); values of requests
+    # using another one are parsed one by one
+    parsed = parse_dates(values)
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], errors="coerce", format="mixed")
+    return parsed
+
+
+def parse_events(events: List[Dict[str, Any]]) -> Tuple[pd.DataFrame, pd.Series]:
+    """
+    Events (dicts keyed by waste_logs column names) as a frame, with `Date`
+    parsed (a separate `Time` of day is folded in, as in the CSV exports) and
+    numeric fields coerced, plus one error message per event ("" when valid).
+    TEXT_DATE_FIELDS are only checked; they are stored in the client's format.
+    """
+    df = pd.DataFrame.from_records(events)
+    errors = pd.Series("", index=df.index, dtype=object)
+
+    def fail(mask: pd.Series, message: str):
+        errors[mask & (errors == "")] = message
+
+    for col in REQUIRED_FIELDS:
+        if col not in df.columns:
+            df[col] = None
+        fail(df[col].isna(), f"missing {col}")
+
+    ids = pd.to_numeric(df["ID"], errors="coerce")
+    fail(ids.isna() | (ids % 1 != 0), "ID must be an integer")
+    df["ID"] = ids.fillna(0).astype("int64")
+
+    text = df["Date"].astype(str)
+    if "Time" in df.columns:
+        day_only = df["Time"].notna() & ~text.str.contains(" ", regex=False)
+        text = text.where(~day_only, text + " " + df["Time"].astype(str))
+    df["Date"] = _parse_dates(text.where(df["Date"].notna()))
+    fail(df["Date"].isna(), "unparseable Date")
+
+    for col in NUMERIC_FIELDS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors="coerce")
+            fail(values.isna() & df[col].notna(), f"{col} must be a number")
+            df[col] = values
+    for col in TEXT_DATE_FIELDS:
+        if col in df.columns:
+            fail(_parse_dates(df[col]).isna() & df[col].notna(), f"unparseable {col}")
+    return df, errors
+
+
+@dataclass
+class _Submission:
+    events: List[Dict[str, Any]]
+    future: Future = field(default_factory=Future)
+
+
+class EventIngester:
+    """
+    Micro-batching scorer and writer of waste-log events; `app` is the
+    compiled graph critical events are followed up with. Start with start();
+    submit(events) returns a Future of the /ingest response.
+    """
+
+    def __init__(self, app, store: Optional[MetricsStore] = None,
+                 max_batch_events: int = INGEST_BATCH_MAX_EVENTS,
+                 max_wait_seconds: float = INGEST_BATCH_MAX_WAIT_SECONDS,
+                 followup: bool = INGEST_FOLLOWUP_ENABLED,
+                 followup_queue_size: int = INGEST_FOLLOWUP_QUEUE_SIZE):
+        self.app = app
+        self._store = store
+        self.max_batch_events = max(1, max_batch_events)
+        self.max_wait_seconds = max_wait_seconds
+        self.followup = followup
+        self._queue: "queue.Queue[Optional[_Submission]]" = queue.Queue()
+        self._followups: "queue.Queue[Optional[Tuple[str, Dict[str, Any], pd.DataFrame]]]" = \
+            queue.Queue(maxsize=followup_queue_size)
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._metrics: Dict[Tuple[str, str], Tuple[Dict[str, Any], float]] = {}
+        self._detector = StreamingDetector() if DETECTION_MODE == "timeseries" else None
+        self._seeded_branches = set()
+        self._synced = False
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "events": 0, "invalid_requests": 0, "batches": 0, "max_batch_events": 0,
+                       "inserted": 0, "duplicates": 0, "critical": 0, "followup_queued": 0, "followup_done": 0,
+                       "followup_failed": 0, "followup_dropped": 0, "failed_batches": 0}
+        self.last_error: Optional[str] = None
+
+    @property
+    def store(self) -> MetricsStore:
+        if self._store is None:
+            self._store = get_metrics_store()
+        return self._store
+
+    def start(self):
+        if self._threads:
+            return
+        targets = [("ingest-batcher", self._worker)]
+        if self.followup:
+            targets.append(("ingest-followup", self._followup_worker))
+        for name, target in targets:
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Handles every queued event and finishes the follow-up in progress; the
+        follow-ups still queued are counted as dropped.
+        """
+        if not self._threads:
+            return
+        self._queue.put(None)
+        self._threads[0].join(timeout)
+        if self.followup:
+            self._stopping.set()
+            self._followups.put(None)
+            self._threads[1].join(timeout)
+        self._threads = []
+        self._stopping.clear()
+
+    def submit(self, events: List[Dict[str, Any]]) -> Future:
+        """Queues one request's events; the Future resolves to its /ingest response."""
+        if not isinstance(events, list) or not events:
+            raise ValueError("Expected an event object or a non-empty list of events.")
+        if len(events) > INGEST_MAX_EVENTS_PER_REQUEST:
+            raise ValueError(f"At most {INGEST_MAX_EVENTS_PER_REQUEST} events per request.")
+        if not all(isinstance(event, dict) for event in events):
+            raise ValueError("Every event must be a JSON object.")
+        if not self._threads:
+            raise RuntimeError("EventIngester is not started")
+        submission = _Submission(events)
+        self._queue.put(submission)
+        return submission.future
+
+    def ingest(self, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Blocking submit()."""
+        return self.submit(events).result()
+
+    def join_followups(self):
+        """Blocks until every queued follow-up has been handled."""
+        self._followups.join()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["mean_batch_events"] = round(stats["events"] / stats["batches"], 1) if stats["batches"] else 0.0
+        stats["queued_requests"] = self._queue.qsize()
+        stats["followup_pending"] = self._followups.qsize()
+        stats["last_error"] = self.last_error
+        return stats
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for key, delta in deltas.items():
+                self._stats[key] += delta
+
+    # --- micro-batches ---------------------------------------------------
+
+    def _collect(self, first: _Submission) -> Tuple[List[_Submission], bool]:
+        batch, size = [first], len(first.events)
+        deadline = time.monotonic() + self.max_wait_seconds
+        while size < self.max_batch_events:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            size += len(item.events)
+        return batch, False
+
+    def _worker(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            try:
+                self._handle(batch)
+            except Exception as e:
+                self.last_error = str(e)
+                self._count(failed_batches=1)
+                for submission in batch:
+                    if not submission.future.done():
+                        submission.future.set_exception(e)
+            if stopping:
+                break
+
+    def _handle(self, batch: List[_Submission]):
+        events = [event for submission in batch for event in submission.events]
+        df, errors = parse_events(events)
+        accepted, offset = [], 0
+        for submission in batch:
+            rows = slice(offset, offset + len(submission.events))
+            offset += len(submission.events)
+            problems = errors.iloc[rows]
+            bad = problems[problems != ""]
+            if len(bad):
+                position = bad.index[0] - rows.start
+                submission.future.set_exception(ValueError(f"Event {position}: {bad.iloc[0]}"))
+                continue
+            accepted.append((submission, df.iloc[rows]))
+        self._count(requests=len(batch), events=len(events), batches=1,
+                    invalid_requests=len(batch) - len(accepted))
+        with self._stats_lock:
+            self._stats["max_batch_events"] = max(self._stats["max_batch_events"], len(events))
+        if not accepted:
+            return
+
+        df = pd.concat([part for _, part in accepted])
+        if not self._synced:
+            # Rows stored before this process ingested anything: part of the
+            # metrics events are scored against, and never skipped by the
+            # store's ID watermark once ingested IDs move past them
+            sync_from_mysql(self.store)
+            self._synced = True
+        with timed("ingest", rows=len(df)):
+            stored = existing_ids(df["ID"].unique().tolist())
+            new = ~df["ID"].isin(stored) & ~df["ID"].duplicated()
+            scored = self.score(df[new])
+            written = insert_mysql_data(scored.assign(**{col: df.loc[scored.index, col] for col in TEXT_DATE_FIELDS
+                                                         if col in df.columns}))
+            raced = set(written["duplicate_ids"])
+            if raced:
+                scored = scored[~scored["ID"].isin(raced)]
+            self._fold(scored)
+
+        critical = scored["Status"] == CRITICAL_STATUS
+        self._count(inserted=len(scored), duplicates=len(df) - len(scored), critical=int(critical.sum()))
+        if critical.any():
+            self._queue_followups(scored[critical])
+
+        results = scored.reindex(columns=RESULT_COLUMNS)
+        results["Critical"] = critical
+        results = results.astype(object).where(results.notna(), None)
+        by_label = dict(zip(scored.index, results.to_dict(orient="records")))
+        for submission, part in accepted:
+            records = [by_label.get(label) for label in part.index]
+            submission.future.set_result({
+                "accepted": sum(record is not None for record in records),
+                "duplicates": [int(i) for i, record in zip(part["ID"], records) if record is None],
+                "critical": sum(bool(record and record["Critical"]) for record in records),
+                "events": [record for record in records if record is not None],
+            })
+
+    # --- scoring ---------------------------------------------------------
+
+    def branch_metrics(self, branch: str, month: pd.Period) -> Dict[str, Any]:
+        """Metrics events of `branch` in `month` are scored against (cached for INGEST_METRICS_TTL_SECONDS)."""
+        key = (branch, str(month))
+        now = time.monotonic()
+        cached = self._metrics.get(key)
+        if cached is None or now - cached[1] > INGEST_METRICS_TTL_SECONDS:
+            if len(self._metrics) > 10_000:
+                self._metrics = {k: v for k, v in self._metrics.items() if now - v[1] <= INGEST_METRICS_TTL_SECONDS}
+            first = (month - (max(1, INGEST_METRICS_MONTHS) - 1)).strftime("%Y-%m")
+            cached = (self.store.branch_metrics(branch, first, str(month)), now)
+            self._metrics[key] = cached
+        return cached[0]
+
+    def _seed_series(self, df: pd.DataFrame):
+        # History of each branch the detector has not seen yet: its previous
+        # months and its month so far, loaded before this batch is inserted
+        for branch, date in df.groupby(BRANCH_COLUMN, sort=False)["Date"].min().items():
+            if branch in self._seeded_branches:
+                continue
+            year, month = date.year, date.strftime("%B")
+            self._detector.extend(load_history_baselines(branch, year, month) or [])
+            current = load_mysql_data(branch_name=branch, year=year, month_name=month)
+            if not current.empty:
+                self._detector.update(current)
+            self._seeded_branches.add(branch)
+
+    def score(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Flags and Status of validated, new events."""
+        if df.empty:
+            return df.assign(Status=pd.Series(dtype=object))
+        df = df.copy()
+        for col in TEXT_DATE_FIELDS:
+            if col in df.columns:
+                df[col] = _parse_dates(df[col])
+        if self._detector is not None:
+            self._seed_series(df)
+            df[TS_COLUMNS] = self._detector.score(df)
+        parts = []
+        for (branch, month), rows in df.groupby([df[BRANCH_COLUMN], df["Date"].dt.to_period("M")], sort=False):
+            parts.append(detect_branch_flags(rows.copy(), self.branch_metrics(branch, month)))
+        scored = pd.concat(parts).loc[df.index]
+        scored["Status"] = route_statuses(scored)
+        return scored
+
+    def _fold(self, scored: pd.DataFrame):
+        if scored.empty:
+            return
+        self.store.ingest(scored)
+        refresh_rollup(scored)
+
+    # --- follow-ups ------------------------------------------------------
+
+    def _queue_followups(self, critical: pd.DataFrame):
+        if not self.followup:
+            return
+        critical = critical.drop(columns=OUTPUT_COLUMNS, errors="ignore")
+        for (branch, month), rows in critical.groupby([critical[BRANCH_COLUMN], critical["Date"].dt.to_period("M")],
+                                                      sort=False):
+            try:
+                self._followups.put_nowait((branch, self.branch_metrics(branch, month), rows))
+                self._count(followup_queued=len(rows))
+            except queue.Full:
+                self._count(followup_dropped=len(rows))
+
+    def _followup_worker(self):
+        while True:
+            item = self._followups.get()
+            if item is None:
+                self._followups.task_done()
+                break
+            items = [item]
+            # Rows of one branch scored against the same metrics share a graph + LLM run
+            while sum(len(rows) for _, _, rows in items) < ANALYZE_STREAM_BATCH_SIZE:
+                try:
+                    extra = self._followups.get_nowait()
+                except queue.Empty:
+                    break
+                if extra is None:
+                    self._followups.put(None)
+                    self._followups.task_done()
+                    break
+                items.append(extra)
+            if self._stopping.is_set():
+                self._count(followup_dropped=sum(len(rows) for _, _, rows in items))
+                for _ in items:
+                    self._followups.task_done()
+                continue
+            groups: Dict[Tuple[str, int], Tuple[str, Dict[str, Any], List[pd.DataFrame]]] = {}
+            for branch, metrics, rows in items:
+                groups.setdefault((branch, id(metrics)), (branch, metrics, []))[2].append(rows)
+            for branch, metrics, parts in groups.values():
+                rows = pd.concat(parts)
+                # Only the critical rows of a few batches are here, not the branch-month:
+                # no summary clusters (analysis.assign_summary_clusters), one summary per row
+                rows[SUMMARY_CLUSTER_COLUMN] = ""
+                try:
+                    result = run_branch_analysis(rows, branch, self.app, branch_metrics=metrics,
+                                                 result_cache=get_analysis_cache())
+                    # As inserted: the scored status, no feedback yet unless the event had one
+                    stored = rows[["ID"]].assign(
+                        Status=CRITICAL_STATUS,
+                        Chef_Feedback=rows["Chef_Feedback"] if "Chef_Feedback" in rows.columns else "")
+                    update_mysql_data(result, df_loaded=stored)
+                    refresh_rollup(result)
+                    self._count(followup_done=len(rows))
+                except Exception as e:
+                    self.last_error = str(e)
+                    self._count(followup_failed=len(rows))
+            for _ in items:
+                self._followups.task_done()
+
@@ -0,0 +1,189 @@
+# instrumentation.py
+"""
+Latency histograms, counters and per-request timing breakdowns.
+
+Stages (`with timed("load"): ...`) and LangGraph nodes (instrument_node)
+feed process-wide histograms that render in the Prometheus text format for
+GET /metrics. While a request is being timed (start_request_timing), the
+same measurements are also summed per stage so main.py can return them in a
+Server-Timing header.
+
+Worker processes (batch.py) keep their own registries; their timings are
+reported in the batch results instead of /metrics.
+"""
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _label_text(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(self.labelnames, key)} {value:g}")
+        return "\n".join(lines)
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [bucket counts..., count, sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    labels = _label_text(self.labelnames, key, 'le="%g"' % bound)
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _label_text(self.labelnames, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {series[-2]}")
+                lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {series[-1]:.6f}")
+        return "\n".join(lines)
+
+
+STAGE_SECONDS = Histogram("waste_stage_duration_seconds", "Time spent per analysis stage.", ["stage"])
+NODE_SECONDS = Histogram("waste_graph_node_duration_seconds", "Time spent per LangGraph node call.", ["node"])
+LLM_CALL_SECONDS = Histogram("waste_llm_call_duration_seconds", "Latency of single LLM calls.", ["kind"])
+ROWS_TOTAL = Counter("waste_rows_total", "Rows handled per stage.", ["stage"])
+LLM_TOKENS_TOTAL = Counter("waste_llm_tokens_total", "LLM tokens reported by the provider.", ["kind", "direction"])
+LLM_CALLS_TOTAL = Counter("waste_llm_calls_total", "LLM calls by outcome.", ["kind", "outcome"])
+LLM_CALLS_SAVED_TOTAL = Counter("waste_llm_calls_saved_total",
+                                "LLM prompts answered without a call: grouped (same prompt in the run) or cached.",
+                                ["kind", "reason"])
+
+REGISTRY = [STAGE_SECONDS, NODE_SECONDS, LLM_CALL_SECONDS, ROWS_TOTAL, LLM_TOKENS_TOTAL, LLM_CALLS_TOTAL,
+            LLM_CALLS_SAVED_TOTAL]
+
+# stage -> [total seconds, calls] for the request currently being timed
+_request_timings: contextvars.ContextVar[Optional[Dict[str, list]]] = contextvars.ContextVar(
+    "request_timings", default=None)
+
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def start_request_timing() -> contextvars.Token:
+    return _request_timings.set({})
+
+
+def finish_request_timing(token: contextvars.Token) -> Dict[str, list]:
+    timings = _request_timings.get() or {}
+    _request_timings.reset(token)
+    return timings
+
+
+def server_timing_header(timings: Dict[str, list]) -> str:
+    """Server-Timing value, e.g. 'load;dur=12.1, metrics;dur=3.4;desc="1 call"'."""
+    parts = []
+    for stage, (seconds, calls) in timings.items():
+        name = stage.replace(" ", "_").replace(":", "-")
+        parts.append(f'{name};dur={seconds * 1000:.1f};desc="{calls} call{"s" if calls != 1 else ""}"')
+    return ", ".join(parts)
+
+
+def _record_request(stage: str, seconds: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+def record_stage(stage: str, seconds: float, rows: Optional[int] = None):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if rows is not None:
+        ROWS_TOTAL.inc(rows, stage=stage)
+    _record_request(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str, rows: Optional[int] = None):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, rows)
+
+
+def instrument_node(name: str, fn):
+    """Wraps a LangGraph node so every call lands in the per-node histogram."""
+    @functools.wraps(fn)
+    def wrapper(state):
+        start = time.perf_counter()
+        try:
+            return fn(state)
+        finally:
+            elapsed = time.perf_counter() - start
+            NODE_SECONDS.observe(elapsed, node=name)
+            _record_request(f"node:{name}", elapsed)
+    return wrapper
+
+
+def record_llm_call(kind: str, seconds: float, response: Any = None, error: bool = False):
+    """Latency, outcome and (when the provider reports it) token usage of one LLM call."""
+    LLM_CALL_SECONDS.observe(seconds, kind=kind)
+    LLM_CALLS_TOTAL.inc(kind=kind, outcome="error" if error else "ok")
+    usage = getattr(response, "usage_metadata", None) or {}
+    if not usage:
+        usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    prompt_tokens = usage.get("input_tokens", usage.get("prompt_tokens"))
+    completion_tokens = usage.get("output_tokens", usage.get("completion_tokens"))
+    if prompt_tokens:
+        LLM_TOKENS_TOTAL.inc(prompt_tokens, kind=kind, direction="prompt")
+    if completion_tokens:
+        LLM_TOKENS_TOTAL.inc(completion_tokens, kind=kind, direction="completion")
+
+
+def record_llm_calls_saved(kind: str, reason: str, count: int = 1):
+    if count:
+        LLM_CALLS_SAVED_TOTAL.inc(count, kind=kind, reason=reason)
@@ -0,0 +1,204 @@
+# jobs.py
+"""
+Background analysis jobs.
+
+A job analyzes one branch-month exactly like GET /analyze, but on a worker
+thread pool: the caller gets a job ID back immediately and polls status or
+pages through the results. Jobs and their result records live in a local
+SQLite file, so a restarted process re-queues whatever was still queued or
+running. Concurrent submissions for the same branch/year/month share one job.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import JOBS_DB_PATH, JOB_WORKERS
+from db import load_mysql_data, update_mysql_data, month_bounds
+from analysis import iter_branch_analysis, build_response_frame
+from analysis_cache import get_analysis_cache
+from rollup_cube import refresh_rollup
+from timeseries_detection import load_history_baselines
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+
+class JobStore:
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                branch TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                month TEXT NOT NULL,
+                status TEXT NOT NULL,
+                rows_done INTEGER NOT NULL DEFAULT 0,
+                rows_total INTEGER,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            );
+            -- at most one queued/running job per branch-month
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active
+                ON jobs (branch, year, month) WHERE status IN ('{QUEUED}', '{RUNNING}');
+            CREATE TABLE IF NOT EXISTS job_results (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                record TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            );
+        """)
+        self._conn.commit()
+
+    def create(self, branch: str, year: int, month: str) -> Tuple[Dict[str, Any], bool]:
+        """Returns (job, created); an active job for the same branch-month is reused."""
+        with self._lock:
+            row = self._active(branch, year, month)
+            if row is not None:
+                return row, False
+            job_id = uuid.uuid4().hex
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, branch, year, month, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job_id, branch, year, month, QUEUED, time.time()),
+                )
+                self._conn.commit()
+            except sqlite3.IntegrityError:
+                # Another process sharing the file queued it first
+                self._conn.rollback()
+                return self._active(branch, year, month), False
+        return self.get(job_id), True
+
+    def _active(self, branch: str, year: int, month: str) -> Optional[Dict[str, Any]]:
+        cur = self._conn.execute(
+            "SELECT * FROM jobs WHERE branch = ? AND year = ? AND month = ? AND status IN (?, ?)",
+            (branch, year, month, *ACTIVE_STATUSES),
+        )
+        row = cur.fetchone()
+        return dict(zip([d[0] for d in cur.description], row)) if row else None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cur = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cur.fetchone()
+        return dict(zip([d[0] for d in cur.description], row)) if row else None
+
+    def update(self, job_id: str, **fields):
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def claim(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Moves a queued job to running; None if it is gone or someone else took it."""
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), job_id, QUEUED),
+            )
+            self._conn.commit()
+            claimed = cur.rowcount == 1
+        return self.get(job_id) if claimed else None
+
+    def append_results(self, job_id: str, start_seq: int, records: List[Dict[str, Any]], rows_done: int):
+        """Stores one batch of result records and advances the job's progress atomically."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, seq, record) VALUES (?, ?, ?)",
+                [(job_id, start_seq + i, json.dumps(r, default=str)) for i, r in enumerate(records)],
+            )
+            self._conn.execute("UPDATE jobs SET rows_done = ? WHERE id = ?", (rows_done, job_id))
+            self._conn.commit()
+
+    def results(self, job_id: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT record FROM job_results WHERE job_id = ? AND seq >= ? ORDER BY seq LIMIT ?",
+                (job_id, offset, limit),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def requeue_interrupted(self) -> List[str]:
+        """Resets jobs a previous process left running and returns every queued job ID."""
+        with self._lock:
+            running = [r[0] for r in self._conn.execute("SELECT id FROM jobs WHERE status = ?", (RUNNING,))]
+            for job_id in running:
+                self._conn.execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, rows_done = 0, started_at = NULL WHERE status = ?", (QUEUED, RUNNING)
+            )
+            self._conn.commit()
+            return [r[0] for r in self._conn.execute(
+                "SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,))]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobManager:
+    """Runs JobStore jobs on a thread pool with the given compiled graph."""
+
+    def __init__(self, app, store: Optional[JobStore] = None, workers: int = JOB_WORKERS):
+        self.app = app
+        self.store = store or JobStore()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="analysis-job")
+
+    def start(self) -> int:
+        """Picks up jobs persisted by an earlier process; returns how many were re-queued."""
+        job_ids = self.store.requeue_interrupted()
+        for job_id in job_ids:
+            self._executor.submit(self._run, job_id)
+        return len(job_ids)
+
+    def submit(self, branch: str, year: int, month: str) -> Tuple[Dict[str, Any], bool]:
+        start, _ = month_bounds(year, month)  # validates the month name
+        job, created = self.store.create(branch, int(year), start.strftime("%B"))
+        if created:
+            self._executor.submit(self._run, job["id"])
+        return job, created
+
+    def _run(self, job_id: str):
+        job = self.store.claim(job_id)
+        if job is None:
+            return
+        try:
+            df_data = load_mysql_data(branch_name=job["branch"], year=job["year"], month_name=job["month"])
+            if df_data.empty:
+                raise ValueError("No data found for the specified branch, year, and month.")
+            self.store.update(job_id, rows_total=len(df_data))
+            ts_baselines = load_history_baselines(job["branch"], job["year"], job["month"])
+            done = 0
+            for rows, analyzed in iter_branch_analysis(df_data, job["branch"], self.app,
+                                                       result_cache=get_analysis_cache(),
+                                                       ts_baselines=ts_baselines):
+                update_mysql_data(analyzed, df_loaded=rows)
+                refresh_rollup(analyzed)
+                records = build_response_frame(analyzed).to_dict(orient="records")
+                self.store.append_results(job_id, done, records, done + len(records))
+                done += len(records)
+            self.store.update(job_id, status=DONE, finished_at=time.time())
+        except Exception as e:
+            self.store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+
+    def shutdown(self, wait: bool = True):
+        """
+        Waits for the running jobs (unless `wait` is False); unstarted jobs stay
+        queued in the store and are resumed by the next start().
+        """
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,24 +1,139 @@
-from langchain_groq import ChatGroq
 from langchain_core.prompts import ChatPromptTemplate
-from config import GROQ_API_KEY
 import pandas as pd
+from llm_cache import get_llm_cache, cache_key, template_hash
+from llm_registry import get_llm_registry
+from instrumentation import record_llm_call
+import time
 from config import EXPECTED_THRESHOLD, RATE_THRESHOLD, STATION_MULT, SHIFT_MULT, PEAK_MULT, HOT_TEMP, HOT_MULT, COLD_TEMP, COST_CRITICAL_THRESHOLD, COST_IGNORE_THRESHOLD
 
+SUMMARY_TEMPERATURE = 0
+CHEF_FEEDBACK_TEMPERATURE = 0.3
+
+SUMMARY_SYSTEM_PROMPT = "You are an expert waste analysis assistant. Compose a concise, actionable summary (3-4 sentences) and specific, clear recommendations, prioritizing the root causes found."
+CHEF_FEEDBACK_SYSTEM_PROMPT = (
+    "You are a professional Head Chef writing a direct, friendly, and actionable feedback message to a station chef "
+    "about a waste issue. IMPORTANT:\n"
+    "- Output ONLY the main body of the email.\n"
+    "- Do NOT include any greeting lines (no 'Hi', 'Hello', 'Dear', no names).\n"
+    "- Do NOT include any closing or signature (no 'Thanks', 'Regards', no names, roles, or branch names).\n"
+    "- Do NOT include any subject line.\n"
+    "- Start directly with the content of the message.\n"
+    "The body should be brief and end with one clear recommendation sentence."
+)
+
+# Bump when generate_llm_prompt / generate_cluster_llm_prompt / generate_chef_feedback_prompt change meaning,
+# so cached responses for the old wording stop being served.
+PROMPT_TEMPLATE_VERSION = 1
+
+SUMMARY = "summary"
+CHEF_FEEDBACK = "chef_feedback"
+LLM_PROMPT_SPECS = {
+    SUMMARY: (SUMMARY_SYSTEM_PROMPT, SUMMARY_TEMPERATURE),
+    CHEF_FEEDBACK: (CHEF_FEEDBACK_SYSTEM_PROMPT, CHEF_FEEDBACK_TEMPERATURE),
+}
+
+def llm_template_hash(kind):
+    system_prompt, _ = LLM_PROMPT_SPECS[kind]
+    return template_hash(f"{PROMPT_TEMPLATE_VERSION}\n{system_prompt}")
+
+def llm_model_id():
+    return get_llm_registry().model_id
+
+def llm_cache_key(kind, prompt_text):
+    _, temperature = LLM_PROMPT_SPECS[kind]
+    return cache_key(prompt_text, llm_model_id(), temperature, llm_template_hash(kind))
+
+def purge_stale_llm_cache():
+    """Drops cached responses produced under prompt templates that no longer exist."""
+    cache = get_llm_cache()
+    if cache is None:
+        return 0
+    return cache.invalidate(keep_templates=[llm_template_hash(kind) for kind in LLM_PROMPT_SPECS])
+
+def _cached_invoke(kind, chain_builder, prompt_text):
+    cache = get_llm_cache()
+    key = llm_cache_key(kind, prompt_text)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    started = time.perf_counter()
+    try:
+        message = chain_builder().invoke({"prompt": prompt_text})
+    except Exception:
+        record_llm_call(kind, time.perf_counter() - started, error=True)
+        raise
+    record_llm_call(kind, time.perf_counter() - started, message)
+    response = message.content
+    if cache is not None:
+        cache.put(key, llm_template_hash(kind), llm_model_id(), response)
+    return response
+
+SIMULATED_SUMMARY = "Simulated Management Summary: Critical waste event detected for Prime Beef due to multiple root causes: expiry date non-compliance and high shift-level waste. The total cost impact is $150.00. Recommend immediate process review for butchering station Night Shift operations and vendor rotation policies with SupplierY."
+# Fallback: BODY ONLY, no greeting / closing / names
+SIMULATED_CHEF_FEEDBACK = (
+    "Team, we need to address the waste on our Prime Beef. "
+    "We wasted 5.0 units, which is five times the expected amount, leading to a critical cost loss of $150.00. "
+    "The primary issue is that this batch from SupplierY was used two days past its expiry date, which is a serious rotation failure. "
+    "Please implement a mandatory expiry check on all perishable items, especially Prime Beef, before they leave the cold storage area "
+    "and reinforce strict FIFO procedures on the Night Shift."
+)
+
+SIMULATED_RESPONSES = {
+    SUMMARY: SIMULATED_SUMMARY,
+    CHEF_FEEDBACK: SIMULATED_CHEF_FEEDBACK,
+}
+
+def llm_enabled():
+    """False without a usable model (no GROQ_API_KEY); the generate_* helpers then return the simulated texts."""
+    return get_llm_registry().enabled
+
+def get_chain(kind):
+    """The process-wide chain for `kind` (see llm_registry.py); the fake provider answers the simulated text."""
+    system_prompt, temperature = LLM_PROMPT_SPECS[kind]
+    return get_llm_registry().chain(system_prompt, temperature, fake_response=SIMULATED_RESPONSES[kind])
+
+def _build_chain(kind, chat):
+    system_prompt, _ = LLM_PROMPT_SPECS[kind]
+    template = ChatPromptTemplate.from_messages([
+        ("system", system_prompt),
+        ("user", "{prompt}")
+    ])
+    return template | chat
+
+def build_summary_chain(chat=None):
+    """Prompt chain for the management summary; pass `chat` to use another chat model (e.g. a fake)."""
+    return get_chain(SUMMARY) if chat is None else _build_chain(SUMMARY, chat)
+
+def build_chef_feedback_chain(chat=None):
+    """Prompt chain for the chef feedback body; pass `chat` to use another chat model (e.g. a fake)."""
+    return get_chain(CHEF_FEEDBACK) if chat is None else _build_chain(CHEF_FEEDBACK, chat)
+
 def generate_llm_summary(prompt_text):
-    if not GROQ_API_KEY:
-        return "Simulated Management Summary: Critical waste event detected for Prime Beef due to multiple root causes: expiry date non-compliance and high shift-level waste. The total cost impact is $150.00. Recommend immediate process review for butchering station Night Shift operations and vendor rotation policies with SupplierY."
+    if not llm_enabled():
+        return SIMULATED_SUMMARY
     try:
-        chat = ChatGroq(temperature=0, groq_api_key=GROQ_API_KEY, model_name="llama-3.1-8b-instant")
-        template = ChatPromptTemplate.from_messages([
-            ("system", "You are an expert waste analysis assistant. Compose a concise, actionable summary (3-4 sentences) and specific, clear recommendations, prioritizing the root causes found."),
-            ("user", "{prompt}")
-        ])
-        chain = template | chat
-        response = chain.invoke({"prompt": prompt_text})
-        return response.content
+        return _cached_invoke(SUMMARY, build_summary_chain, prompt_text)
     except Exception as e:
         return f"LLM Error: {e}"
 
+def _root_cause_section(row):
+    cause_list = row["Root_Causes"].split(";")
+    section = "\n**Detected Root Causes:**\n"
+    cause_map = {
+        "Expired_Used": "The item was used/wasted after its official Expiry Date.",
+        "Station_Inefficiency": f"The Kitchen Station ({row.get('Kitchen Station', 'N/A')}) has a historical average waste rate higher than {STATION_MULT}x the branch average.",
+        "Shift_Issue": f"The Shift ({row.get('Shift', 'N/A')}) is historically associated with a waste rate higher than {SHIFT_MULT}x the branch average.",
+        "Peak_Pressure": f"The high waste occurred during a Peak Hour, where the waste rate was higher than {PEAK_MULT}x the non-peak average rate.",
+        "Heat_Spoilage": f"The high waste occurred on a hot day (Temp > {HOT_TEMP}°C), and the waste rate exceeded {HOT_MULT}x the moderate-temperature average rate.",
+        "Cold_Overprep": f"The high waste occurred on a cold day (Temp ≤ {COLD_TEMP}°C) with low sales, suggesting over-preparation.",
+        "Supplier_Quality": f"The Supplier ({row.get('Supplier Name', 'N/A')}) is historically categorized as a quality risk due to a high average waste rate.",
+        "Supplier_Rotation": f"The Supplier ({row.get('Supplier Name', 'N/A')}) has a history of expiry issues (rotation risk), and the current row exhibits high waste.",
+    }
+    for cause in cause_list:
+        section += f"* {cause_map.get(cause, cause.replace('_', ' ').title())}\n"
+    return section
+
 def generate_llm_prompt(row, avg_rate):
     if row.get("Combined_Flag", "None") == "None" and row.get("Root_Causes", "None") == "None":
         return ""
@@ -33,24 +148,31 @@ def generate_llm_prompt(row, avg_rate):
     summary += f"The waste instance was categorized as **{row.get('Combined_Flag', 'None')}** (Branch Avg Rate: {avg_rate:.4f}).\n"
     
     if row.get("Root_Causes", "None") != "None":
-        cause_list = row["Root_Causes"].split(";")
-        summary += "\n**Detected Root Causes:**\n"
-        cause_map = {
-            "Expired_Used": "The item was used/wasted after its official Expiry Date.",
-            "Station_Inefficiency": f"The Kitchen Station ({row.get('Kitchen Station', 'N/A')}) has a historical average waste rate higher than {STATION_MULT}x the branch average.",
-            "Shift_Issue": f"The Shift ({row.get('Shift', 'N/A')}) is historically associated with a waste rate higher than {SHIFT_MULT}x the branch average.",
-            "Peak_Pressure": f"The high waste occurred during a Peak Hour, where the waste rate was higher than {PEAK_MULT}x the non-peak average rate.",
-            "Heat_Spoilage": f"The high waste occurred on a hot day (Temp > {HOT_TEMP}°C), and the waste rate exceeded {HOT_MULT}x the moderate-temperature average rate.",
-            "Cold_Overprep": f"The high waste occurred on a cold day (Temp ≤ {COLD_TEMP}°C) with low sales, suggesting over-preparation.",
-            "Supplier_Quality": f"The Supplier ({row.get('Supplier Name', 'N/A')}) is historically categorized as a quality risk due to a high average waste rate.",
-            "Supplier_Rotation": f"The Supplier ({row.get('Supplier Name', 'N/A')}) has a history of expiry issues (rotation risk), and the current row exhibits high waste.",
-        }
-        for cause in cause_list:
-            summary += f"* {cause_map.get(cause, cause.replace('_', ' ').title())}\n"
+        summary += _root_cause_section(row)
     
     summary += "\nBased on the above analysis, compose a concise, actionable summary (3-4 sentences) and specific, clear recommendations in professional, human-readable language, prioritizing the root causes found."
     return summary.strip()
 
+def generate_cluster_llm_prompt(row, cluster, avg_rate):
+    """
+    One summary prompt for flagged rows sharing ingredient, station, shift,
+    flag category and root causes (`row` holds those, with every supplier of
+    the cluster in 'Supplier Name'): their aggregated `cluster` stats instead
+    of one waste instance, so a single LLM call covers the whole cluster.
+    """
+    summary = f"Waste Analysis Summary for Item: {row.get('Ingredient', 'N/A')} at Kitchen Station: {row.get('Kitchen Station', 'N/A')}, Shift: {row.get('Shift', 'N/A')} ({cluster['instances']} waste instances from {cluster['first_date']} to {cluster['last_date']}).\n"
+    summary += f"Mean Waste Rate: {cluster['mean_rate']:.4f} (max {cluster['max_rate']:.4f}), Total Wastage Qty: {cluster['wastage_qty']:.1f}, Total Expected Qty: {cluster['expected_qty']:.1f}"
+    if cluster.get("wastage_cost") is not None:
+        summary += f", Total Wastage Cost: ${cluster['wastage_cost']:.2f}"
+    summary += ".\n"
+    summary += f"Every instance was categorized as **{row.get('Combined_Flag', 'None')}** (Branch Avg Rate: {avg_rate:.4f}).\n"
+
+    if row.get("Root_Causes", "None") != "None":
+        summary += _root_cause_section(row)
+
+    summary += "\nBased on the above analysis, compose a concise, actionable summary (3-4 sentences) covering these recurring waste instances and specific, clear recommendations in professional, human-readable language, prioritizing the root causes found."
+    return summary.strip()
+
 def generate_chef_feedback_prompt(row):
     item_name = row.get('Ingredient', 'N/A')
     wastage_qty = row.get("Wastage Qty", 0.0)
@@ -109,37 +231,9 @@ def generate_chef_feedback_prompt(row):
     return prompt
 
 def generate_chef_feedback_summary(prompt_text):
-    if not GROQ_API_KEY:
-        # Fallback: BODY ONLY, no greeting / closing / names
-        return (
-            "Team, we need to address the waste on our Prime Beef. "
-            "We wasted 5.0 units, which is five times the expected amount, leading to a critical cost loss of $150.00. "
-            "The primary issue is that this batch from SupplierY was used two days past its expiry date, which is a serious rotation failure. "
-            "Please implement a mandatory expiry check on all perishable items, especially Prime Beef, before they leave the cold storage area "
-            "and reinforce strict FIFO procedures on the Night Shift."
-        )
+    if not llm_enabled():
+        return SIMULATED_CHEF_FEEDBACK
     try:
-        chat = ChatGroq(
-            temperature=0.3,
-            groq_api_key=GROQ_API_KEY,
-            model_name="llama-3.1-8b-instant"
-        )
-        template = ChatPromptTemplate.from_messages([
-            (
-                "system",
-                "You are a professional Head Chef writing a direct, friendly, and actionable feedback message to a station chef "
-                "about a waste issue. IMPORTANT:\n"
-                "- Output ONLY the main body of the email.\n"
-                "- Do NOT include any greeting lines (no 'Hi', 'Hello', 'Dear', no names).\n"
-                "- Do NOT include any closing or signature (no 'Thanks', 'Regards', no names, roles, or branch names).\n"
-                "- Do NOT include any subject line.\n"
-                "- Start directly with the content of the message.\n"
-                "The body should be brief and end with one clear recommendation sentence."
-            ),
-            ("user", "{prompt}")
-        ])
-        chain = template | chat
-        response = chain.invoke({"prompt": prompt_text})
-        return response.content
+        return _cached_invoke(CHEF_FEEDBACK, build_chef_feedback_chain, prompt_text)
     except Exception as e:
         return f"LLM Error generating chef feedback: {e}"
\ No newline at end of file
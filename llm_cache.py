@@ -0,0 +1,174 @@
+# llm_cache.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    LLM_CACHE_ENABLED,
+    LLM_CACHE_PATH,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_CACHE_MAX_ENTRIES,
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapses whitespace so formatting-only differences share a cache entry."""
+    return _WHITESPACE.sub(" ", prompt or "").strip()
+
+
+def template_hash(system_prompt: str) -> str:
+    """Fingerprint of a prompt template; entries under an old template are never hit again."""
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(prompt: str, model_name: str, temperature: float, template: str) -> str:
+    payload = "\x1f".join([normalize_prompt(prompt), model_name, repr(float(temperature)), template])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent SQLite cache of LLM responses keyed on (normalized prompt,
+    model, temperature, template hash). Entries expire after `ttl_seconds`
+    and the least recently used ones are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                template TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_template ON llm_cache (template)")
+        self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        requested = list(keys)
+        keys = list(dict.fromkeys(requested))
+        if not keys:
+            return {}
+        now = time.time()
+        found: Dict[str, str] = {}
+        with self._lock:
+            # SQLite caps the number of bound parameters, so look up in slices
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, response FROM llm_cache WHERE key IN ({placeholders}) AND created_at >= ?",
+                    (*chunk, now - self.ttl_seconds),
+                ).fetchall()
+                found.update(rows)
+            if found:
+                self._conn.executemany(
+                    "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", [(now, k) for k in found]
+                )
+                self._conn.commit()
+            hits = sum(1 for k in requested if k in found)
+            self.hits += hits
+            self.misses += len(requested) - hits
+        return found
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries: List[Tuple[str, str, str, str]]):
+        """Stores (key, template, model, response) tuples, then enforces TTL and size cap."""
+        if not entries:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO llm_cache (key, template, model, response, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(k, t, m, r, now, now) for k, t, m, r in entries],
+            )
+            self.stores += len(entries)
+            self._evict(now)
+            self._conn.commit()
+
+    def put(self, key: str, template: str, model: str, response: str):
+        self.put_many([(key, template, model, response)])
+
+    def _evict(self, now: float):
+        expired = self._conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        overflow = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        lru = 0
+        if overflow > 0:
+            lru = self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)", (overflow,)
+            ).rowcount
+        self.evictions += max(expired, 0) + max(lru, 0)
+
+    def invalidate(self, keep_templates: Optional[Iterable[str]] = None) -> int:
+        """
+        Drops entries whose template hash is not in `keep_templates`
+        (everything when None). Returns the number of rows removed.
+        """
+        with self._lock:
+            if keep_templates is None:
+                removed = self._conn.execute("DELETE FROM llm_cache").rowcount
+            else:
+                keep = list(keep_templates)
+                placeholders = ",".join("?" * len(keep)) or "''"
+                removed = self._conn.execute(
+                    f"DELETE FROM llm_cache WHERE template NOT IN ({placeholders})", keep
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide cache instance, or None when caching is disabled."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = LLMResponseCache()
+    return _cache
@@ -0,0 +1,244 @@
+# llm_dispatcher.py
+import asyncio
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage
+
+from config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_RATE_LIMIT_BURST,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF_SECONDS,
+    LLM_CALL_TIMEOUT_SECONDS,
+)
+from llm import (
+    get_chain,
+    llm_enabled,
+    llm_cache_key,
+    llm_model_id,
+    llm_template_hash,
+    LLM_PROMPT_SPECS,
+    SUMMARY,
+    CHEF_FEEDBACK,
+    SIMULATED_SUMMARY,
+    SIMULATED_RESPONSES,
+)
+from llm_cache import LLMResponseCache, get_llm_cache
+from llm_registry import TokenBucket, get_llm_registry
+from instrumentation import record_llm_call, record_llm_calls_saved
+
+# Same fallbacks the blocking generate_* helpers return
+ERROR_PREFIX = {
+    SUMMARY: "LLM Error",
+    CHEF_FEEDBACK: "LLM Error generating chef feedback",
+}
+
+
+class SkippedChain:
+    """Chain stand-in that answers every prompt with an empty string (runs without LLM calls)."""
+
+    async def ainvoke(self, _inputs):
+        return AIMessage(content="")
+
+
+def skipped_chains() -> Dict[str, Any]:
+    return {SUMMARY: SkippedChain(), CHEF_FEEDBACK: SkippedChain()}
+
+
+@dataclass
+class LLMJob:
+    """One pending prompt; `key` tells the caller where to write `result` back."""
+    key: Hashable
+    kind: str
+    prompt: str
+    result: Optional[str] = None
+    attempts: int = 0
+    error: Optional[str] = None
+
+
+@dataclass
+class DispatchStats:
+    submitted: int = 0
+    completed: int = 0
+    cache_hits: int = 0
+    # Jobs answered by another job's call because they had the same prompt
+    deduplicated: int = 0
+    failed: int = 0
+    retries: int = 0
+    max_queue_depth: int = 0
+    queue_depth_samples: List[int] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """Completed calls per second over the whole run."""
+        return self.completed / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        samples = self.queue_depth_samples
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "cache_hits": self.cache_hits,
+            "deduplicated": self.deduplicated,
+            "failed": self.failed,
+            "retries": self.retries,
+            "max_queue_depth": self.max_queue_depth,
+            "mean_queue_depth": (sum(samples) / len(samples)) if samples else 0.0,
+            "elapsed_seconds": round(self.elapsed_seconds, 4),
+            "throughput_per_sec": round(self.throughput, 4),
+        }
+
+
+class LLMDispatcher:
+    """
+    Sends every pending prompt of a run concurrently: bounded by
+    `max_concurrency`, paced by a token bucket, with per-call timeouts and
+    exponential backoff retries. The bucket is the process-wide one of the
+    LLM registry unless `rate_per_sec` is given (benchmarks, tests). Chains only need an async `ainvoke`, so a
+    local fake chat model can be plugged in through `chains`.
+
+    Prompts already answered are served from the LLM response cache; it is
+    only used by default with the real Groq chains, never with injected ones.
+    Jobs repeating a prompt of the same run share its single call.
+    """
+
+    def __init__(
+        self,
+        chains: Optional[Dict[str, Any]] = None,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        rate_per_sec: Optional[float] = None,
+        burst: int = LLM_RATE_LIMIT_BURST,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_seconds: float = LLM_RETRY_BACKOFF_SECONDS,
+        timeout_seconds: float = LLM_CALL_TIMEOUT_SECONDS,
+        cache: Optional[LLMResponseCache] = None,
+    ):
+        self.cache = cache if cache is not None or chains is not None else get_llm_cache()
+        self.chains = chains
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate_limiter = TokenBucket(rate_per_sec, burst) if rate_per_sec is not None else None
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.stats = DispatchStats()
+
+    def _get_chains(self) -> Optional[Dict[str, Any]]:
+        # Registry chains are bound to the running event loop, so they are looked up per run
+        if self.chains is None and llm_enabled():
+            return {kind: get_chain(kind) for kind in LLM_PROMPT_SPECS}
+        return self.chains
+
+    async def _call(self, chain, job: LLMJob, bucket: TokenBucket, stats: DispatchStats):
+        for attempt in range(self.max_retries + 1):
+            job.attempts = attempt + 1
+            await bucket.acquire()
+            started = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(
+                    chain.ainvoke({"prompt": job.prompt}), timeout=self.timeout_seconds
+                )
+                record_llm_call(job.kind, time.perf_counter() - started, response)
+                job.result = response.content
+                job.error = None
+                stats.completed += 1
+                return
+            except Exception as e:
+                record_llm_call(job.kind, time.perf_counter() - started, error=True)
+                job.error = str(e) or type(e).__name__
+                if attempt < self.max_retries:
+                    stats.retries += 1
+                    delay = self.backoff_seconds * (2 ** attempt)
+                    await asyncio.sleep(delay + random.uniform(0, delay / 2))
+        stats.failed += 1
+        job.result = f"{ERROR_PREFIX.get(job.kind, 'LLM Error')}: {job.error}"
+
+    async def arun(self, jobs: List[LLMJob]) -> DispatchStats:
+        stats = DispatchStats(submitted=len(jobs))
+        self.stats = stats
+        start = time.perf_counter()
+
+        # Jobs of the same kind and prompt (e.g. grouped summaries) share one call
+        unique: Dict[Tuple[str, str], LLMJob] = {}
+        duplicates = []
+        for job in jobs:
+            first = unique.setdefault((job.kind, job.prompt), job)
+            if first is not job:
+                duplicates.append((job, first))
+        stats.deduplicated = len(duplicates)
+        for kind, count in Counter(job.kind for job, _ in duplicates).items():
+            record_llm_calls_saved(kind, "grouped", count)
+
+        await self._dispatch(list(unique.values()), stats)
+        for job, first in duplicates:
+            job.result, job.error, job.attempts = first.result, first.error, first.attempts
+        stats.elapsed_seconds = time.perf_counter() - start
+        return stats
+
+    async def _dispatch(self, jobs: List[LLMJob], stats: DispatchStats):
+        chains = self._get_chains()
+        if not chains:
+            for job in jobs:
+                job.result = SIMULATED_RESPONSES.get(job.kind, SIMULATED_SUMMARY)
+            stats.completed = len(jobs)
+            return
+
+        pending = jobs
+        if self.cache is not None:
+            keys = [llm_cache_key(job.kind, job.prompt) for job in jobs]
+            cached = self.cache.get_many(keys)
+            pending, hit_kinds = [], Counter()
+            for job, key in zip(jobs, keys):
+                hit = cached.get(key)
+                if hit is None:
+                    pending.append(job)
+                else:
+                    job.result = hit
+                    stats.cache_hits += 1
+                    stats.completed += 1
+                    hit_kinds[job.kind] += 1
+            for kind, count in hit_kinds.items():
+                record_llm_calls_saved(kind, "cached", count)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in pending:
+            queue.put_nowait(job)
+        stats.max_queue_depth = queue.qsize()
+        bucket = self.rate_limiter or get_llm_registry().rate_limiter
+
+        async def worker():
+            while True:
+                try:
+                    job = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                stats.queue_depth_samples.append(queue.qsize())
+                chain = chains.get(job.kind)
+                if chain is None:
+                    job.error = f"no chain for '{job.kind}'"
+                    job.result = f"{ERROR_PREFIX.get(job.kind, 'LLM Error')}: no chain for '{job.kind}'"
+                    stats.failed += 1
+                    continue
+                await self._call(chain, job, bucket, stats)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.max_concurrency, len(pending)) or 1)))
+
+        if self.cache is not None:
+            model_id = llm_model_id()
+            self.cache.put_many([
+                (llm_cache_key(job.kind, job.prompt), llm_template_hash(job.kind), model_id, job.result)
+                for job in pending if job.error is None and job.result is not None
+            ])
+
+    def run(self, jobs: List[LLMJob]) -> DispatchStats:
+        """
+        Blocking entry point; safe to call from inside a running event loop.
+        Runs on the LLM registry's long-lived loop, so HTTP connections are
+        reused across runs.
+        """
+        return get_llm_registry().run(self.arun(jobs))
+
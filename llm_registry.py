@@ -0,0 +1,286 @@
+# llm_registry.py
+"""
+Process-wide chat model clients and prompt chains.
+
+Building a ChatGroq creates two Groq SDK clients, each with its own HTTP
+connection pool and TLS context, so building one per call paid that setup
+plus a fresh connection for every row. The registry builds every chat model
+once per (model, temperature) and every prompt chain once per (model,
+temperature, system prompt):
+
+- All synchronous calls share one keep-alive httpx.Client.
+- Async calls share one httpx.AsyncClient per event loop, because pooled
+  connections cannot move between loops.
+- Blocking callers run their coroutines on the registry's own long-lived
+  loop (`run`), so their connections stay warm across calls as well.
+
+The registry also holds the process's LLM rate limiter (`rate_limiter`):
+every LLMDispatcher run of the process, on whichever thread or event loop,
+draws from the same LLM_RATE_LIMIT_PER_SEC token bucket.
+
+LLM_PROVIDER selects the chat model: "groq", or "fake" for FakeChatModel.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, List, Optional
+
+import httpx
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.prompts import ChatPromptTemplate
+
+from config import (
+    GROQ_API_KEY,
+    LLM_PROVIDER,
+    LLM_MODEL_NAME,
+    LLM_FAKE_LATENCY_SECONDS,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_KEEPALIVE_SECONDS,
+    LLM_CALL_TIMEOUT_SECONDS,
+    LLM_RATE_LIMIT_PER_SEC,
+    LLM_RATE_LIMIT_BURST,
+)
+
+PROVIDERS = ("groq", "fake")
+
+
+class FakeChatModel(BaseChatModel):
+    """Local chat model: answers `response` after `latency` seconds, without any network call."""
+
+    response: str = ""
+    latency: float = 0.0
+    model_name: str = "fake"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _result(self) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._result()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result()
+
+
+class TokenBucket:
+    """
+    Token bucket: `rate` tokens per second, at most `capacity` banked. Callers
+    reserve their token under a thread lock and sleep until it is due, so one
+    bucket can pace coroutines of any number of threads and event loops.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self._lock = threading.Lock()
+        self.configure(rate, capacity)
+
+    def configure(self, rate: float, capacity: float):
+        with self._lock:
+            self.rate = rate
+            self.capacity = max(capacity, 1)
+            self._tokens = float(self.capacity)
+            self._updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Takes a token; returns the seconds until it is available."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+class LLMRegistry:
+    def __init__(self, provider: str = LLM_PROVIDER, model_name: str = LLM_MODEL_NAME,
+                 api_key: Optional[str] = GROQ_API_KEY, fake_latency: float = LLM_FAKE_LATENCY_SECONDS,
+                 max_connections: int = LLM_HTTP_MAX_CONNECTIONS,
+                 keepalive_seconds: float = LLM_HTTP_KEEPALIVE_SECONDS,
+                 rate_per_sec: float = LLM_RATE_LIMIT_PER_SEC, burst: int = LLM_RATE_LIMIT_BURST):
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown LLM_PROVIDER '{provider}' (expected one of {', '.join(PROVIDERS)})")
+        self.provider = provider
+        self.model_name = model_name
+        self.api_key = api_key
+        self.fake_latency = fake_latency
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                   keepalive_expiry=keepalive_seconds)
+        self.rate_limiter = TokenBucket(rate_per_sec, burst)
+        self.models_built = 0
+        self.chains_built = 0
+        self._lock = threading.RLock()
+        self._http_client: Optional[httpx.Client] = None
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._models: Dict[Hashable, BaseChatModel] = {}
+        self._chains: Dict[Hashable, Any] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        """False when no model can be called (Groq without an API key): callers use the simulated texts."""
+        return self.provider == "fake" or bool(self.api_key)
+
+    @property
+    def model_id(self) -> str:
+        """Provider-qualified model name for cache keys; Groq keeps the bare name of earlier entries."""
+        return self.model_name if self.provider == "groq" else f"{self.provider}:{self.model_name}"
+
+    def _sync_http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(limits=self.limits, timeout=LLM_CALL_TIMEOUT_SECONDS)
+        return self._http_client
+
+    def _async_http_client(self, loop: Optional[asyncio.AbstractEventLoop]) -> Optional[httpx.AsyncClient]:
+        if loop is None:
+            # Built outside any loop: the first async call lets the Groq SDK create its own client
+            return None
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(limits=self.limits, timeout=LLM_CALL_TIMEOUT_SECONDS)
+            self._async_clients[loop] = client
+        return client
+
+    def _forget_closed_loops(self):
+        # Clients, models and chains bound to a finished loop can never be used again
+        for loop in [l for l in self._async_clients if l.is_closed()]:
+            del self._async_clients[loop]
+        for cache in (self._models, self._chains):
+            for key in [k for k in cache if k[-1] is not None and k[-1].is_closed()]:
+                del cache[key]
+
+    def chat_model(self, temperature: float, model_name: Optional[str] = None, fake_response: str = "",
+                   loop: Optional[asyncio.AbstractEventLoop] = None) -> BaseChatModel:
+        model_name = model_name or self.model_name
+        key = (model_name, temperature, fake_response if self.provider == "fake" else None, loop)
+        with self._lock:
+            chat = self._models.get(key)
+            if chat is None:
+                if self.provider == "fake":
+                    chat = FakeChatModel(response=fake_response, latency=self.fake_latency, model_name=model_name)
+                else:
+                    from langchain_groq import ChatGroq
+                    chat = ChatGroq(temperature=temperature, groq_api_key=self.api_key, model_name=model_name,
+                                    http_client=self._sync_http_client(),
+                                    http_async_client=self._async_http_client(loop))
+                self._models[key] = chat
+                self.models_built += 1
+        return chat
+
+    def chain(self, system_prompt: str, temperature: float, model_name: Optional[str] = None,
+              fake_response: str = ""):
+        """
+        `system prompt | chat model` chain, built once per (model, temperature,
+        system prompt) and per event loop the caller runs in.
+        """
+        loop = _running_loop() if self.provider == "groq" else None
+        key = (model_name or self.model_name, temperature, system_prompt, fake_response, loop)
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                self._forget_closed_loops()
+                template = ChatPromptTemplate.from_messages([("system", system_prompt), ("user", "{prompt}")])
+                chain = template | self.chat_model(temperature, model_name, fake_response, loop)
+                self._chains[key] = chain
+                self.chains_built += 1
+        return chain
+
+    def set_rate_limit(self, rate_per_sec: float, burst: int):
+        """Re-paces the shared rate limiter (batch workers take their share of the configured rate)."""
+        if (rate_per_sec, max(burst, 1)) != (self.rate_limiter.rate, self.rate_limiter.capacity):
+            self.rate_limiter.configure(rate_per_sec, burst)
+
+    def run(self, coro):
+        """Runs `coro` on the registry's long-lived event loop and blocks until it finishes."""
+        loop = self._background_loop()
+        if _running_loop() is loop:
+            coro.close()
+            raise RuntimeError("LLMRegistry.run cannot block its own event loop")
+        # The caller's contextvars (request timings) follow the coroutine
+        future: Future = asyncio.run_coroutine_threadsafe(coro, loop)
+        return future.result()
+
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True)
+                thread.start()
+                self._loop, self._loop_thread = loop, thread
+            return self._loop
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "model": self.model_name,
+                "models_built": self.models_built,
+                "chains_built": self.chains_built,
+                "chains_cached": len(self._chains),
+                "event_loops": len(self._async_clients),
+                "rate_limit_per_sec": self.rate_limiter.rate,
+            }
+
+    def close(self):
+        """Closes the HTTP connection pools and stops the background loop."""
+        with self._lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+            async_clients = list(self._async_clients.items())
+            self._async_clients.clear()
+            self._models.clear()
+            self._chains.clear()
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+        for client_loop, client in async_clients:
+            if client_loop is loop and loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=10)
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=10)
+            loop.close()
+
+
+_registry: Optional[LLMRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_llm_registry() -> LLMRegistry:
+    """Process-wide registry, configured from config.py."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = LLMRegistry()
+    return _registry
+
+
+def close_llm_registry():
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        registry.close()
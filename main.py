@@ -1,57 +1,163 @@
-from fastapi import FastAPI, Query, HTTPException, APIRouter, BackgroundTasks
+from fastapi import FastAPI, Query, HTTPException, APIRouter, Request, Body
+from fastapi.responses import StreamingResponse, PlainTextResponse, Response
+import asyncio
+import json
+import time
 import pandas as pd
 import os
-from typing import List
+from typing import Any, Dict, List, Optional, Union
 import mysql.connector
-from config import MYSQL_CONFIG, MYSQL_TABLE_NAME
-
-from db import load_mysql_data, update_mysql_data
-from analysis import run_branch_analysis
+from config import (
+    MYSQL_TABLE_NAME, MYSQL_FEEDBACK_VERSION_COLUMN, EMAIL_SMTP_HOST, EMAIL_SMTP_PORT, EMAIL_SMTP_SSL, TIMING_HEADER_ENABLED, ROLLUP_QUERY_MAX_CELLS
+)
+
+from db import update_mysql_data, get_table_columns
+from db_pool import init_pool, get_pool
+from analysis import iter_branch_analysis, build_response_frame
+from analysis_cache import get_analysis_cache
+from batch import load_partitions, iter_partition_results, shutdown_executor
+from async_analysis import (
+    aload_mysql_data, aupdate_mysql_data, arun_branch_analysis, run_blocking, response_json,
+    cpu_executor, warm_worker, shutdown_io_executor
+)
+from jobs import JobManager
+from ingestion import EventIngester
 from graph import build_graph
+from llm import purge_stale_llm_cache
+from llm_registry import close_llm_registry
+from llm_cache import get_llm_cache
+from snapshot_cache import get_snapshot_cache
+from rollup_cube import get_rollup_cube, refresh_rollup, DIMENSIONS as ROLLUP_DIMENSIONS
+from timeseries_detection import load_history_baselines
 from pydantic import BaseModel
-import smtplib
-from email.message import EmailMessage
+from email_delivery import DeliveryWorker, SMTPTransport
+from feedback_sanitizer import stored_feedback_parts
+from instrumentation import (
+    render_metrics, start_request_timing, finish_request_timing, server_timing_header, timed
+)
 
 app = FastAPI(title="Waste Pattern Detection API")
 graph_app = build_graph()
+job_manager: JobManager = None
+event_ingester: EventIngester = None
+
+
+@app.middleware("http")
+async def timing_header(request: Request, call_next):
+    # Stage/node timings of this request as a Server-Timing header (see instrumentation.py)
+    if not (TIMING_HEADER_ENABLED or request.headers.get("x-debug-timing") == "1"):
+        return await call_next(request)
+    token = start_request_timing()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+        timings = finish_request_timing(token)
+    except Exception:
+        finish_request_timing(token)
+        raise
+    timings["total"] = [time.perf_counter() - start, 1]
+    response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+
+@app.on_event("startup")
+def start_event_ingester():
+    global event_ingester
+    event_ingester = EventIngester(graph_app)
+    event_ingester.start()
+
+
+@app.on_event("shutdown")
+def stop_event_ingester():
+    # Registered first, as shutdown hooks run in order: accepted events and the
+    # queued critical-event follow-ups still need the DB pool and the LLM clients
+    event_ingester.stop(timeout=30)
+
+
+@app.on_event("shutdown")
+def stop_job_manager():
+    # Also before the DB pool and the LLM clients close: running jobs finish,
+    # queued ones stay in the job store for the next start
+    job_manager.shutdown()
+
+
+@app.on_event("startup")
+def create_db_pool():
+    # One MySQL connection pool shared by every request (size/timeouts in config.py)
+    init_pool()
+
+
+@app.on_event("shutdown")
+def close_db_pool():
+    get_pool().close()
+
+
+@app.on_event("startup")
+def start_job_manager():
+    # Re-queues jobs a previous process left unfinished
+    global job_manager
+    job_manager = JobManager(graph_app)
+    job_manager.start()
+
+
+@app.on_event("startup")
+def warm_analysis_workers():
+    # Spawns the worker processes and compiles the graph in each before the first /analyze
+    executor = cpu_executor()
+    for _ in range(getattr(executor, "_max_workers", 1)):
+        executor.submit(warm_worker)
+
+
+@app.on_event("shutdown")
+def close_batch_workers():
+    shutdown_executor()
+    shutdown_io_executor()
 
-# ====================== /analyze Endpoint (unchanged) ======================
+
+@app.on_event("shutdown")
+def close_llm_clients():
+    # Keep-alive connections of the shared chat model clients (llm_registry.py)
+    close_llm_registry()
+
+
+@app.on_event("startup")
+def purge_llm_cache():
+    # Cached LLM responses from older prompt templates are never valid again
+    purge_stale_llm_cache()
+
+# ====================== /analyze Endpoint ======================
 @app.get("/analyze")
-def analyze(
+async def analyze(
     branch: str = Query(..., description="Branch Name (e.g., LA - Downtown)"),
     year: int = Query(..., description="Year (e.g., 2025)"),
-    month: str = Query(..., description="Month Name (e.g., February)")
+    month: str = Query(..., description="Month Name (e.g., February)"),
+    stream: bool = Query(False, description="Stream records as NDJSON while the analysis runs")
 ):
+    # Database work runs on the I/O threads, detection in worker processes and
+    # the LLM calls on the event loop (see async_analysis.py)
     try:
-        df_data = load_mysql_data(branch_name=branch, year=year, month_name=month)
+        df_data = await aload_mysql_data(branch_name=branch, year=year, month_name=month)
         if df_data.empty:
             raise ValueError("No data found for the specified branch, year, and month.")
 
-        final_df = run_branch_analysis(df=df_data, branch_name=branch, app=graph_app)
-        if final_df.empty or 'ID' not in final_df.columns:
-            raise ValueError("Analysis completed but no data processed or 'ID' column missing.")
+        # Series history before this month, for the "timeseries" detection mode
+        ts_baselines = await run_blocking(load_history_baselines, branch, year, month)
 
-        update_mysql_data(final_df)
+        if stream:
+            return StreamingResponse(_stream_analysis(df_data, branch, ts_baselines),
+                                     media_type="application/x-ndjson")
 
-        output_df = final_df.copy()
-        if 'Date' in output_df.columns:
-            output_df['Date'] = pd.to_datetime(output_df['Date']).dt.strftime('%Y-%m-%d')
-            output_df['Time'] = pd.to_datetime(output_df['Date']).dt.strftime('%H:%M')
-            output_df['Weekday'] = pd.to_datetime(output_df['Date']).dt.strftime('%A')
-        else:
-            output_df['Date'] = 'N/A'
-            output_df['Time'] = 'N/A'
-            output_df['Weekday'] = 'N/A'
+        final_df = await arun_branch_analysis(df=df_data, branch_name=branch, result_cache=get_analysis_cache(),
+                                              ts_baselines=ts_baselines)
+        if final_df.empty or 'ID' not in final_df.columns:
+            raise ValueError("Analysis completed but no data processed or 'ID' column missing.")
 
-        columns_to_select = [
-            'ID', 'Date', 'Time', 'Weekday', 'Recipe', 'Ingredient',
-            'Kitchen Station', 'Branch', 'Branch Manager', 'Chef',
-            'Status', 'Chef_Feedback_Summary'
-        ]
-        output_df = output_df.reindex(columns=columns_to_select, fill_value='N/A')
-        output_df = output_df.rename(columns={'Chef_Feedback_Summary': 'Chef_Feedback'})
+        await aupdate_mysql_data(final_df, df_loaded=df_data)
+        await run_blocking(refresh_rollup, final_df)
 
-        return output_df.to_dict(orient='records')
+        with timed("response", rows=len(final_df)):
+            body = await run_blocking(response_json, final_df)
+        return Response(content=body, media_type="application/json")
 
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -59,6 +165,159 @@ def analyze(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+def _stream_analysis(df_data: pd.DataFrame, branch: str, ts_baselines=None):
+    # One NDJSON line per record; each batch is written back and sent as soon as it is analyzed
+    try:
+        for rows, analyzed in iter_branch_analysis(df_data, branch, graph_app, result_cache=get_analysis_cache(),
+                                                   ts_baselines=ts_baselines):
+            update_mysql_data(analyzed, df_loaded=rows)
+            refresh_rollup(analyzed)
+            yield build_response_frame(analyzed).to_json(orient='records', lines=True, force_ascii=False) + "\n"
+    except Exception as e:
+        # Headers are already sent; report the failure in-band and stop
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
+# ====================== /analyze/batch Endpoint ======================
+class BatchMonth(BaseModel):
+    year: int
+    month: str
+
+
+class BatchAnalyzeRequest(BaseModel):
+    branches: List[str]
+    months: List[BatchMonth]
+    write_back: bool = True
+
+
+@app.post("/analyze/batch")
+def analyze_batch(request: BatchAnalyzeRequest):
+    """
+    Streams NDJSON: one "loaded" line, then one line per branch-month as its
+    worker finishes (records in the /analyze shape, timings, progress).
+    """
+    months = [(m.year, m.month) for m in request.months]
+    try:
+        partitions, info = load_partitions(request.branches, months)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    def stream():
+        yield json.dumps({"event": "loaded", **info}, default=str) + "\n"
+        for item in iter_partition_results(partitions, write_back=request.write_back):
+            yield json.dumps(item, default=str) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# ====================== Rollup Analytics ======================
+@app.get("/rollups")
+def rollups(
+    group_by: List[str] = Query(["branch"], description="Dimensions to group by (repeat or comma-separate): "
+                                                        + ", ".join(ROLLUP_DIMENSIONS) + "; empty for one total"),
+    branch: Optional[List[str]] = Query(None),
+    month: Optional[List[str]] = Query(None, description="Months as YYYY-MM"),
+    station: Optional[List[str]] = Query(None),
+    shift: Optional[List[str]] = Query(None),
+    supplier: Optional[List[str]] = Query(None),
+    ingredient: Optional[List[str]] = Query(None),
+    month_from: Optional[str] = Query(None, description="First month (YYYY-MM), inclusive"),
+    month_to: Optional[str] = Query(None, description="Last month (YYYY-MM), inclusive"),
+    order_by: Optional[str] = Query(None, description="Measure, ratio or grouped dimension to sort by"),
+    ascending: bool = Query(False),
+    limit: int = Query(1000, ge=1, le=ROLLUP_QUERY_MAX_CELLS)
+):
+    """
+    Slice/dice over the rollup cube of analyzed rows (rollup_cube.py): sums
+    and ratios per group, answered from the cube without reading waste_logs.
+    """
+    cube = get_rollup_cube()
+    if cube is None:
+        raise HTTPException(status_code=404, detail="Rollups are disabled (ROLLUP_ENABLED=false).")
+    dims = [d.strip() for value in group_by for d in value.split(",") if d.strip()]
+    filters = {"branch": branch, "month": month, "station": station, "shift": shift,
+               "supplier": supplier, "ingredient": ingredient}
+    started = time.perf_counter()
+    try:
+        groups = cube.query(dims, {k: v for k, v in filters.items() if v}, month_from=month_from,
+                            month_to=month_to, order_by=order_by, descending=not ascending, limit=limit)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return {"group_by": dims, "count": len(groups), "groups": groups,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
+@app.get("/rollups/stats")
+def rollup_stats():
+    cube = get_rollup_cube()
+    if cube is None:
+        return {"enabled": False}
+    return {"enabled": True, **cube.stats()}
+
+
+# ====================== Event Ingestion ======================
+@app.post("/ingest")
+async def ingest_events(events: Union[Dict[str, Any], List[Dict[str, Any]]] = Body(...)):
+    """
+    Stores one waste-log event (a JSON object) or a list of them, scored on
+    arrival with the /analyze detection rules (see ingestion.py). Events whose
+    ID is already stored are listed under "duplicates" and not written again.
+    """
+    try:
+        future = event_ingester.submit(events if isinstance(events, list) else [events])
+        return await asyncio.wrap_future(future)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+
+@app.get("/ingest/stats")
+def ingest_stats():
+    return event_ingester.stats()
+
+
+# ====================== Analysis Jobs ======================
+@app.post("/jobs/analyze", status_code=202)
+def submit_analysis_job(
+    branch: str = Query(..., description="Branch Name (e.g., LA - Downtown)"),
+    year: int = Query(..., description="Year (e.g., 2025)"),
+    month: str = Query(..., description="Month Name (e.g., February)")
+):
+    try:
+        job, created = job_manager.submit(branch, year, month)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+    return {"job_id": job["id"], "status": job["status"], "deduplicated": not created}
+
+
+@app.get("/jobs/{job_id}")
+def get_analysis_job(job_id: str):
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/results")
+def get_analysis_job_results(
+    job_id: str,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=1000)
+):
+    job = job_manager.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    records = job_manager.store.results(job_id, offset=(page - 1) * page_size, limit=page_size)
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "page": page,
+        "page_size": page_size,
+        "rows_done": job["rows_done"],
+        "rows_total": job["rows_total"],
+        "records": records,
+    }
+
+
 # ====================== Email Router ======================
 router = APIRouter()
 
@@ -81,25 +340,28 @@ class SendFeedbackResponse(BaseModel):
     sent: List[int]
     failed: List[int]
     errors: dict = {}
+    batch_id: Optional[str] = None
 
 
-def send_email(to_email: str, subject: str, body: str):
-    if not GMAIL_USER or not GMAIL_PASS:
-        raise ValueError("Gmail credentials missing in .env")
+delivery_worker: DeliveryWorker = None
+
 
-    msg = EmailMessage()
-    msg["From"] = GMAIL_USER
-    msg["To"] = to_email
-    msg["Subject"] = subject
-    msg.set_content(body)
+@app.on_event("startup")
+def start_delivery_worker():
+    # Sender threads keep their authenticated SMTP sessions across requests
+    global delivery_worker
+    delivery_worker = DeliveryWorker(SMTPTransport(EMAIL_SMTP_HOST, EMAIL_SMTP_PORT, GMAIL_USER, GMAIL_PASS,
+                                                   use_ssl=EMAIL_SMTP_SSL))
+    delivery_worker.start()
 
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as server:
-        server.login(GMAIL_USER, GMAIL_PASS)
-        server.send_message(msg)
+
+@app.on_event("shutdown")
+def stop_delivery_worker():
+    delivery_worker.stop(timeout=30)
 
 
 @router.post("/send-chef-feedback", response_model=SendFeedbackResponse)
-async def send_chef_feedback(request: FeedbackRequest, background_tasks: BackgroundTasks):
+async def send_chef_feedback(request: FeedbackRequest):
     if not GMAIL_USER or not GMAIL_PASS:
         raise HTTPException(status_code=500, detail="Email service not configured. Check .env")
 
@@ -107,30 +369,31 @@ async def send_chef_feedback(request: FeedbackRequest, background_tasks: Backgro
     if not ids:
         raise HTTPException(status_code=400, detail="No records provided")
 
-    conn = None
     try:
-        conn = mysql.connector.connect(**MYSQL_CONFIG)
-        cursor = conn.cursor(dictionary=True)
-
-        placeholders = ",".join(["%s"] * len(ids))
-        query = f"""
-            SELECT ID, Chef, Branch, `Branch Manager`, Chef_Feedback
-            FROM {MYSQL_TABLE_NAME}
-            WHERE ID IN ({placeholders})
-              AND Status = 'Approved by Manager'
-              AND Chef_Feedback IS NOT NULL 
-              AND TRIM(Chef_Feedback) != ''
-              AND TRIM(Chef_Feedback) != 'N/A'
-        """
-        cursor.execute(query, ids)
-        rows = cursor.fetchall()
+        with get_pool().connection() as conn:
+            # Rows without the column are all unsanitized (backfill_feedback.py adds it)
+            version = (f"`{MYSQL_FEEDBACK_VERSION_COLUMN}`" if MYSQL_FEEDBACK_VERSION_COLUMN in get_table_columns(conn)
+                       else "NULL")
+            cursor = conn.cursor(dictionary=True)
+
+            placeholders = ",".join(["%s"] * len(ids))
+            query = f"""
+                SELECT ID, Chef, Branch, `Branch Manager`, Ingredient, Chef_Feedback,
+                       {version} AS Feedback_Version
+                FROM {MYSQL_TABLE_NAME}
+                WHERE ID IN ({placeholders})
+                  AND Status = 'Approved by Manager'
+                  AND Chef_Feedback IS NOT NULL 
+                  AND TRIM(Chef_Feedback) != ''
+                  AND TRIM(Chef_Feedback) != 'N/A'
+            """
+            cursor.execute(query, ids)
+            rows = cursor.fetchall()
+            cursor.close()
         df = pd.DataFrame(rows)
 
     except mysql.connector.Error as err:
         raise HTTPException(status_code=500, detail=f"Database error: {err}")
-    finally:
-        if conn and conn.is_connected():
-            conn.close()
 
     if df.empty:
         raise HTTPException(status_code=404, detail="No approved records with feedback found")
@@ -140,77 +403,20 @@ async def send_chef_feedback(request: FeedbackRequest, background_tasks: Backgro
     sent = []
     failed = []
     errors = {}
+    messages = []
 
     for _, row in df.iterrows():
         record_id = int(row["ID"])
         chef_name = row["Chef"] or "Chef"
         branch = row["Branch"]
         manager_name = row["Branch Manager"] or "Management"
-        raw_feedback = row["Chef_Feedback"]
-
-        # Extract subject from first line if it starts with "Subject:"
-        lines = raw_feedback.strip().split('\n')
-        subject_line = lines[0].strip()
-        if subject_line.lower().startswith("subject:"):
-            email_subject = subject_line[8:].strip()  # Remove "Subject:" part
-            body_lines = lines[1:]  # Rest is body
-        else:
-            email_subject = f"Waste Feedback Required – {row.get('Ingredient', 'Item')} ({branch})"
-            body_lines = lines
-
-        # Clean body: remove empty lines at start + fix common placeholders
-                # Clean body: remove empty lines at start
-        body_text = '\n'.join(line.strip() for line in body_lines if line.strip())
-
-        # Replace placeholders
-        body_text = body_text.replace("[Station Chef's Name]", (chef_name or "Chef").split()[0])
-        body_text = body_text.replace("[Your Name]", manager_name)
-
-        # ---- EXTRA CLEANUP: remove duplicate greetings and signatures ----
-        lines = body_text.splitlines()
-
-        # 1) Remove inner greeting lines like "Hello Chef David," or "Hi Chef,"
-        cleaned_lines = []
-        for idx, line in enumerate(lines):
-            stripped = line.strip()
-            lower = stripped.lower()
-
-            is_greeting = (
-                lower.startswith("hi ") or lower == "hi" or
-                lower.startswith("hello ") or lower == "hello" or
-                lower.startswith("dear ") or lower == "dear"
-            )
-
-            # Only treat very early lines as greetings (first 2–3 lines)
-            if idx <= 2 and is_greeting:
-                # Skip this greeting line; we already add "Hello {chef_name}," outside
-                continue
-
-            cleaned_lines.append(line)
-
-        lines = cleaned_lines
-
-        # 2) Remove any signature block ("Best,", "Regards,", etc.) and everything after
-        closers = (
-            "best,",
-            "best regards,",
-            "regards,",
-            "thanks,",
-            "thank you,",
-        )
-
-        cut_index = None
-        for i, line in enumerate(lines):
-            if line.strip().lower() in closers:
-                cut_index = i
-                break
-
-        if cut_index is not None:
-            lines = lines[:cut_index]
-
-        # Rebuild final cleaned body text (middle content only)
-        body_text = "\n".join(l for l in lines if l.strip())
-        # ---- END EXTRA CLEANUP ----
+
+        if pd.isna(row["Feedback_Version"]):
+            failed.append(record_id)
+            errors[record_id] = "Feedback stored before sanitizing; run backfill_feedback.py"
+            continue
+        # Sanitized when it was generated: sent as stored
+        email_subject, body_text = stored_feedback_parts(row["Chef_Feedback"], branch, row["Ingredient"])
 
         recipient_email = email_map.get(record_id)
         if not recipient_email or "@" not in recipient_email:
@@ -228,17 +434,48 @@ Thank you,
 Waste Intelligence System
         """.strip()
 
-        try:
-            background_tasks.add_task(send_email, recipient_email, email_subject, final_body)
-            sent.append(record_id)
-        except Exception as e:
-            failed.append(record_id)
-            errors[record_id] = str(e)
+        messages.append({"record_id": record_id, "sender": GMAIL_USER, "to": recipient_email,
+                         "subject": email_subject, "body": final_body})
+        sent.append(record_id)
 
-    return SendFeedbackResponse(total=len(ids), sent=sent, failed=failed, errors=errors)
+    # Queued for the delivery worker; per-record outcomes via /send-chef-feedback/deliveries
+    batch_id = delivery_worker.enqueue(messages) if messages else None
+    return SendFeedbackResponse(total=len(ids), sent=sent, failed=failed, errors=errors, batch_id=batch_id)
+
+
+@router.get("/send-chef-feedback/deliveries")
+def chef_feedback_deliveries(
+    batch_id: Optional[str] = Query(None, description="Batch ID returned by /send-chef-feedback"),
+    record_id: Optional[List[int]] = Query(None, description="Waste log record ID(s)"),
+    status: Optional[str] = Query(None, description="queued, sent or failed"),
+    limit: int = Query(500, ge=1, le=5000)
+):
+    deliveries = delivery_worker.log.query(batch_id=batch_id, record_ids=record_id, status=status, limit=limit)
+    summary = delivery_worker.log.counts(batch_id) if batch_id else None
+    return {"summary": summary, "deliveries": deliveries}
 
 app.include_router(router)
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of stage/node/LLM histograms and counters."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/llm-cache/stats")
+def llm_cache_stats():
+    cache = get_llm_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@app.get("/snapshot-cache/stats")
+def snapshot_cache_stats():
+    cache = get_snapshot_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
 @app.get("/")
 def root():
     return {"message": "Waste Pattern Detection API is running!"}
\ No newline at end of file
@@ -0,0 +1,354 @@
+# metrics_store.py
+"""
+Incremental store of the running aggregates behind calculate_branch_metrics.
+
+Each waste log contributes counts and sums to (branch, month, dimension, key)
+rows once; branch metrics for any window of months are then assembled from
+those sums without rescanning raw rows. The sales median comes from a
+mergeable relative-error quantile sketch, so it is approximate.
+
+    python metrics_store.py sync     # pull waste_logs rows not ingested yet
+"""
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from config import (
+    HOT_TEMP,
+    BRANCH_COLUMN,
+    MYSQL_TABLE_NAME,
+    METRICS_STORE_PATH,
+    METRICS_SKETCH_RELATIVE_ACCURACY,
+)
+from utils import safe_rate_series
+from supplier_scorecard import SUPPLIER_COLUMN, SUM_COLUMNS, score_suppliers, scorecard_metrics
+
+# Dimensions kept per branch-month. "branch", "nonpeak" and "moderate_temp"
+# have a single empty key; the others are keyed by station/shift/supplier.
+DIMENSIONS = {
+    "station": "Kitchen Station",
+    "shift": "Shift",
+    "supplier": "Supplier Name",
+}
+
+
+class QuantileSketch:
+    """
+    DDSketch-style log-bucket sketch: quantiles within `relative_accuracy`
+    of the true value, mergeable by adding bucket counts. Non-positive
+    values share one zero bucket.
+    """
+
+    def __init__(self, relative_accuracy: float = METRICS_SKETCH_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = defaultdict(int)
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1):
+        if value is None or pd.isna(value):
+            return
+        if value <= 0:
+            self.zero_count += count
+        else:
+            self.buckets[math.ceil(math.log(value) / self._log_gamma)] += count
+        self.count += count
+
+    def merge(self, other: "QuantileSketch"):
+        for idx, n in other.buckets.items():
+            self.buckets[idx] += n
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def _bucket_value(self, idx: int) -> float:
+        return 2 * self.gamma ** idx / (self.gamma + 1)
+
+    def _value_at_rank(self, rank: int) -> float:
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if rank < seen:
+                return self._bucket_value(idx)
+        return self._bucket_value(max(self.buckets))
+
+    def quantile(self, q: float) -> float:
+        """Interpolates between neighbouring ranks, like pandas' default quantile."""
+        if self.count == 0:
+            return float("nan")
+        rank = q * (self.count - 1)
+        lower, upper = math.floor(rank), math.ceil(rank)
+        low_value = self._value_at_rank(lower)
+        if upper == lower:
+            return low_value
+        return low_value + (self._value_at_rank(upper) - low_value) * (rank - lower)
+
+    def to_json(self) -> str:
+        return json.dumps({"a": self.relative_accuracy, "z": self.zero_count,
+                           "b": {str(k): v for k, v in self.buckets.items()}})
+
+    @classmethod
+    def from_json(cls, payload: str) -> "QuantileSketch":
+        data = json.loads(payload)
+        sketch = cls(data["a"])
+        sketch.zero_count = data["z"]
+        for k, v in data["b"].items():
+            sketch.buckets[int(k)] = v
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+
+class MetricsStore:
+    def __init__(self, path: str = METRICS_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            CREATE TABLE IF NOT EXISTS metric_aggregates (
+                branch TEXT NOT NULL,
+                month TEXT NOT NULL,
+                dim TEXT NOT NULL,
+                key TEXT NOT NULL,
+                n_rate INTEGER NOT NULL DEFAULT 0,
+                rate_sum REAL NOT NULL DEFAULT 0,
+                n_rows INTEGER NOT NULL DEFAULT 0,
+                expiry_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (branch, month, dim, key)
+            );
+            CREATE TABLE IF NOT EXISTS sales_sketches (
+                branch TEXT NOT NULL,
+                month TEXT NOT NULL,
+                sketch TEXT NOT NULL,
+                PRIMARY KEY (branch, month)
+            );
+            CREATE TABLE IF NOT EXISTS ingested_ids (id INTEGER PRIMARY KEY);
+        """)
+        self._conn.commit()
+
+    # --- ingestion -------------------------------------------------------
+
+    def _new_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        if "ID" not in df.columns or df.empty:
+            return df
+        ids = [int(i) for i in df["ID"].dropna().unique()]
+        seen = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT id FROM ingested_ids WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            seen.update(r[0] for r in rows)
+        return df[~df["ID"].isin(seen)].drop_duplicates("ID")
+
+    def ingest(self, df: pd.DataFrame) -> int:
+        """Adds the contribution of rows not ingested before; returns how many were new."""
+        with self._lock:
+            df = self._new_rows(df)
+            if df.empty:
+                return 0
+            # Remember every new ID, even rows skipped below, so sync_from_mysql's watermark advances
+            if "ID" in df.columns:
+                self._conn.executemany("INSERT OR IGNORE INTO ingested_ids (id) VALUES (?)",
+                                       [(int(i),) for i in df["ID"]])
+            date = pd.to_datetime(df["Date"], errors="coerce")
+            df, date = df[date.notna()], date[date.notna()]
+            if df.empty:
+                self._conn.commit()
+                return 0
+
+            rate = safe_rate_series(df["Wastage Qty"], df["Planned Qty"])
+            planned = pd.to_numeric(df["Planned Qty"], errors="coerce")
+            has_rate = planned.notna() & (planned > 0)
+            expiry = pd.Series(False, index=df.index)
+            if "Expiry Date" in df.columns:
+                expiry = date.dt.normalize() > pd.to_datetime(df["Expiry Date"], errors="coerce").dt.normalize()
+            frame = pd.DataFrame({
+                "branch": df[BRANCH_COLUMN].astype(str),
+                "month": date.dt.strftime("%Y-%m"),
+                "n_rate": has_rate.astype(int),
+                "rate_sum": rate.where(has_rate, 0.0),
+                "n_rows": 1,
+                "expiry_count": expiry.astype(int),
+            }, index=df.index)
+
+            parts = [frame.assign(dim="branch", key="")]
+            if "Peak Hour Flag" in df.columns:
+                nonpeak = ~df["Peak Hour Flag"].astype(bool)
+                parts.append(frame[nonpeak].assign(dim="nonpeak", key=""))
+            if "Temperature (°C)" in df.columns:
+                temp = pd.to_numeric(df["Temperature (°C)"], errors="coerce")
+                parts.append(frame[temp.notna() & (temp <= HOT_TEMP)].assign(dim="moderate_temp", key=""))
+            for dim, col in DIMENSIONS.items():
+                if col in df.columns:
+                    keys = df[col].astype(object)
+                    mask = keys.notna()
+                    parts.append(frame[mask].assign(dim=dim, key=keys[mask].astype(str)))
+
+            agg = (pd.concat(parts)
+                   .groupby(["branch", "month", "dim", "key"], as_index=False)[["n_rate", "rate_sum", "n_rows", "expiry_count"]]
+                   .sum())
+            self._conn.executemany(
+                """
+                INSERT INTO metric_aggregates (branch, month, dim, key, n_rate, rate_sum, n_rows, expiry_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (branch, month, dim, key) DO UPDATE SET
+                    n_rate = n_rate + excluded.n_rate,
+                    rate_sum = rate_sum + excluded.rate_sum,
+                    n_rows = n_rows + excluded.n_rows,
+                    expiry_count = expiry_count + excluded.expiry_count
+                """,
+                [(b, m, d, k, int(nr), float(rs), int(n), int(e))
+                 for b, m, d, k, nr, rs, n, e in agg.itertuples(index=False, name=None)],
+            )
+
+            if "Sales Qty" in df.columns:
+                sales = pd.to_numeric(df["Sales Qty"], errors="coerce")
+                for (branch, month), values in sales.groupby([frame["branch"], frame["month"]]):
+                    sketch = self._load_sketch(branch, month)
+                    for value, n in values.dropna().value_counts().items():
+                        sketch.add(float(value), int(n))
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO sales_sketches (branch, month, sketch) VALUES (?, ?, ?)",
+                        (branch, month, sketch.to_json()),
+                    )
+
+            self._conn.commit()
+            return len(df)
+
+    def _load_sketch(self, branch: str, month: str) -> QuantileSketch:
+        row = self._conn.execute(
+            "SELECT sketch FROM sales_sketches WHERE branch = ? AND month = ?", (branch, month)
+        ).fetchone()
+        return QuantileSketch.from_json(row[0]) if row else QuantileSketch()
+
+    def max_ingested_id(self) -> int:
+        row = self._conn.execute("SELECT MAX(id) FROM ingested_ids").fetchone()
+        return int(row[0]) if row and row[0] is not None else 0
+
+    # --- assembly --------------------------------------------------------
+
+    def _window_sums(self, branch: str, start_month: str, end_month: str,
+                     dims: Optional[Tuple[str, ...]] = None) -> Dict[str, Dict[str, tuple]]:
+        sql = """
+            SELECT dim, key, SUM(n_rate), SUM(rate_sum), SUM(n_rows), SUM(expiry_count)
+            FROM metric_aggregates
+            WHERE branch = ? AND month >= ? AND month <= ?
+        """
+        params = [branch, start_month, end_month]
+        if dims:
+            sql += f" AND dim IN ({','.join('?' * len(dims))})"
+            params.extend(dims)
+        with self._lock:
+            rows = self._conn.execute(sql + " GROUP BY dim, key", params).fetchall()
+        by_dim: Dict[str, Dict[str, tuple]] = defaultdict(dict)
+        for dim, key, n_rate, rate_sum, n_rows, expiry_count in rows:
+            by_dim[dim][key] = (n_rate, rate_sum, n_rows, expiry_count)
+        return by_dim
+
+    @staticmethod
+    def _mean(entry) -> float:
+        return entry[1] / entry[0] if entry and entry[0] else 0.0
+
+    @classmethod
+    def _scorecard(cls, by_dim: Dict[str, Dict[str, tuple]]) -> pd.DataFrame:
+        # Stored as (n_rate, rate_sum, n_rows, expiry_count); keys come back sorted by GROUP BY
+        entries = by_dim.get("supplier", {})
+        sums = pd.DataFrame(
+            [(n_rows, n_rate, rate_sum, expiry_count) for n_rate, rate_sum, n_rows, expiry_count in entries.values()],
+            index=pd.Index(list(entries), name=SUPPLIER_COLUMN), columns=SUM_COLUMNS,
+        )
+        return score_suppliers(sums, cls._mean(by_dim.get("branch", {}).get("")))
+
+    def supplier_scorecard(self, branch: str, start_month: str, end_month: Optional[str] = None) -> pd.DataFrame:
+        """supplier_scorecard.supplier_scorecard table of `branch` over the inclusive 'YYYY-MM' window."""
+        return self._scorecard(self._window_sums(branch, start_month, end_month or start_month,
+                                                 dims=("branch", "supplier")))
+
+    def branch_metrics(self, branch: str, start_month: str, end_month: Optional[str] = None) -> Dict[str, Any]:
+        """
+        calculate_branch_metrics-shaped dict for `branch` over the inclusive
+        'YYYY-MM' window [start_month, end_month], from stored sums only.
+        """
+        end_month = end_month or start_month
+        by_dim = self._window_sums(branch, start_month, end_month)
+        with self._lock:
+            sketches = self._conn.execute(
+                "SELECT sketch FROM sales_sketches WHERE branch = ? AND month >= ? AND month <= ?",
+                (branch, start_month, end_month),
+            ).fetchall()
+
+        def rate_map(dim: str) -> Dict[str, float]:
+            return {k: self._mean(v) for k, v in by_dim.get(dim, {}).items() if v[0] > 0}
+
+        sales = QuantileSketch()
+        for (payload,) in sketches:
+            sales.merge(QuantileSketch.from_json(payload))
+
+        metrics = {
+            "branch_avg": self._mean(by_dim.get("branch", {}).get("")),
+            "station_avg_map": rate_map("station"),
+            "shift_avg_map": rate_map("shift"),
+            "nonpeak_rate": self._mean(by_dim.get("nonpeak", {}).get("")),
+            "moderate_temp_rate": self._mean(by_dim.get("moderate_temp", {}).get("")),
+            "sales_med": sales.quantile(0.5),
+        }
+        metrics.update(scorecard_metrics(self._scorecard(by_dim)))
+        return metrics
+
+    def close(self):
+        self._conn.close()
+
+
+_store: Optional[MetricsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_metrics_store() -> MetricsStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = MetricsStore()
+    return _store
+
+
+def sync_from_mysql(store: Optional[MetricsStore] = None, chunk_size: int = 50_000) -> int:
+    """Ingests waste_logs rows with an ID above the store's watermark, in ID order."""
+    from db import LOAD_SCHEMA, available_typed_date_column, get_table_columns, build_select_list
+    from db_pool import get_pool
+
+    store = store or get_metrics_store()
+    total = 0
+    with get_pool().connection() as conn:
+        table_columns = get_table_columns(conn)
+        columns = build_select_list([c for c in LOAD_SCHEMA if c in table_columns],
+                                    available_typed_date_column(table_columns))
+        while True:
+            df = pd.read_sql(
+                f"SELECT {columns} FROM {MYSQL_TABLE_NAME} WHERE ID > %s ORDER BY ID LIMIT %s",
+                conn, params=(store.max_ingested_id(), chunk_size),
+            )
+            if df.empty:
+                break
+            store.ingest(df)
+            total += len(df)
+    return total
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["sync"]:
+        print({"rows_ingested": sync_from_mysql()})
+    else:
+        print(__doc__)
@@ -0,0 +1,134 @@
+# migrate_date_column.py
+"""
+Adds the typed DATETIME column used by db.load_mysql_data, backfills it from
+the VARCHAR `Date` column in ID-range batches, creates the composite
+(Branch, date) index and, on MySQL, insert/update triggers that keep the
+column in sync for rows written later. Safe to re-run: existing
+column/index/triggers are kept and only rows with a NULL typed date are
+backfilled.
+
+    python migrate_date_column.py [--batch-size 10000] [--skip-index]
+"""
+import argparse
+import time
+
+import mysql.connector
+
+from config import MYSQL_TABLE_NAME, BRANCH_COLUMN, MYSQL_DATE_FORMAT, MYSQL_TYPED_DATE_COLUMN
+from db_pool import get_pool, SQLiteStandInConnection
+
+INDEX_NAME = f"idx_{BRANCH_COLUMN.lower()}_{MYSQL_TYPED_DATE_COLUMN.lower()}"
+
+
+def _column_exists(cursor, column: str) -> bool:
+    try:
+        cursor.execute(f"SELECT `{column}` FROM {MYSQL_TABLE_NAME} LIMIT 0")
+        cursor.fetchall()
+        return True
+    except mysql.connector.Error:
+        return False
+
+
+def add_column(conn, column: str = MYSQL_TYPED_DATE_COLUMN) -> bool:
+    cursor = conn.cursor()
+    try:
+        if _column_exists(cursor, column):
+            return False
+        cursor.execute(f"ALTER TABLE {MYSQL_TABLE_NAME} ADD COLUMN `{column}` DATETIME NULL")
+        conn.commit()
+        return True
+    finally:
+        cursor.close()
+
+
+def backfill(conn, column: str = MYSQL_TYPED_DATE_COLUMN, batch_size: int = 10000) -> int:
+    """Fills NULL typed dates from `Date`, committing after every ID batch."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"SELECT MIN(ID), MAX(ID) FROM {MYSQL_TABLE_NAME}")
+        low, high = cursor.fetchone()
+        if low is None:
+            return 0
+        updated = 0
+        for start in range(int(low), int(high) + 1, batch_size):
+            cursor.execute(
+                f"""
+                UPDATE {MYSQL_TABLE_NAME}
+                SET `{column}` = STR_TO_DATE(Date, '{MYSQL_DATE_FORMAT}')
+                WHERE ID >= %s AND ID < %s AND `{column}` IS NULL
+                """,
+                (start, start + batch_size),
+            )
+            updated += max(cursor.rowcount, 0)
+            conn.commit()
+        return updated
+    finally:
+        cursor.close()
+
+
+def add_index(conn, column: str = MYSQL_TYPED_DATE_COLUMN, index_name: str = INDEX_NAME) -> bool:
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"CREATE INDEX {index_name} ON {MYSQL_TABLE_NAME} (`{BRANCH_COLUMN}`, `{column}`)")
+        conn.commit()
+        return True
+    except mysql.connector.Error as err:
+        # MySQL has no CREATE INDEX IF NOT EXISTS (errno 1061: duplicate key name)
+        if getattr(err, "errno", None) == 1061 or "already exists" in str(err):
+            return False
+        raise
+    finally:
+        cursor.close()
+
+
+def add_sync_triggers(conn, column: str = MYSQL_TYPED_DATE_COLUMN) -> int:
+    """MySQL only: derive the typed column from `Date` on every insert/update."""
+    if isinstance(conn, SQLiteStandInConnection):
+        return 0
+    created = 0
+    cursor = conn.cursor()
+    try:
+        for event in ("INSERT", "UPDATE"):
+            try:
+                cursor.execute(
+                    f"""
+                    CREATE TRIGGER trg_{MYSQL_TABLE_NAME}_{column.lower()}_{event.lower()}
+                    BEFORE {event} ON {MYSQL_TABLE_NAME} FOR EACH ROW
+                    SET NEW.`{column}` = STR_TO_DATE(NEW.Date, '{MYSQL_DATE_FORMAT}')
+                    """
+                )
+                created += 1
+            except mysql.connector.Error as err:
+                # errno 1359: trigger already exists
+                if getattr(err, "errno", None) != 1359:
+                    raise
+        conn.commit()
+        return created
+    finally:
+        cursor.close()
+
+
+def migrate(batch_size: int = 10000, with_index: bool = True) -> dict:
+    if not MYSQL_TYPED_DATE_COLUMN:
+        raise ValueError("MYSQL_TYPED_DATE_COLUMN is empty; nothing to migrate.")
+    start = time.perf_counter()
+    with get_pool().connection() as conn:
+        added = add_column(conn)
+        triggers = add_sync_triggers(conn)
+        rows = backfill(conn, batch_size=batch_size)
+        indexed = add_index(conn) if with_index else False
+    return {
+        "column_added": added,
+        "triggers_created": triggers,
+        "rows_backfilled": rows,
+        "index_created": indexed,
+        "elapsed_seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--skip-index", action="store_true")
+    args = parser.parse_args()
+    print(migrate(batch_size=args.batch_size, with_index=not args.skip_index))
@@ -0,0 +1,449 @@
+# offline.py
+"""
+File-based analysis: the /analyze pipeline over CSV or Parquet exports,
+without MySQL.
+
+Rows are read in chunks of OFFLINE_CHUNK_ROWS, projected to the columns the
+analysis uses (db.LOAD_SCHEMA) and filtered by branch and month. For Parquet
+the filters are pushed down to the reader, so Year_Month partition
+directories (see `convert`) and row groups outside the requested branches /
+months are never decoded, and every month is scanned on its own: memory
+stays bounded by one month of rows. CSV, which carries no order or
+statistics to rely on, is first staged chunk by chunk (filtered and
+projected) into a temporary Year_Month-partitioned Parquet dataset and then
+scanned the same way, so unsorted multi-year exports stay bounded too.
+
+Each (branch, year, month) partition is then analyzed exactly like one
+/analyze call (batch.analyze_partition) and appended to a Parquet output
+file, one row group per partition.
+
+    python offline.py convert "Food & Beverage Waste_Pattern_Dataset.csv" waste_parquet/
+    python offline.py analyze waste_parquet/ --branches "New York - Main" \\
+        --from 2025-01 --to 2025-02 --output results.parquet [--workers 4] [--no-llm]
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import operator
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from config import (
+    BRANCH_COLUMN,
+    BATCH_START_METHOD,
+    DETECTION_MODE,
+    OFFLINE_CHUNK_ROWS,
+    OFFLINE_DATE_FORMATS,
+    OFFLINE_PARTITION_COLUMN,
+)
+from db import LOAD_SCHEMA, apply_load_schema, month_bounds
+from analysis import FLAG_COLUMNS, LLM_COLUMNS
+from batch import PartitionKey, analyze_partition, parse_month
+from timeseries_detection import StreamingDetector
+
+# `Time` is folded into `Date` while reading CSV exports
+READ_COLUMNS = list(LOAD_SCHEMA) + ["Time"]
+DATE_COLUMNS = ("Date", "Expiry Date", "Stock Received Date")
+
+_TEXT_FLAGS = {"Combined_Flag", "Root_Causes"}
+OUTPUT_SCHEMA = pa.schema(
+    [("ID", pa.int64()), ("Date", pa.timestamp("ns"))]
+    + [(col, pa.string()) for col in (BRANCH_COLUMN, "Branch Manager", "Chef", "Recipe", "Ingredient",
+                                      "Kitchen Station", "Shift", "Supplier Name")]
+    + [(col, pa.float64()) for col in ("Planned Qty", "Wastage Qty", "Expected Waste Qty", "Sales Qty",
+                                       "Wastage Cost", "Temperature (°C)", "Waste Rate")]
+    + [(col, pa.string() if col in _TEXT_FLAGS else pa.bool_()) for col in FLAG_COLUMNS]
+    + [(col, pa.string()) for col in LLM_COLUMNS]
+)
+
+
+def is_parquet(path: str) -> bool:
+    return os.path.isdir(path) or path.lower().endswith((".parquet", ".pq"))
+
+
+def parse_dates(values: pd.Series) -> pd.Series:
+    """Text dates -> datetime64 using the first OFFLINE_DATE_FORMATS entry that fits; typed columns pass through."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    sample = values.dropna()
+    if not sample.empty:
+        first = str(sample.iloc[0]).strip()
+        for fmt in OFFLINE_DATE_FORMATS:
+            try:
+                datetime.strptime(first, fmt)
+            except ValueError:
+                continue
+            return pd.to_datetime(values, format=fmt, errors="coerce")
+    return pd.to_datetime(values, errors="coerce")
+
+
+def _log_dates(df: pd.DataFrame) -> pd.Series:
+    # CSV exports keep the day in Date and the time of day in Time
+    dates = df["Date"]
+    if "Time" in df.columns and not pd.api.types.is_datetime64_any_dtype(dates):
+        sample = dates.dropna()
+        if not sample.empty and " " not in str(sample.iloc[0]).strip():
+            dates = dates.astype(str) + " " + df["Time"].fillna("00:00").astype(str)
+    return parse_dates(dates)
+
+
+def _in_months(dates: pd.Series, bounds: List[Tuple[datetime, datetime]]) -> pd.Series:
+    keep = pd.Series(False, index=dates.index)
+    for start, end in bounds:
+        keep |= (dates >= start) & (dates < end)
+    return keep
+
+
+def _normalize_chunk(df: pd.DataFrame, branches: Optional[List[str]],
+                     bounds: List[Tuple[datetime, datetime]]) -> pd.DataFrame:
+    """Branch filter, parsed dates, optional month filter; drops the folded Time column."""
+    if branches:
+        df = df[df[BRANCH_COLUMN].isin(branches)]
+    df = df.assign(Date=_log_dates(df))
+    if "Expiry Date" in df.columns:
+        df["Expiry Date"] = parse_dates(df["Expiry Date"])
+    if bounds:
+        df = df[_in_months(df["Date"], bounds)]
+    return df.drop(columns=["Time"], errors="ignore")
+
+
+def _open_dataset(path: str) -> ds.Dataset:
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+
+def _parquet_filter(dataset: ds.Dataset, branches: Optional[List[str]],
+                    bounds: List[Tuple[datetime, datetime]]) -> Tuple[Optional[ds.Expression], bool]:
+    """
+    Scanner filter for the requested branches / months, and whether the month
+    condition could be expressed on a typed Date column (otherwise the rows
+    still have to be filtered after parsing).
+    """
+    conditions = []
+    if branches:
+        conditions.append(ds.field(BRANCH_COLUMN).isin(branches))
+    date_pushed = not bounds
+    if bounds:
+        names = dataset.schema.names
+        if OFFLINE_PARTITION_COLUMN in names:
+            periods = sorted({start.strftime("%Y-%m") for start, _ in bounds})
+            conditions.append(ds.field(OFFLINE_PARTITION_COLUMN).isin(periods))
+        if "Date" in names and pa.types.is_timestamp(dataset.schema.field("Date").type):
+            ranges = [(ds.field("Date") >= start) & (ds.field("Date") < end) for start, end in bounds]
+            conditions.append(functools.reduce(operator.or_, ranges))
+            date_pushed = True
+    return (functools.reduce(operator.and_, conditions) if conditions else None), date_pushed
+
+
+def _read_csv(path: str, branches: Optional[List[str]], bounds: List[Tuple[datetime, datetime]],
+              chunk_rows: int) -> Iterator[pd.DataFrame]:
+    reader = pd.read_csv(path, chunksize=chunk_rows, usecols=lambda col: col in READ_COLUMNS)
+    for chunk in reader:
+        chunk = _normalize_chunk(chunk, branches, bounds)
+        if len(chunk):
+            yield chunk
+
+
+def _read_parquet(path: str, branches: Optional[List[str]], bounds: List[Tuple[datetime, datetime]],
+                  chunk_rows: int) -> Iterator[pd.DataFrame]:
+    dataset = _open_dataset(path)
+    expr, date_pushed = _parquet_filter(dataset, branches, bounds)
+    columns = [col for col in READ_COLUMNS if col in dataset.schema.names]
+    scanner = dataset.scanner(columns=columns, filter=expr, batch_size=chunk_rows)
+    for batch in scanner.to_batches():
+        if not batch.num_rows:
+            continue
+        # Branches are already filtered by the scanner
+        chunk = _normalize_chunk(batch.to_pandas(), None, [] if date_pushed else bounds)
+        if len(chunk):
+            yield chunk
+
+
+def read_waste_file(path: str, branches: Optional[List[str]] = None, months: Optional[List[Tuple[int, str]]] = None,
+                    chunk_rows: int = OFFLINE_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Chunks of a CSV or Parquet waste export restricted to `branches` and
+    `months` ((year, month name) pairs), with Date / Expiry Date parsed.
+    """
+    bounds = [month_bounds(year, month) for year, month in months or []]
+    if is_parquet(path):
+        return _read_parquet(path, branches, bounds, chunk_rows)
+    return _read_csv(path, branches, bounds, chunk_rows)
+
+
+def file_months(path: str, branches: Optional[List[str]] = None) -> List[Tuple[int, str]]:
+    """(year, month name) pairs present in a Parquet file or dataset, oldest first."""
+    dataset = _open_dataset(path)
+    periods = set()
+    if OFFLINE_PARTITION_COLUMN in dataset.schema.names and not branches:
+        # Partition directories name their month; no data has to be read
+        for fragment in dataset.get_fragments():
+            keys = ds.get_partition_keys(fragment.partition_expression)
+            if keys.get(OFFLINE_PARTITION_COLUMN):
+                periods.add(keys[OFFLINE_PARTITION_COLUMN])
+    else:
+        expr, _ = _parquet_filter(dataset, branches, [])
+        columns = [col for col in ("Date", "Time") if col in dataset.schema.names]
+        for batch in dataset.scanner(columns=columns, filter=expr).to_batches():
+            if batch.num_rows:
+                dates = _log_dates(batch.to_pandas()).dropna()
+                periods.update(np.unique(dates.to_numpy().astype("datetime64[M]")).astype(str))
+    months = [datetime.strptime(period, "%Y-%m") for period in periods]
+    return [(month.year, month.strftime("%B")) for month in sorted(months)]
+
+
+def _partitions(chunks: Iterator[pd.DataFrame]) -> Iterator[Tuple[PartitionKey, pd.DataFrame]]:
+    pieces: Dict[PartitionKey, List[pd.DataFrame]] = {}
+    for chunk in chunks:
+        dates = chunk["Date"]
+        groups = chunk.groupby([chunk[BRANCH_COLUMN].astype(object), dates.dt.year, dates.dt.month_name()],
+                               sort=False, dropna=True)
+        for (branch, year, month), part in groups:
+            pieces.setdefault((branch, int(year), month), []).append(part)
+
+    def order(key: PartitionKey):
+        branch, year, month = key
+        return year, datetime.strptime(month, "%B").month, branch
+
+    for key in sorted(pieces, key=order):
+        yield key, apply_load_schema(pd.concat(pieces.pop(key), ignore_index=True))
+
+
+def iter_file_partitions(path: str, branches: Optional[List[str]] = None,
+                         months: Optional[List[Tuple[int, str]]] = None,
+                         chunk_rows: int = OFFLINE_CHUNK_ROWS) -> Iterator[Tuple[PartitionKey, pd.DataFrame]]:
+    """
+    ((branch, year, month), rows) for every partition in the file, decoded
+    like load_mysql_data. Parquet is scanned one month at a time (all months
+    in the file when `months` is None); CSV is staged as Parquet first.
+    """
+    if not is_parquet(path):
+        with tempfile.TemporaryDirectory(prefix="offline-csv-") as staging:
+            if _stage_csv(path, staging, branches, months, chunk_rows):
+                yield from iter_file_partitions(staging, None, months, chunk_rows)
+        return
+    for month in months if months is not None else file_months(path, branches):
+        yield from _partitions(read_waste_file(path, branches, [month], chunk_rows))
+
+
+def _with_history(partitions: Iterator[Tuple[PartitionKey, pd.DataFrame]]):
+    # Partitions arrive in month order: each is scored against the series
+    # history of the earlier months in the file, kept in bounded memory
+    detector = StreamingDetector() if DETECTION_MODE == "timeseries" else None
+    for key, part in partitions:
+        if detector is None:
+            yield key, part, None
+            continue
+        baselines = detector.baselines(key[0])
+        detector.update(part)
+        yield key, part, baselines
+
+
+def _analyzed(partitions: Iterator[Tuple[PartitionKey, pd.DataFrame]], workers: int,
+              use_llm: bool) -> Iterator[Tuple[PartitionKey, int, Optional[Dict[str, Any]], Optional[str]]]:
+    # File rows do not share IDs with waste_logs, so the analysis result cache stays out of it
+    if workers <= 1:
+        for key, part, baselines in _with_history(partitions):
+            try:
+                yield key, len(part), analyze_partition(part, key, 1, use_cache=False, use_llm=use_llm,
+                                                        ts_baselines=baselines), None
+            except Exception as e:
+                yield key, len(part), None, f"Partition failed: {e}"
+        return
+
+    ctx = multiprocessing.get_context(BATCH_START_METHOD)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+        pending = {}
+
+        def drain(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                key, rows = pending.pop(future)
+                try:
+                    yield key, rows, future.result(), None
+                except Exception as e:
+                    yield key, rows, None, f"Partition failed: {e}"
+
+        for key, part, baselines in _with_history(partitions):
+            pending[executor.submit(analyze_partition, part, key, workers, False, use_llm, baselines)] = (key, len(part))
+            # Keep at most two partitions per worker in flight so reading stays ahead without piling up
+            if len(pending) >= 2 * workers:
+                yield from drain(FIRST_COMPLETED)
+        while pending:
+            yield from drain(FIRST_COMPLETED)
+
+
+def _output_table(result: pd.DataFrame) -> pa.Table:
+    frame = pd.DataFrame(index=result.index)
+    for field in OUTPUT_SCHEMA:
+        if field.name not in result.columns:
+            frame[field.name] = None
+        elif isinstance(result[field.name].dtype, pd.CategoricalDtype):
+            frame[field.name] = result[field.name].astype(object)
+        else:
+            frame[field.name] = result[field.name]
+    return pa.Table.from_pandas(frame, schema=OUTPUT_SCHEMA, preserve_index=False)
+
+
+def analyze_file(path: str, output: str, branches: Optional[List[str]] = None,
+                 months: Optional[List[Tuple[int, str]]] = None, workers: int = 1, use_llm: bool = True,
+                 chunk_rows: int = OFFLINE_CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """
+    Analyzes every branch-month of a CSV/Parquet export and writes the
+    analyzed rows (inputs, flags, LLM columns, Status) to the Parquet file
+    `output`. Yields one entry per partition as it is written, then a final
+    "done" entry. With `use_llm=False` no LLM is called and summaries stay
+    empty; statuses and flags are unaffected.
+    """
+    started = time.perf_counter()
+    totals = {"partitions": 0, "rows": 0, "failed": 0}
+    with pq.ParquetWriter(output, OUTPUT_SCHEMA) as writer:
+        partitions = iter_file_partitions(path, branches, months, chunk_rows)
+        for (branch, year, month), rows, outcome, error in _analyzed(partitions, workers, use_llm):
+            entry = {"branch": branch, "year": year, "month": month, "rows": rows}
+            totals["partitions"] += 1
+            if error:
+                totals["failed"] += 1
+                yield {**entry, "error": error}
+                continue
+            result = outcome["result"]
+            writer.write_table(_output_table(result))
+            totals["rows"] += len(result)
+            yield {
+                **entry,
+                "worker_pid": outcome["worker_pid"],
+                "timings": outcome["timings"],
+                "status_counts": {str(k): int(v) for k, v in result["Status"].value_counts().items()},
+            }
+    yield {"event": "done", "output": output, **totals, "elapsed_seconds": round(time.perf_counter() - started, 4)}
+
+
+def _convert_schema(chunk: pd.DataFrame) -> pa.Schema:
+    fields = []
+    for col in chunk.columns:
+        values = chunk[col]
+        if col in DATE_COLUMNS:
+            kind = pa.timestamp("ns")
+        elif col == "ID":
+            kind = pa.int64()
+        elif values.isna().all():
+            kind = pa.string()
+        elif pd.api.types.is_bool_dtype(values):
+            kind = pa.bool_()
+        elif pd.api.types.is_numeric_dtype(values):
+            kind = pa.float64()
+        else:
+            kind = pa.string()
+        fields.append(pa.field(col, kind))
+    return pa.schema(fields)
+
+
+def convert_csv(csv_path: str, dataset_dir: str, chunk_rows: int = OFFLINE_CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    CSV export -> Parquet dataset under `dataset_dir`, hive-partitioned by
+    OFFLINE_PARTITION_COLUMN (YYYY-MM) with typed timestamp dates (`Date`
+    includes the CSV `Time`). Rows are sorted by branch and date inside every
+    file so row-group statistics stay selective for the analyze filters.
+    Column types are fixed by the first chunk.
+    """
+    if os.path.isdir(dataset_dir) and os.listdir(dataset_dir):
+        raise ValueError(f"Output directory {dataset_dir!r} is not empty.")
+    started = time.perf_counter()
+    schema = None
+    rows = 0
+    for number, chunk in enumerate(pd.read_csv(csv_path, chunksize=chunk_rows)):
+        chunk["Date"] = _log_dates(chunk)
+        chunk = chunk.drop(columns=["Time"], errors="ignore")
+        for col in DATE_COLUMNS[1:]:
+            if col in chunk.columns:
+                chunk[col] = parse_dates(chunk[col])
+        schema = _write_dataset_chunk(chunk, dataset_dir, schema, number)
+        rows += len(chunk)
+    return {"rows": rows, "output": dataset_dir, "elapsed_seconds": round(time.perf_counter() - started, 4)}
+
+
+def _write_dataset_chunk(chunk: pd.DataFrame, dataset_dir: str, schema: Optional[pa.Schema], number: int) -> pa.Schema:
+    """Appends one parsed chunk to a Year_Month-partitioned dataset; returns the schema (fixed by the first chunk)."""
+    chunk = chunk.sort_values([BRANCH_COLUMN, "Date"], kind="stable", ignore_index=True)
+    if schema is None:
+        schema = _convert_schema(chunk)
+    for field in schema:
+        if pa.types.is_string(field.type):
+            values = chunk[field.name]
+            chunk[field.name] = values.astype(str).where(values.notna(), None)
+    table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+    table = table.append_column(OFFLINE_PARTITION_COLUMN, pa.array(chunk["Date"].dt.strftime("%Y-%m")))
+    partitioning = ds.partitioning(pa.schema([(OFFLINE_PARTITION_COLUMN, pa.string())]), flavor="hive")
+    ds.write_dataset(table, dataset_dir, format="parquet", partitioning=partitioning,
+                     basename_template=f"part-{number:05d}-{{i}}.parquet",
+                     existing_data_behavior="overwrite_or_ignore")
+    return schema
+
+
+def _stage_csv(csv_path: str, dataset_dir: str, branches: Optional[List[str]],
+               months: Optional[List[Tuple[int, str]]], chunk_rows: int) -> int:
+    """Writes the requested rows and READ_COLUMNS of a CSV export as a partitioned dataset; returns the row count."""
+    schema = None
+    rows = 0
+    for number, chunk in enumerate(read_waste_file(csv_path, branches, months, chunk_rows)):
+        chunk = chunk.dropna(subset=["Date"])
+        if chunk.empty:
+            continue
+        schema = _write_dataset_chunk(chunk, dataset_dir, schema, number)
+        rows += len(chunk)
+    return rows
+
+
+def _month_range(first: str, last: str) -> List[Tuple[int, str]]:
+    start = datetime.strptime(first, "%Y-%m")
+    end = datetime.strptime(last, "%Y-%m")
+    if end < start:
+        raise ValueError(f"--to {last} is before --from {first}.")
+    return [parse_month(period.strftime("%Y-%m")) for period in pd.date_range(start, end, freq="MS")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert = commands.add_parser("convert", help="CSV export -> month-partitioned Parquet dataset")
+    convert.add_argument("csv_path")
+    convert.add_argument("dataset_dir")
+    convert.add_argument("--chunk-rows", type=int, default=OFFLINE_CHUNK_ROWS)
+
+    analyze = commands.add_parser("analyze", help="analyze a CSV / Parquet export into a Parquet file")
+    analyze.add_argument("path", help="CSV file, Parquet file or Parquet dataset directory")
+    analyze.add_argument("--output", required=True, help="Parquet file for the analyzed rows")
+    analyze.add_argument("--branches", nargs="+")
+    analyze.add_argument("--months", nargs="+", help="YYYY-MM (alternative to --from/--to)")
+    analyze.add_argument("--from", dest="first", help="first month, YYYY-MM")
+    analyze.add_argument("--to", dest="last", help="last month, YYYY-MM (default: --from)")
+    analyze.add_argument("--workers", type=int, default=1)
+    analyze.add_argument("--no-llm", action="store_true", help="flags and statuses only, no LLM calls")
+    analyze.add_argument("--chunk-rows", type=int, default=OFFLINE_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        print(json.dumps(convert_csv(args.csv_path, args.dataset_dir, args.chunk_rows)))
+        sys.exit(0)
+
+    months = None
+    if args.months:
+        months = [parse_month(m) for m in args.months]
+    elif args.first:
+        months = _month_range(args.first, args.last or args.first)
+    for item in analyze_file(args.path, args.output, args.branches, months, workers=args.workers,
+                             use_llm=not args.no_llm, chunk_rows=args.chunk_rows):
+        print(json.dumps(item, default=str))
+        sys.stdout.flush()
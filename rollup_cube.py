@@ -0,0 +1,302 @@
+# rollup_cube.py
+"""
+Materialized rollup cube of analyzed waste logs for cross-branch dashboards.
+
+One cell per branch x month x station x shift x supplier x ingredient holds
+additive measures: row and quantity sums, costs, waste-rate sums, flag and
+status counts and one count per root cause. Every analysis run refreshes the
+cube with the rows it just analyzed (refresh_rollup). The previous
+contribution of each row is kept in `rollup_rows`, so re-analyzing a month
+replaces its rows' counts instead of adding them twice.
+
+Coarser aggregates of the same measures are materialized alongside
+(LEVELS), so common dashboard slices read hundreds of cells instead of the
+full grain. Queries (RollupCube.query) slice by any dimension values and month
+range and roll up to any subset of dimensions, answered from the smallest
+level that covers them; the raw waste_logs rows are never read.
+"""
+import os
+import re
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from config import BRANCH_COLUMN, ROLLUP_ENABLED, ROLLUP_PATH, ROLLUP_QUERY_MAX_CELLS
+from instrumentation import timed
+from utils import safe_rate_series, CAUSE_FLAG_COLUMNS
+
+# Cube dimension -> source column ("month" is derived from Date as YYYY-MM)
+DIMENSIONS = {
+    "branch": BRANCH_COLUMN,
+    "month": "Date",
+    "station": "Kitchen Station",
+    "shift": "Shift",
+    "supplier": "Supplier Name",
+    "ingredient": "Ingredient",
+}
+# Summed source columns
+QUANTITY_MEASURES = {
+    "planned_qty": "Planned Qty",
+    "wastage_qty": "Wastage Qty",
+    "expected_waste_qty": "Expected Waste Qty",
+    "sales_qty": "Sales Qty",
+    "wastage_cost": "Wastage Cost",
+    "total_cost": "Total Cost",
+}
+FLAG_MEASURES = {
+    "deviation_count": "Waste_Deviation_Flag",
+    "high_waste_count": "High_Waste_Flag",
+}
+STATUS_MEASURES = {
+    "critical_count": "Approved by Manager",
+    "pending_count": "Pending",
+    "ignored_count": "Ignore",
+}
+CAUSE_MEASURES = {f"cause_{cause.lower()}": flag_col for flag_col, cause in CAUSE_FLAG_COLUMNS}
+MEASURES = (["rows", "rate_rows", "rate_sum"] + list(QUANTITY_MEASURES) + ["flagged_count"]
+            + list(FLAG_MEASURES) + list(STATUS_MEASURES) + list(CAUSE_MEASURES))
+# Materialized aggregation levels, smallest first; "cells" is the full grain
+LEVELS = {
+    "branch_month": ("branch", "month"),
+    "month_supplier_ingredient": ("month", "supplier", "ingredient"),
+    "branch_month_station_shift": ("branch", "month", "station", "shift"),
+    "cells": tuple(DIMENSIONS),
+}
+# Ratios computed from the summed measures of every result group
+DERIVED = ["waste_rate", "qty_waste_rate", "flagged_share"]
+_MONTH_RE = re.compile(r"^\d{4}-\d{2}$")
+
+
+def _dimension_values(series: pd.Series) -> pd.Series:
+    return series.astype(object).where(series.notna(), "").astype(str)
+
+
+def rollup_facts(df: pd.DataFrame) -> pd.DataFrame:
+    """Per-row cube contribution (id, dimensions, MEASURES) of analyzed rows; rows without ID or date are skipped."""
+    if df.empty or "ID" not in df.columns or "Date" not in df.columns:
+        return pd.DataFrame(columns=["id"] + list(DIMENSIONS) + MEASURES)
+    date = pd.to_datetime(df["Date"], errors="coerce")
+    keep = date.notna() & df["ID"].notna()
+    df, date = df[keep], date[keep]
+
+    # Collected first and framed once: per-column inserts dominate at /analyze batch sizes
+    columns = {"id": df["ID"].astype("int64")}
+    for dim, col in DIMENSIONS.items():
+        if dim == "month":
+            columns[dim] = date.dt.strftime("%Y-%m")
+        elif col in df.columns:
+            columns[dim] = _dimension_values(df[col])
+        else:
+            columns[dim] = ""
+
+    planned = pd.to_numeric(df["Planned Qty"], errors="coerce") if "Planned Qty" in df.columns \
+        else pd.Series(float("nan"), index=df.index)
+    rate = df["Waste Rate"] if "Waste Rate" in df.columns else safe_rate_series(df["Wastage Qty"], planned)
+    has_rate = planned.notna() & (planned > 0)
+    columns["rows"] = 1
+    columns["rate_rows"] = has_rate.astype(int)
+    columns["rate_sum"] = pd.to_numeric(rate, errors="coerce").where(has_rate, 0.0).fillna(0.0)
+    for measure, col in QUANTITY_MEASURES.items():
+        columns[measure] = pd.to_numeric(df[col], errors="coerce").fillna(0.0) if col in df.columns else 0.0
+
+    combined = df["Combined_Flag"] if "Combined_Flag" in df.columns else pd.Series("None", index=df.index)
+    causes = df["Root_Causes"] if "Root_Causes" in df.columns else pd.Series("None", index=df.index)
+    columns["flagged_count"] = ((combined != "None") | (causes != "None")).astype(int)
+    for measure, col in FLAG_MEASURES.items():
+        columns[measure] = df[col].fillna(False).astype(bool).astype(int) if col in df.columns else 0
+    status = df["Status"] if "Status" in df.columns else pd.Series("", index=df.index)
+    for measure, value in STATUS_MEASURES.items():
+        columns[measure] = (status == value).astype(int)
+    for measure, col in CAUSE_MEASURES.items():
+        columns[measure] = df[col].fillna(False).astype(bool).astype(int) if col in df.columns else 0
+    facts = pd.DataFrame(columns, index=df.index)
+    return facts.drop_duplicates("id", keep="last").reset_index(drop=True)
+
+
+def _rows(df: pd.DataFrame) -> List[list]:
+    # Python scalars for sqlite3 (no numpy ints); itertuples costs ~1 ms per call even on a few rows
+    return df.astype(object).to_numpy().tolist()
+
+
+class RollupCube:
+    def __init__(self, path: str = ROLLUP_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        measures = ", ".join(f"{m} REAL NOT NULL DEFAULT 0" for m in MEASURES)
+        script = ["PRAGMA journal_mode=WAL;"]
+        for level, dims in LEVELS.items():
+            columns = ", ".join(f"{d} TEXT NOT NULL" for d in dims)
+            script.append(f"""
+                CREATE TABLE IF NOT EXISTS {self._table(level)} (
+                    {columns}, {measures}, PRIMARY KEY ({", ".join(dims)})
+                );
+                CREATE INDEX IF NOT EXISTS idx_{self._table(level)}_month ON {self._table(level)} (month);
+            """)
+        dims = ", ".join(f"{d} TEXT NOT NULL" for d in DIMENSIONS)
+        script.append(f"CREATE TABLE IF NOT EXISTS rollup_rows (id INTEGER PRIMARY KEY, {dims}, {measures});")
+        self._conn.executescript("\n".join(script))
+        self._conn.commit()
+
+    @staticmethod
+    def _table(level: str) -> str:
+        return "rollup_cells" if level == "cells" else f"rollup_{level}"
+
+    @staticmethod
+    def _level_for(dims) -> str:
+        return next(level for level, level_dims in LEVELS.items() if set(dims) <= set(level_dims))
+
+    # --- refresh ---------------------------------------------------------
+
+    def _retractions(self, ids: Sequence[int]) -> pd.DataFrame:
+        """Stored contributions of `ids` with their measures negated."""
+        columns = ["id"] + list(DIMENSIONS) + MEASURES
+        select = ["id"] + list(DIMENSIONS) + [f"-{m}" for m in MEASURES]
+        rows = []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows.extend(self._conn.execute(
+                f"SELECT {', '.join(select)} FROM rollup_rows WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return pd.DataFrame(rows, columns=columns)
+
+    def refresh(self, df: pd.DataFrame) -> int:
+        """Replaces the cube contribution of the analyzed rows in `df`; returns the number of cells touched."""
+        facts = rollup_facts(df)
+        if facts.empty:
+            return 0
+        with self._lock:
+            previous = self._retractions([int(i) for i in facts["id"]])
+            parts = [facts, previous] if not previous.empty else [facts]
+            delta = (pd.concat(parts, ignore_index=True)
+                     .groupby(list(DIMENSIONS), as_index=False, sort=False)[MEASURES].sum())
+            # Re-analyzed rows with unchanged outputs contribute nothing
+            delta = delta[(delta[MEASURES] != 0).any(axis=1)]
+            if delta.empty:
+                # Same dimensions and measures as stored: rollup_rows is already current too
+                return 0
+
+            for level, dims in LEVELS.items():
+                level_delta = delta if level == "cells" else \
+                    delta.groupby(list(dims), as_index=False, sort=False)[MEASURES].sum()
+                level_columns = list(dims) + MEASURES
+                self._conn.executemany(
+                    f"""
+                    INSERT INTO {self._table(level)} ({", ".join(level_columns)})
+                    VALUES ({", ".join("?" * len(level_columns))})
+                    ON CONFLICT ({", ".join(dims)}) DO UPDATE SET
+                        {", ".join(f"{m} = {m} + excluded.{m}" for m in MEASURES)}
+                    """,
+                    _rows(level_delta[level_columns]),
+                )
+                self._conn.execute(f"DELETE FROM {self._table(level)} WHERE rows <= 0")
+            row_columns = ["id"] + list(DIMENSIONS) + MEASURES
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO rollup_rows ({', '.join(row_columns)}) "
+                f"VALUES ({', '.join('?' * len(row_columns))})",
+                _rows(facts[row_columns]),
+            )
+            self._conn.commit()
+        return len(delta)
+
+    # --- queries ---------------------------------------------------------
+
+    def query(self, group_by: Sequence[str] = ("branch",), filters: Optional[Dict[str, Sequence[str]]] = None,
+              month_from: Optional[str] = None, month_to: Optional[str] = None,
+              order_by: Optional[str] = None, descending: bool = True,
+              limit: int = ROLLUP_QUERY_MAX_CELLS) -> List[Dict[str, Any]]:
+        """
+        Sums the cells matching `filters` (dimension -> accepted values) and the
+        inclusive 'YYYY-MM' month range, grouped by `group_by` (empty: one
+        grand total). Each group carries MEASURES plus the DERIVED ratios.
+        """
+        group_by = list(dict.fromkeys(group_by))
+        unknown = [d for d in list(group_by) + list(filters or {}) if d not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown rollup dimension(s): {', '.join(unknown)} "
+                             f"(expected {', '.join(DIMENSIONS)})")
+        if order_by is not None and order_by not in MEASURES + DERIVED + group_by:
+            raise ValueError(f"Cannot order by '{order_by}'")
+        for bound in (month_from, month_to):
+            if bound and not _MONTH_RE.match(bound):
+                raise ValueError(f"Month '{bound}' is not in YYYY-MM format")
+
+        filters = {dim: list(values) for dim, values in (filters or {}).items() if values}
+        level = self._level_for(group_by + list(filters) + (["month"] if month_from or month_to else []))
+        where, params = [], []
+        for dim, values in filters.items():
+            where.append(f"{dim} IN ({','.join('?' * len(values))})")
+            params.extend(values)
+        if month_from:
+            where.append("month >= ?")
+            params.append(month_from)
+        if month_to:
+            where.append("month <= ?")
+            params.append(month_to)
+
+        select = group_by + [f"SUM({m}) AS {m}" for m in MEASURES]
+        sql = f"SELECT {', '.join(select)} FROM {self._table(level)}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        if group_by:
+            sql += f" GROUP BY {', '.join(group_by)}"
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        columns = group_by + MEASURES
+        groups = []
+        for row in rows:
+            group = dict(zip(columns, row))
+            if not group["rows"]:
+                continue
+            for m in MEASURES:
+                if m != "rate_sum" and m not in QUANTITY_MEASURES:
+                    group[m] = int(group[m])
+            group["waste_rate"] = group["rate_sum"] / group["rate_rows"] if group["rate_rows"] else 0.0
+            group["qty_waste_rate"] = group["wastage_qty"] / group["planned_qty"] if group["planned_qty"] else 0.0
+            group["flagged_share"] = group["flagged_count"] / group["rows"]
+            groups.append(group)
+        if order_by is not None:
+            groups.sort(key=lambda g: g[order_by], reverse=descending)
+        return groups[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cells, months, branches = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT month), COUNT(DISTINCT branch) FROM rollup_cells"
+            ).fetchone()
+            rows = self._conn.execute("SELECT COUNT(*) FROM rollup_rows").fetchone()[0]
+            levels = {level: self._conn.execute(f"SELECT COUNT(*) FROM {self._table(level)}").fetchone()[0]
+                      for level in LEVELS}
+        return {"cells": cells, "rows": rows, "months": months, "branches": branches, "levels": levels}
+
+    def close(self):
+        self._conn.close()
+
+
+_cube: Optional[RollupCube] = None
+_cube_lock = threading.Lock()
+
+
+def get_rollup_cube() -> Optional[RollupCube]:
+    """Process-wide cube, or None when disabled."""
+    global _cube
+    if not ROLLUP_ENABLED:
+        return None
+    with _cube_lock:
+        if _cube is None:
+            _cube = RollupCube()
+    return _cube
+
+
+def refresh_rollup(df: pd.DataFrame) -> int:
+    """Folds freshly analyzed rows into the process-wide cube (no-op when disabled)."""
+    cube = get_rollup_cube()
+    if cube is None or df is None or df.empty:
+        return 0
+    with timed("rollup", rows=len(df)):
+        return cube.refresh(df)
@@ -0,0 +1,216 @@
+# snapshot_cache.py
+"""
+Local Arrow IPC snapshots of branch-month loads (db.load_mysql_data).
+
+A snapshot holds the decoded frame exactly as the loader returns it (compact
+dtypes, categories, parsed dates) and is read back through a memory map, so a
+repeated /analyze of the same month skips the MySQL transfer and all
+parsing. Every snapshot carries the source watermark it was taken at (row
+count + max ID of the branch-month, a checksum of its Status and
+Chef_Feedback values, plus the projected columns); a load whose current
+watermark differs, i.e. after rows were added, removed or re-statused by
+any writer, replaces it. Write-backs through update_mysql_data invalidate the touched
+branch-months explicitly. Snapshots are evicted least recently used first
+once their files exceed `max_bytes`.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from config import SNAPSHOT_CACHE_ENABLED, SNAPSHOT_CACHE_DIR, SNAPSHOT_CACHE_MAX_BYTES
+
+SnapshotKey = Tuple[str, int, int]
+
+_STATS_METADATA_KEY = b"load_stats"
+
+
+class SnapshotCache:
+    def __init__(self, directory: str = SNAPSHOT_CACHE_DIR, max_bytes: int = SNAPSHOT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                branch TEXT NOT NULL,
+                year INTEGER NOT NULL,
+                month INTEGER NOT NULL,
+                watermark TEXT NOT NULL,
+                file TEXT NOT NULL,
+                bytes INTEGER NOT NULL,
+                rows INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (branch, year, month)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, key: SnapshotKey, watermark: str) -> Optional[pd.DataFrame]:
+        """The cached frame for `key`, or None when missing or taken at another watermark."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT watermark, file FROM snapshots WHERE branch = ? AND year = ? AND month = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[0] != watermark:
+                self.stale += 1
+                self.misses += 1
+                self._remove(key, row[1])
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE snapshots SET accessed_at = ? WHERE branch = ? AND year = ? AND month = ?",
+                (time.time(), *key),
+            )
+            self._conn.commit()
+            path = os.path.join(self.directory, row[1])
+        try:
+            df = self._read(path)
+        except (OSError, pa.ArrowException):
+            with self._lock:
+                self.misses += 1
+                self._remove(key, row[1])
+                self._conn.commit()
+            return None
+        with self._lock:
+            self.hits += 1
+        return df
+
+    @staticmethod
+    def _read(path: str) -> pd.DataFrame:
+        # Numeric, date and category-code buffers are used straight from the mapping
+        table = ipc.open_file(pa.memory_map(path, "r")).read_all()
+        df = table.to_pandas(split_blocks=True)
+        metadata = table.schema.metadata or {}
+        if _STATS_METADATA_KEY in metadata:
+            df.attrs["load_stats"] = {**json.loads(metadata[_STATS_METADATA_KEY]), "snapshot": True}
+        return df
+
+    def put(self, key: SnapshotKey, watermark: str, df: pd.DataFrame) -> bool:
+        """Stores `df` for `key` at `watermark`; False when it cannot be encoded or exceeds the budget."""
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowException, TypeError, ValueError):
+            return False
+        stats = df.attrs.get("load_stats")
+        if stats:
+            metadata = dict(table.schema.metadata or {})
+            metadata[_STATS_METADATA_KEY] = json.dumps(stats).encode("utf-8")
+            table = table.replace_schema_metadata(metadata)
+
+        name = f"{uuid.uuid4().hex}.arrow"
+        path = os.path.join(self.directory, name)
+        tmp = path + ".tmp"
+        with pa.OSFile(tmp, "wb") as sink:
+            with ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        size = os.path.getsize(tmp)
+        if size > self.max_bytes:
+            os.remove(tmp)
+            return False
+        os.replace(tmp, path)
+
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT file FROM snapshots WHERE branch = ? AND year = ? AND month = ?", key
+            ).fetchone()
+            if old is not None:
+                self._remove(key, old[0])
+            self._conn.execute(
+                "INSERT INTO snapshots (branch, year, month, watermark, file, bytes, rows, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, watermark, name, size, len(df), now, now),
+            )
+            self.stores += 1
+            self._evict()
+            self._conn.commit()
+        return True
+
+    def _remove(self, key: SnapshotKey, file: str):
+        # Frames already handed out keep their mapping; the file only disappears from the directory
+        self._conn.execute("DELETE FROM snapshots WHERE branch = ? AND year = ? AND month = ?", key)
+        try:
+            os.remove(os.path.join(self.directory, file))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM snapshots").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for branch, year, month, file, size in self._conn.execute(
+                "SELECT branch, year, month, file, bytes FROM snapshots ORDER BY accessed_at ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._remove((branch, year, month), file)
+            total -= size
+            self.evictions += 1
+
+    def invalidate(self, keys: Optional[Iterable[SnapshotKey]] = None) -> int:
+        """Drops the snapshots of `keys` (everything when None). Returns the number removed."""
+        with self._lock:
+            if keys is None:
+                rows = self._conn.execute("SELECT branch, year, month, file FROM snapshots").fetchall()
+            else:
+                rows = []
+                for key in set(keys):
+                    row = self._conn.execute(
+                        "SELECT branch, year, month, file FROM snapshots WHERE branch = ? AND year = ? AND month = ?",
+                        key,
+                    ).fetchone()
+                    if row is not None:
+                        rows.append(row)
+            for branch, year, month, file in rows:
+                self._remove((branch, year, month), file)
+            self._conn.commit()
+        return len(rows)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM snapshots").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+
+_cache: Optional[SnapshotCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_snapshot_cache() -> Optional[SnapshotCache]:
+    """Process-wide snapshot cache, or None when disabled."""
+    global _cache
+    if not SNAPSHOT_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = SnapshotCache()
+    return _cache
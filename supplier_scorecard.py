@@ -0,0 +1,93 @@
+# supplier_scorecard.py
+"""
+Per-supplier risk scorecard behind the Supplier_Quality / Supplier_Rotation
+root causes.
+
+One row per supplier (index "Supplier Name") with:
+
+- rows, rate_rows, rate_sum, expiry_count: additive sums (rate_rows counts the
+  rows with a positive planned quantity, whose waste rates make up rate_sum)
+- mean_waste_rate, expiry_share: the derived ratios
+- quality_issue: mean waste rate above SUPPLIER_MULT x the branch average
+- rotation_issue: at least REPEATED_EXPIRY_COUNT expired rows, or more than
+  ROTATION_EXPIRY_SHARE of its rows expired
+
+supplier_scorecard builds it from a branch frame in one grouped sum;
+score_suppliers derives the ratios and flags from sums kept elsewhere (e.g.
+metrics_store.MetricsStore), so both score suppliers identically.
+"""
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from config import SUPPLIER_MULT, REPEATED_EXPIRY_COUNT
+from utils import safe_rate_series
+
+SUPPLIER_COLUMN = "Supplier Name"
+SUM_COLUMNS = ["rows", "rate_rows", "rate_sum", "expiry_count"]
+SCORECARD_COLUMNS = SUM_COLUMNS + ["mean_waste_rate", "expiry_share", "quality_issue", "rotation_issue"]
+# Share of a supplier's rows used after expiry that marks a rotation problem
+ROTATION_EXPIRY_SHARE = 0.2
+
+
+def as_datetime(series: pd.Series) -> pd.Series:
+    """`series` as datetime64 (unparseable values NaT); already-parsed columns are returned as is."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors='coerce')
+
+
+def expiry_flags(df: pd.DataFrame) -> pd.Series:
+    """True where the row's Date (day) is after its Expiry Date (day); False when either is missing."""
+    if "Date" not in df.columns or "Expiry Date" not in df.columns:
+        return pd.Series(False, index=df.index)
+    date = as_datetime(df["Date"]).dt.normalize()
+    expiry = as_datetime(df["Expiry Date"]).dt.normalize()
+    return (date > expiry).fillna(False).astype(bool)
+
+
+def score_suppliers(sums: pd.DataFrame, branch_avg: float) -> pd.DataFrame:
+    """Adds the derived ratios and issue flags to per-supplier SUM_COLUMNS."""
+    card = sums[SUM_COLUMNS].copy()
+    has_rate = card["rate_rows"] > 0
+    card["mean_waste_rate"] = (card["rate_sum"] / card["rate_rows"].where(has_rate)).fillna(0.0)
+    card["expiry_share"] = (card["expiry_count"] / card["rows"].where(card["rows"] > 0)).fillna(0.0)
+    card["quality_issue"] = has_rate & (card["mean_waste_rate"] > branch_avg * SUPPLIER_MULT)
+    card["rotation_issue"] = (card["expiry_count"] >= REPEATED_EXPIRY_COUNT) | (card["expiry_share"] > ROTATION_EXPIRY_SHARE)
+    return card
+
+
+def supplier_scorecard(df: pd.DataFrame, branch_avg: Optional[float] = None,
+                       waste_rate: Optional[pd.Series] = None, expiry: Optional[pd.Series] = None) -> pd.DataFrame:
+    """
+    Scorecard of the suppliers in a branch frame. `waste_rate` / `expiry`
+    reuse per-row values the caller already computed; `branch_avg` defaults
+    to the mean waste rate over all rows with a planned quantity.
+    """
+    if SUPPLIER_COLUMN not in df.columns:
+        return pd.DataFrame(columns=SCORECARD_COLUMNS, index=pd.Index([], name=SUPPLIER_COLUMN))
+    planned = pd.to_numeric(df["Planned Qty"], errors='coerce')
+    has_rate = planned.notna() & (planned > 0)
+    if waste_rate is None:
+        waste_rate = safe_rate_series(df["Wastage Qty"], planned)
+    if expiry is None:
+        expiry = expiry_flags(df)
+    if branch_avg is None:
+        branch_avg = waste_rate[has_rate].mean() if has_rate.any() else 0.0
+
+    sums = pd.DataFrame({
+        "rows": 1,
+        "rate_rows": has_rate.astype(int),
+        "rate_sum": waste_rate.where(has_rate, 0.0),
+        "expiry_count": expiry.astype(int),
+    }, index=df.index).groupby(df[SUPPLIER_COLUMN], observed=True).sum()
+    sums.index.name = SUPPLIER_COLUMN
+    return score_suppliers(sums, branch_avg)
+
+
+def scorecard_metrics(card: pd.DataFrame) -> Dict[str, Any]:
+    """The supplier entries of a calculate_branch_metrics dict, read off a scorecard."""
+    return {
+        "bad_quality_suppliers_list": card.index[card["quality_issue"]].tolist(),
+        "supplier_rotation_history_set": set(card.index[card["rotation_issue"]]),
+    }
@@ -0,0 +1,54 @@
+# tests/conftest.py
+"""
+Shared setup: the repo root on sys.path, the fake LLM provider and every
+SQLite cache in a throwaway directory, set before any module reads config.py.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_CACHE_DIR = tempfile.mkdtemp(prefix="waste-tests-")
+os.environ.update(
+    LLM_PROVIDER="fake",
+    LLM_RATE_LIMIT_PER_SEC="0",
+    LLM_CACHE_PATH=os.path.join(_CACHE_DIR, "llm.sqlite3"),
+    ANALYSIS_CACHE_PATH=os.path.join(_CACHE_DIR, "analysis.sqlite3"),
+    ROLLUP_PATH=os.path.join(_CACHE_DIR, "rollup.sqlite3"),
+    METRICS_STORE_PATH=os.path.join(_CACHE_DIR, "metrics.sqlite3"),
+    SNAPSHOT_CACHE_DIR=os.path.join(_CACHE_DIR, "snapshots"),
+    JOBS_DB_PATH=os.path.join(_CACHE_DIR, "jobs.sqlite3"),
+    EMAIL_DELIVERY_LOG_PATH=os.path.join(_CACHE_DIR, "email.sqlite3"),
+)
+
+DATASET_CSV = os.path.join(ROOT, "Food & Beverage Waste_Pattern_Dataset.csv")
+
+
+@pytest.fixture(scope="session")
+def dataset_frame():
+    """The bundled CSV as the loaders deliver it (LOAD_SCHEMA columns and dtypes)."""
+    import pandas as pd
+    from offline import read_waste_file
+
+    return pd.concat(list(read_waste_file(DATASET_CSV)), ignore_index=True)
+
+
+@pytest.fixture
+def sqlite_pool(tmp_path, monkeypatch):
+    """The process-wide DB pool over an empty SQLite stand-in file; yields the file path."""
+    import db
+    import db_pool
+    from snapshot_cache import get_snapshot_cache
+
+    path = str(tmp_path / "waste.sqlite3")
+    pool = db_pool.init_pool(db_pool.sqlite_stand_in_factory(path), size=1)
+    monkeypatch.setattr(db, "_table_columns", None)
+    # Snapshots of another test's table could share a branch-month and watermark
+    get_snapshot_cache().invalidate()
+    yield path
+    pool.close()
+    monkeypatch.setattr(db_pool, "_pool", None)
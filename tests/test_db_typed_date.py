@@ -0,0 +1,30 @@
+# tests/test_db_typed_date.py
+"""The loaders on tables with and without the typed date column of migrate_date_column.py."""
+import sqlite3
+
+import pytest
+
+from benchmarks.synthetic import generate_waste_logs, to_table_rows
+from config import MYSQL_TABLE_NAME, MYSQL_TYPED_DATE_COLUMN
+from db import load_mysql_batch, load_mysql_data
+from metrics_store import MetricsStore, sync_from_mysql
+
+BRANCH = "New York - Main"
+
+
+@pytest.mark.parametrize("migrated", [True, False])
+def test_loaders_work_before_and_after_the_migration(sqlite_pool, tmp_path, migrated):
+    logs = generate_waste_logs(300, 2025, "February", months=2, branches=[BRANCH], seed=7)
+    rows = to_table_rows(logs)
+    if not migrated:
+        rows = rows.drop(columns=[MYSQL_TYPED_DATE_COLUMN])
+    conn = sqlite3.connect(sqlite_pool)
+    rows.to_sql(MYSQL_TABLE_NAME, conn, index=False)
+    conn.close()
+    february = int((rows["Date"].str[3:6] == "Feb").sum())
+
+    df = load_mysql_data(BRANCH, 2025, "February")
+    assert len(df) == february
+    assert (df["Date"].dt.month == 2).all()
+    assert len(load_mysql_batch([BRANCH], [(2025, "February"), (2025, "March")])) == len(rows)
+    assert sync_from_mysql(MetricsStore(str(tmp_path / "metrics.sqlite3"))) == len(rows)
@@ -0,0 +1,127 @@
+# tests/test_email_delivery.py
+"""DeliveryWorker + SMTPTransport against a local aiosmtpd server."""
+import smtplib
+import socket
+
+import pytest
+
+from email_delivery import FAILED, QUEUED, SENT, DeliveryLog, DeliveryWorker, SMTPTransport
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+
+class Handler:
+    """Accepts every message; the first `transient_failures` DATA commands get a 451."""
+
+    def __init__(self, transient_failures: int = 0):
+        self.transient_failures = transient_failures
+        self.received = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.transient_failures:
+            self.transient_failures -= 1
+            return "451 Try again later"
+        self.received.append(envelope)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server():
+    def start(handler):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        controller = aiosmtpd_controller.Controller(handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        servers.append(controller)
+        return SMTPTransport("127.0.0.1", port, use_ssl=False)
+
+    servers = []
+    yield start
+    for controller in servers:
+        controller.stop()
+
+
+def _messages(n):
+    return [{"record_id": 100 + i, "sender": "ops@example.com", "to": f"chef{i}@example.com",
+             "subject": f"Feedback {i}", "body": f"Body {i}"} for i in range(n)]
+
+
+def test_session_is_reused_and_outcomes_are_logged_per_record(smtp_server, tmp_path):
+    handler = Handler()
+    worker = DeliveryWorker(smtp_server(handler), DeliveryLog(str(tmp_path / "log.sqlite3")), max_concurrency=1)
+    worker.start()
+    batch_id = worker.enqueue(_messages(5))
+    worker.join()
+    worker.stop(timeout=5)
+
+    assert worker.sessions_opened == 1
+    assert sorted(envelope.rcpt_tos[0] for envelope in handler.received) == [f"chef{i}@example.com" for i in range(5)]
+    rows = worker.log.query(batch_id=batch_id)
+    assert sorted(row["record_id"] for row in rows) == [100, 101, 102, 103, 104]
+    assert {(row["status"], row["attempts"]) for row in rows} == {(SENT, 1)}
+
+
+def test_transient_failure_is_retried_on_a_new_session(smtp_server, tmp_path):
+    handler = Handler(transient_failures=1)
+    worker = DeliveryWorker(smtp_server(handler), DeliveryLog(str(tmp_path / "log.sqlite3")), max_concurrency=1,
+                            backoff_seconds=0.01)
+    worker.start()
+    batch_id = worker.enqueue(_messages(1))
+    worker.join()
+    worker.stop(timeout=5)
+
+    (row,) = worker.log.query(batch_id=batch_id)
+    assert (row["status"], row["attempts"], row["record_id"]) == (SENT, 2, 100)
+    assert worker.sessions_opened == 2
+    assert len(handler.received) == 1
+
+
+def test_start_requeues_messages_left_in_the_log(smtp_server, tmp_path):
+    path = str(tmp_path / "log.sqlite3")
+    handler = Handler()
+    transport = smtp_server(handler)
+    # Queued but never sent: the process went away before a sender picked them up
+    batch_id = DeliveryWorker(transport, DeliveryLog(path)).enqueue(_messages(3))
+    log = DeliveryLog(path)
+    log.add("old-batch", 999, "chef@example.com", "Lost", None)
+
+    worker = DeliveryWorker(transport, log, max_concurrency=1)
+    assert worker.start() == 3
+    worker.join()
+    worker.stop(timeout=5)
+
+    assert {row["status"] for row in log.query(batch_id=batch_id)} == {SENT}
+    assert sorted(e.rcpt_tos[0] for e in handler.received) == ["chef0@example.com", "chef1@example.com",
+                                                                 "chef2@example.com"]
+    (lost,) = log.query(batch_id="old-batch")
+    assert lost["status"] == FAILED
+    assert not log.query(status=QUEUED)
+    assert worker.start() == 0
+
+
+def test_plain_smtp_upgrades_with_starttls_before_login(monkeypatch):
+    calls = []
+
+    class FakeSMTP:
+        def __init__(self, host, port, timeout):
+            calls.append("connect")
+
+        def ehlo(self):
+            calls.append("ehlo")
+
+        def has_extn(self, name):
+            return name == "starttls"
+
+        def starttls(self, context=None):
+            calls.append("starttls")
+
+        def login(self, user, password):
+            calls.append("login")
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    SMTPTransport("smtp.example.com", 587, "user", "secret", use_ssl=False).connect()
+    assert calls == ["connect", "ehlo", "starttls", "ehlo", "login"]
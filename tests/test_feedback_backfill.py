@@ -0,0 +1,52 @@
+# tests/test_feedback_backfill.py
+"""backfill_feedback.py and the sanitizer version stamped by update_mysql_data."""
+import sqlite3
+
+import pandas as pd
+
+import backfill_feedback
+import db
+from config import MYSQL_FEEDBACK_VERSION_COLUMN, MYSQL_TABLE_NAME
+from feedback_sanitizer import SANITIZER_VERSION
+
+LEGACY = "Subject: Milk waste\nHi [Station Chef's Name],\nCheck expiry dates.\nBest,\n[Your Name]"
+
+
+def _rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0]: row[1:] for row in conn.execute(
+            f"SELECT ID, Chef_Feedback, {MYSQL_FEEDBACK_VERSION_COLUMN} FROM {MYSQL_TABLE_NAME}")}
+    finally:
+        conn.close()
+
+
+def test_backfill_marks_rows_and_writes_stamp_new_feedback(sqlite_pool, monkeypatch):
+    conn = sqlite3.connect(sqlite_pool)
+    conn.execute(f"CREATE TABLE {MYSQL_TABLE_NAME} (ID INTEGER, Chef TEXT, `Branch Manager` TEXT, "
+                 "Status TEXT, Chef_Feedback TEXT)")
+    conn.executemany(f"INSERT INTO {MYSQL_TABLE_NAME} VALUES (?, ?, ?, ?, ?)", [
+        (1, "Maria Garcia", "Robert", "Approved by Manager", LEGACY),
+        (2, "Maria Garcia", "Robert", "N/A (No Issue)", "N/A"),
+        (3, "Maria Garcia", "Robert", "Pending", None),
+    ])
+    conn.commit()
+    conn.close()
+
+    result = backfill_feedback.migrate(batch_size=2)
+    assert (result["column_added"], result["rows_marked"], result["feedback_changed"]) == (True, 3, 1)
+    assert _rows(sqlite_pool) == {
+        1: ("Subject: Milk waste\nCheck expiry dates.", SANITIZER_VERSION),
+        2: ("N/A", SANITIZER_VERSION),
+        3: (None, SANITIZER_VERSION),
+    }
+    assert backfill_feedback.migrate()["rows_marked"] == 0
+
+    conn = sqlite3.connect(sqlite_pool)
+    conn.execute(f"INSERT INTO {MYSQL_TABLE_NAME} (ID, Status) VALUES (4, 'Pending')")
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(db, "_table_columns", None)
+    db.update_mysql_data(pd.DataFrame({"ID": [4], "Status": ["Approved by Manager"],
+                                       "Chef_Feedback_Summary": ["Weigh trim waste."]}))
+    assert _rows(sqlite_pool)[4] == ("Weigh trim waste.", SANITIZER_VERSION)
@@ -0,0 +1,132 @@
+# tests/test_feedback_sanitizer.py
+"""Golden tests of feedback_sanitizer: fixed LLM outputs and the subject / body they must give."""
+import pytest
+
+from feedback_sanitizer import parse_feedback, sanitize_feedback, sanitize_record_feedback, stored_feedback_parts
+
+CHEF, MANAGER, BRANCH = "Maria Garcia", "Robert", "LA - Downtown"
+DEFAULT_SUBJECT = "Waste Feedback Required – Item (LA - Downtown)"
+
+GOLDEN = [
+    (
+        "Subject: Let's Fix Our $513 Milk Waste – FIFO Alert!\n\n"
+        "Hi [Station Chef's Name],\n\n"
+        "We wasted 12.0 units of Milk at the Dessert Station, 3x the expected amount.\n"
+        "Please rotate stock using FIFO and check expiry dates before prep.\n\n"
+        "Best regards,\n[Your Name]",
+        "Let's Fix Our $513 Milk Waste – FIFO Alert!",
+        "We wasted 12.0 units of Milk at the Dessert Station, 3x the expected amount.\n"
+        "Please rotate stock using FIFO and check expiry dates before prep.",
+    ),
+    (
+        "Subject: Prime Beef expiry issue\n"
+        "Hello Chef Maria,\n"
+        "Dear team,\n"
+        "The Night Shift used Prime Beef two days past expiry.\n"
+        "Thanks,\n"
+        "Robert",
+        "Prime Beef expiry issue",
+        "The Night Shift used Prime Beef two days past expiry.",
+    ),
+    (
+        "Team, we need to address the waste on our Prime Beef. We wasted 5.0 units, "
+        "which is five times the expected amount.",
+        DEFAULT_SUBJECT,
+        "Team, we need to address the waste on our Prime Beef. We wasted 5.0 units, "
+        "which is five times the expected amount.",
+    ),
+    (
+        "  \n\nsubject:   Heat spoilage on the Grill   \n\n"
+        "Hi\n"
+        "Temperatures reached 31°C during lunch.\n"
+        "   Keep proteins refrigerated until service.   \n"
+        "Regards,\n"
+        "[Your Name]\n"
+        "Kitchen Ops",
+        "Heat spoilage on the Grill",
+        "Temperatures reached 31°C during lunch.\nKeep proteins refrigerated until service.",
+    ),
+    (
+        "Subject: Overprep on cold days\r\n"
+        "Dear [Station Chef's Name],\r\n"
+        "\r\n"
+        "Sales dropped while prep stayed the same.\r\n"
+        "Hello again - please scale prep to the forecast.\r\n"
+        "Thank you,\r\n"
+        "[Your Name]\r\n",
+        "Overprep on cold days",
+        "Sales dropped while prep stayed the same.",
+    ),
+    (
+        "Subject: Supplier quality\n"
+        "Our SupplierX deliveries show 40% more waste.\n"
+        "Hi-temperature storage is not the cause.\n"
+        "Hello [Station Chef's Name], please log rejected items.\n"
+        "Best,\n",
+        "Supplier quality",
+        "Our SupplierX deliveries show 40% more waste.\nHi-temperature storage is not the cause.",
+    ),
+    ("Subject: Nothing else\n", "Nothing else", ""),
+    ("", DEFAULT_SUBJECT, ""),
+    ("Hi Chef,\nBEST REGARDS,\nEverything below is a signature.", DEFAULT_SUBJECT, ""),
+    (
+        "Subject: Station inefficiency\n"
+        "1. Weigh trim waste per batch.\n"
+        "2. Report to [Your Name] daily.\n"
+        "Hello from the ops team\n"
+        "best,\n"
+        "[Your Name]",
+        "Station inefficiency",
+        "1. Weigh trim waste per batch.\n2. Report to Robert daily.",
+    ),
+]
+
+
+@pytest.mark.parametrize("raw, subject, body", GOLDEN)
+def test_parse_feedback_golden(raw, subject, body):
+    assert parse_feedback(raw, CHEF, MANAGER, BRANCH) == (subject, body)
+
+
+@pytest.mark.parametrize("raw, subject, body", GOLDEN)
+def test_stored_feedback_keeps_raw_shape(raw, subject, body):
+    stored = sanitize_feedback(raw, CHEF, MANAGER)
+    # Only a subject line the model wrote itself is kept; no default one is added
+    assert stored == (body if subject == DEFAULT_SUBJECT else f"Subject: {subject}\n{body}")
+
+
+# Greeting-like lines after the first few lines of the raw text
+LATE_GREETINGS = [
+    "Dear Chef\nHello all\nWaste up.\nHi temperature on line 2 is the cause.",
+    "Waste up.\nDear team, stock is rotated late.\nCheck dates.\nHi-temperature storage is fine.\nDear me, 3x.",
+    "Hi\nHello\nDear\nHi again\nWaste up.\nHello later.",
+    "Subject: Grill\nOne.\nTwo.\nThree.\nHi there, four.\nBest,\nRobert",
+]
+
+
+@pytest.mark.parametrize("raw", [raw for raw, _, _ in GOLDEN] + LATE_GREETINGS)
+def test_cleaning_is_idempotent(raw):
+    stored = sanitize_feedback(raw, CHEF, MANAGER)
+    assert parse_feedback(stored, CHEF, MANAGER)[1] == parse_feedback(raw, CHEF, MANAGER)[1]
+    assert sanitize_feedback(stored, CHEF, MANAGER) == stored
+
+
+@pytest.mark.parametrize("raw, subject, body", GOLDEN)
+def test_send_path_splits_stored_feedback(raw, subject, body):
+    stored = sanitize_feedback(raw, CHEF, MANAGER)
+    assert stored_feedback_parts(stored, BRANCH) == (subject, body)
+
+
+def test_greetings_after_the_third_kept_line_stay():
+    assert parse_feedback(LATE_GREETINGS[3])[1] == "One.\nTwo.\nThree.\nHi there, four."
+
+
+def test_default_subject_names_the_ingredient():
+    assert parse_feedback("Please weigh trim waste.", CHEF, MANAGER, BRANCH, "Prime Beef") == (
+        "Waste Feedback Required – Prime Beef (LA - Downtown)", "Please weigh trim waste.")
+
+
+def test_placeholders_and_errors_pass_through():
+    record = {"Chef": CHEF, "Branch Manager": MANAGER}
+    for text in ("N/A", "LLM Error generating chef feedback: timeout", "", None):
+        assert sanitize_record_feedback(text, record) == text
+    assert sanitize_record_feedback("Hi [Station Chef's Name],\nCheck dates.", record) == "Check dates."
@@ -0,0 +1,34 @@
+# tests/test_ingestion_followup.py
+"""EventIngester follow-ups: write-back of changed rows only, rollup refresh."""
+import pandas as pd
+
+import ingestion
+from analysis import calculate_branch_metrics
+from config import BRANCH_COLUMN
+from graph import get_graph
+
+
+def test_followup_writes_against_stored_rows_and_refreshes_rollup(dataset_frame, monkeypatch):
+    writes, refreshed = [], []
+    monkeypatch.setattr(ingestion, "update_mysql_data",
+                        lambda df, df_loaded=None: writes.append((df, df_loaded)))
+    monkeypatch.setattr(ingestion, "refresh_rollup", lambda df: refreshed.append(df))
+
+    branch = dataset_frame[BRANCH_COLUMN].iloc[0]
+    month = dataset_frame["Date"].dt.to_period("M")
+    part = dataset_frame[(dataset_frame[BRANCH_COLUMN] == branch) & (month == month.iloc[0])]
+    metrics = calculate_branch_metrics(part.copy())
+    rows = part.head(5)
+
+    ingester = ingestion.EventIngester(get_graph(), followup=True)
+    ingester._followups.put((branch, metrics, rows))
+    ingester._followups.put(None)
+    ingester._followup_worker()
+
+    assert ingester.stats()["followup_done"] == len(rows)
+    (result, stored), = writes
+    assert stored["ID"].tolist() == rows["ID"].tolist()
+    assert (stored["Status"] == ingestion.CRITICAL_STATUS).all()
+    assert (stored["Chef_Feedback"] == "").all()
+    (rolled,) = refreshed
+    pd.testing.assert_frame_equal(rolled, result)
@@ -0,0 +1,27 @@
+# tests/test_jobs_shutdown.py
+"""JobManager.shutdown lets running jobs finish and leaves unstarted ones queued."""
+import threading
+import time
+
+import jobs
+from jobs import QUEUED, JobManager, JobStore
+
+
+def test_shutdown_waits_for_running_jobs(dataset_frame, monkeypatch):
+    started = threading.Event()
+
+    def slow_load(branch_name, year, month_name):
+        started.set()
+        time.sleep(0.3)
+        return dataset_frame.iloc[0:0]
+
+    monkeypatch.setattr(jobs, "load_mysql_data", slow_load)
+    manager = JobManager(app=None, store=JobStore(":memory:"), workers=1)
+    running, _ = manager.submit("Branch A", 2025, "March")
+    queued, _ = manager.submit("Branch B", 2025, "March")
+    assert started.wait(5)
+
+    manager.shutdown()
+    # The empty month fails the job, but it ran to the end before shutdown returned
+    assert manager.store.get(running["id"])["finished_at"] is not None
+    assert manager.store.get(queued["id"])["status"] == QUEUED
@@ -0,0 +1,60 @@
+# tests/test_llm_rate_limit.py
+"""One LLM rate limit per process: dispatchers share the registry's token bucket."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm import SUMMARY
+from llm_dispatcher import LLMDispatcher, LLMJob, skipped_chains
+from llm_registry import get_llm_registry
+
+
+@pytest.fixture
+def paced_registry():
+    registry = get_llm_registry()
+    bucket = registry.rate_limiter
+    previous = (bucket.rate, bucket.capacity)
+    registry.set_rate_limit(20.0, 1)
+    yield registry
+    registry.set_rate_limit(*previous)
+
+
+def test_dispatchers_on_separate_loops_share_one_bucket(paced_registry):
+    def run(offset):
+        jobs = [LLMJob(key=i, kind=SUMMARY, prompt=f"prompt {offset + i}") for i in range(5)]
+        asyncio.run(LLMDispatcher(chains=skipped_chains()).arun(jobs))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=run, args=(offset,)) for offset in (0, 100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # 10 calls at 20/s with no burst: 9 waits of 0.05s, whichever dispatcher sends them
+    assert time.perf_counter() - start >= 0.4
+
+
+def test_explicit_rate_keeps_a_private_bucket(paced_registry):
+    dispatcher = LLMDispatcher(chains=skipped_chains(), rate_per_sec=0)
+    jobs = [LLMJob(key=i, kind=SUMMARY, prompt=f"prompt {i}") for i in range(10)]
+    stats = dispatcher.run(jobs)
+    assert stats.completed == 10
+    assert stats.elapsed_seconds < 0.2
+
+
+def test_batch_on_shared_pool_leaves_the_api_process_a_share(paced_registry, monkeypatch):
+    import batch
+
+    monkeypatch.setattr(batch, "LLM_RATE_LIMIT_PER_SEC", 12.0)
+    monkeypatch.setattr(batch, "LLM_RATE_LIMIT_BURST", 8)
+    bucket = paced_registry.rate_limiter
+    with batch._rate_shared_with_pool(3) as shares:
+        assert shares == 4
+        assert (bucket.rate, bucket.capacity) == (3.0, 2)
+        with batch._rate_shared_with_pool(3):
+            pass
+        # Still shared until the last concurrent batch finishes
+        assert bucket.rate == 3.0
+    assert (bucket.rate, bucket.capacity) == (12.0, 8)
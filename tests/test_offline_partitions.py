@@ -0,0 +1,34 @@
+# tests/test_offline_partitions.py
+"""offline.iter_file_partitions over the (unsorted) bundled CSV and its converted dataset."""
+from datetime import datetime
+
+from offline import convert_csv, iter_file_partitions
+
+from conftest import DATASET_CSV
+
+
+def _ids(partitions):
+    return {key: sorted(part["ID"].tolist()) for key, part in partitions}
+
+
+def test_csv_partitions_match_the_whole_file(dataset_frame):
+    dates = dataset_frame["Date"]
+    expected = {(branch, int(year), month): sorted(part["ID"].tolist())
+                for (branch, year, month), part in dataset_frame.groupby(
+                    [dataset_frame["Branch"].astype(object), dates.dt.year, dates.dt.month_name()])}
+
+    # Rows of one month are spread over many chunks of the unsorted export
+    partitions = list(iter_file_partitions(DATASET_CSV, chunk_rows=100))
+    assert len(partitions) == len(expected)
+    assert _ids(partitions) == expected
+    months = [datetime.strptime(f"{year} {month}", "%Y %B") for (_, year, month), _ in partitions]
+    assert months == sorted(months)
+
+
+def test_csv_and_converted_dataset_give_the_same_partitions(tmp_path):
+    convert_csv(DATASET_CSV, str(tmp_path / "dataset"))
+    branches, months = ["New York - Main"], [(2025, "February"), (2024, "March")]
+    from_csv = list(iter_file_partitions(DATASET_CSV, branches, months))
+    from_dataset = list(iter_file_partitions(str(tmp_path / "dataset"), branches, months))
+    assert [key for key, _ in from_csv] == [key for key, _ in from_dataset]
+    assert _ids(from_csv) == _ids(from_dataset)
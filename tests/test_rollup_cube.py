@@ -0,0 +1,20 @@
+# tests/test_rollup_cube.py
+import pytest
+
+from rollup_cube import RollupCube
+
+
+def test_cost_measures_match_source_sums(dataset_frame):
+    cube = RollupCube(":memory:")
+    try:
+        cube.refresh(dataset_frame)
+        rows = {row["branch"]: row for row in cube.query(group_by=["branch"])}
+    finally:
+        cube.close()
+
+    expected = dataset_frame.groupby("Branch", observed=True)[["Total Cost", "Wastage Cost"]].sum()
+    assert expected["Total Cost"].sum() > 0
+    assert set(rows) == set(expected.index.astype(str))
+    for branch, sums in expected.iterrows():
+        assert rows[str(branch)]["total_cost"] == pytest.approx(sums["Total Cost"])
+        assert rows[str(branch)]["wastage_cost"] == pytest.approx(sums["Wastage Cost"])
@@ -0,0 +1,40 @@
+# tests/test_snapshot_watermark.py
+"""Load snapshots are replaced after in-place Status / Chef_Feedback updates by another writer."""
+import sqlite3
+
+import pandas as pd
+
+from benchmarks.synthetic import generate_waste_logs, write_sqlite_table
+from config import MYSQL_TABLE_NAME
+from db import feedback_digest, load_mysql_data, update_mysql_data
+from snapshot_cache import get_snapshot_cache
+
+BRANCH = "New York - Main"
+
+
+def _execute(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    conn.execute(sql, params)
+    conn.commit()
+    conn.close()
+
+
+def test_in_place_updates_change_the_watermark(sqlite_pool):
+    logs = generate_waste_logs(200, 2025, "February", branches=[BRANCH], seed=3)
+    write_sqlite_table(logs.assign(Status="Pending", Chef_Feedback=""), sqlite_pool)
+    record_id = int(load_mysql_data(BRANCH, 2025, "February")["ID"].iloc[0])
+    hits = get_snapshot_cache().stats()["hits"]
+    load_mysql_data(BRANCH, 2025, "February")
+    hits += 1
+    assert get_snapshot_cache().stats()["hits"] == hits
+
+    _execute(sqlite_pool, f"UPDATE {MYSQL_TABLE_NAME} SET Status = 'Ignore', Chef_Feedback = 'Done.' WHERE ID = ?",
+             (record_id,))
+    fresh = load_mysql_data(BRANCH, 2025, "February").set_index("ID")
+    assert get_snapshot_cache().stats()["hits"] == hits
+    assert fresh.loc[record_id, "Status"] == "Ignore"
+    assert fresh.loc[record_id, "Chef_Feedback_MD5"] == feedback_digest("Done.")
+
+    # The change-skipping write sees the other writer's values and restores the row
+    result = pd.DataFrame({"ID": [record_id], "Status": ["Pending"], "Chef_Feedback_Summary": [""]})
+    assert update_mysql_data(result, df_loaded=fresh.reset_index())["rows_written"] == 1
@@ -0,0 +1,58 @@
+# tests/test_summary_clusters.py
+import pandas as pd
+import pytest
+
+import analysis
+import analysis_cache
+from analysis_cache import AnalysisResultCache
+from benchmarks.synthetic import generate_waste_logs, to_analysis_frame
+from graph import get_graph
+from llm_dispatcher import LLMDispatcher
+
+BRANCH = "Test Branch"
+
+
+@pytest.fixture(scope="module")
+def month_frame():
+    return to_analysis_frame(generate_waste_logs(400, 2025, "March", branches=[BRANCH], seed=7))
+
+
+def _summaries(df: pd.DataFrame) -> pd.DataFrame:
+    return df.set_index("ID")[["LLM_Prompt", "LLM_Summary", "Status"]].sort_index()
+
+
+def test_clusters_share_one_prompt(month_frame):
+    result = analysis.run_branch_analysis(month_frame, BRANCH, get_graph(), dispatcher=LLMDispatcher(chains={}))
+    flagged = result[result["LLM_Prompt"] != ""]
+    shared = flagged[flagged[analysis.SUMMARY_CLUSTER_COLUMN] != ""]
+    assert len(shared) > 0
+    assert (shared["LLM_Prompt"] == shared[analysis.SUMMARY_CLUSTER_COLUMN]).all()
+    assert flagged["LLM_Prompt"].nunique() < len(flagged)
+    assert result["LLM_Summary"].notna().all()
+
+
+def test_clusters_do_not_depend_on_batching_or_cache(month_frame):
+    app = get_graph()
+    whole = analysis.run_branch_analysis(month_frame, BRANCH, app, dispatcher=LLMDispatcher(chains={}))
+    batched = pd.concat([analyzed for _, analyzed in analysis.iter_branch_analysis(
+        month_frame, BRANCH, app, batch_size=50, dispatcher=LLMDispatcher(chains={}))])
+    pd.testing.assert_frame_equal(_summaries(whole), _summaries(batched))
+
+    cache = AnalysisResultCache(":memory:")
+    # First half analyzed alone, then the whole month: clusters are rebuilt over the month
+    metrics = analysis.calculate_branch_metrics(month_frame.copy())
+    first_half = month_frame.iloc[:len(month_frame) // 2]
+    analysis.run_branch_analysis(first_half, BRANCH, app, dispatcher=LLMDispatcher(chains={}),
+                                 branch_metrics=metrics, result_cache=cache)
+    cached = analysis.run_branch_analysis(month_frame, BRANCH, app, dispatcher=LLMDispatcher(chains={}),
+                                          branch_metrics=metrics, result_cache=cache)
+    pd.testing.assert_frame_equal(_summaries(whole), _summaries(cached))
+
+
+def test_grouping_settings_are_part_of_the_cache_context(monkeypatch):
+    before = analysis_cache.config_fingerprint()
+    monkeypatch.setattr(analysis_cache.config, "LLM_SUMMARY_GROUPING", not analysis_cache.config.LLM_SUMMARY_GROUPING)
+    assert analysis_cache.config_fingerprint() != before
+    monkeypatch.undo()
+    monkeypatch.setattr(analysis_cache.config, "LLM_SUMMARY_GROUP_COLUMNS", ("Ingredient", "Shift"))
+    assert analysis_cache.config_fingerprint() != before
@@ -0,0 +1,297 @@
+# timeseries_detection.py
+"""
+Time-series waste detection: each row's waste rate against the recent
+history of its own series (branch x ingredient x kitchen station) instead
+of a multiple of the month's branch average.
+
+For every row, over the previous TS_WINDOW rows of its series in (Date, ID)
+order:
+
+- TS_Baseline: EWMA (span TS_EWMA_SPAN) of the series up to the previous row
+- TS_Median / TS_Robust_Z: rolling median and robust z-score
+  0.6745 * (rate - median) / MAD, the MAD floored at TS_MIN_MAD
+- TS_History: number of rows in the window
+- TS_Anomaly_Flag: at least TS_MIN_HISTORY rows, z above TS_Z_THRESHOLD and
+  the rate above the baseline
+
+timeseries_scores scores a whole frame with array operations. A
+StreamingDetector keeps only the last TS_WINDOW rates and the EWMA of each
+series, so new rows can be scored as they arrive in bounded memory. Scoring
+can start from such a state (`baselines`, as exported by
+StreamingDetector.baselines), which makes scoring history and then new rows
+identical to scoring both in one frame.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    BRANCH_COLUMN,
+    DETECTION_MODE,
+    TS_WINDOW,
+    TS_EWMA_SPAN,
+    TS_Z_THRESHOLD,
+    TS_MIN_HISTORY,
+    TS_MIN_MAD,
+    TS_HISTORY_MONTHS,
+    TS_STREAM_MAX_SERIES,
+)
+from supplier_scorecard import as_datetime
+from utils import safe_rate_series
+
+SERIES_COLUMNS = [BRANCH_COLUMN, "Ingredient", "Kitchen Station"]
+TS_COLUMNS = ["TS_Baseline", "TS_Median", "TS_Robust_Z", "TS_History", "TS_Anomaly_Flag"]
+_MAD_SCALE = 0.6745
+# Rows per block of (rows x window) history matrices
+_CHUNK_ROWS = 32_768
+# Longest series _ewma steps through in Python; longer ones use pandas' ewm
+_EWMA_MAX_STEPS = 4_096
+
+SeriesKey = Tuple[str, str, str]
+# Exported state of one series: [branch, ingredient, station, ewma, [last TS_WINDOW rates]]
+Baselines = List[list]
+
+
+def _series_codes(df: pd.DataFrame) -> Tuple[np.ndarray, List[SeriesKey]]:
+    """Series code of every row and the key of every code (values as str, missing as "")."""
+    n = len(df)
+    combined = np.zeros(n, dtype=np.int64)
+    labels = []
+    for col in SERIES_COLUMNS:
+        if col in df.columns:
+            codes, uniques = pd.factorize(df[col])
+            # Values equal as text share a series; missing values read as ""
+            text_codes, text = pd.factorize(np.array([""] + [str(v) for v in uniques], dtype=object))
+            codes = text_codes[codes + 1]
+        else:
+            codes, text = np.zeros(n, dtype=np.int64), np.array([""], dtype=object)
+        combined = combined * len(text) + codes
+        labels.append((codes, text))
+    _, first, codes = np.unique(combined, return_index=True, return_inverse=True)
+    keys = [tuple(text[col_codes[i]] for col_codes, text in labels) for i in first]
+    return codes.reshape(-1), keys
+
+
+def _row_medians(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # Each row holds `counts` leading valid values (the rest NaN, sorted last)
+    ordered = np.sort(values, axis=1)
+    rows = np.arange(len(values))
+    lo = ordered[rows, np.maximum((counts - 1) // 2, 0)]
+    hi = ordered[rows, np.maximum(counts // 2, 0)]
+    return np.where(counts > 0, (lo + hi) / 2, np.nan)
+
+
+def _window_stats(codes: np.ndarray, values: np.ndarray, window: int, at: np.ndarray):
+    """
+    At positions `at` of a series-sorted array: rows, median and MAD of the
+    previous `window` values of the position's series.
+    """
+    n = len(values)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if n else np.array([], dtype=int)
+    position = np.arange(n) - np.repeat(starts, np.diff(np.r_[starts, n]))
+    history = np.minimum(position[at], window)
+    median = np.full(len(at), np.nan)
+    mad = np.full(len(at), np.nan)
+    lags = np.arange(1, window + 1)
+    for start in range(0, len(at), _CHUNK_ROWS):
+        block = slice(start, start + _CHUNK_ROWS)
+        rows, counts = at[block], history[block]
+        valid = lags[None, :] <= counts[:, None]
+        past = np.where(valid, values[np.maximum(rows[:, None] - lags[None, :], 0)], np.nan)
+        median[block] = _row_medians(past, counts)
+        mad[block] = _row_medians(np.abs(past - median[block, None]), counts)
+    return history, median, mad
+
+
+def _ewma(codes: np.ndarray, values: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    EWMA (pandas' ewm(adjust=False).mean() recurrence) of every series of a
+    series-sorted array, stepping all series one position at a time; many
+    short series (micro-batches) are far cheaper this way than grouped.
+    """
+    n = len(values)
+    out = np.empty(n)
+    if not n:
+        return out
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    lengths = np.diff(np.r_[starts, n])
+    if lengths.max() > _EWMA_MAX_STEPS:
+        return (pd.Series(values).groupby(codes, sort=False).ewm(alpha=alpha, adjust=False).mean()
+                .droplevel(0).sort_index().to_numpy())
+    by_length = np.argsort(-lengths, kind="stable")
+    starts, lengths = starts[by_length], lengths[by_length]
+    out[starts] = values[starts]
+    beta = 1.0 - alpha
+    for step in range(1, lengths[0]):
+        # Series longer than `step` are a prefix of the length-sorted starts
+        idx = starts[:np.searchsorted(-lengths, -step)] + step
+        previous, current = out[idx - 1], values[idx]
+        out[idx] = np.where(previous != current, (beta * previous + alpha * current) / (beta + alpha), current)
+    return out
+
+
+def _score(df: pd.DataFrame, state: Dict[SeriesKey, Tuple[float, np.ndarray]], window: int,
+           span: int) -> Tuple[pd.DataFrame, Dict[SeriesKey, Tuple[float, np.ndarray]]]:
+    """(TS_COLUMNS for every row of `df`, new state of the series it touched)."""
+    n = len(df)
+    columns = {"TS_Baseline": np.full(n, np.nan), "TS_Median": np.full(n, np.nan), "TS_Robust_Z": np.full(n, np.nan),
+               "TS_History": np.zeros(n, dtype=np.int64), "TS_Anomaly_Flag": np.zeros(n, dtype=bool)}
+    date = as_datetime(df["Date"]) if "Date" in df.columns else pd.Series(pd.NaT, index=df.index)
+    dated = np.flatnonzero(date.notna().to_numpy())
+    if not len(dated):
+        return pd.DataFrame(columns, index=df.index), {}
+
+    rows = df.iloc[dated]
+    rate = safe_rate_series(rows["Wastage Qty"], rows["Planned Qty"]).to_numpy(float)
+    codes, keys = _series_codes(rows)
+    ids = pd.to_numeric(rows["ID"], errors="coerce").fillna(0).to_numpy() if "ID" in rows.columns \
+        else np.zeros(len(rows))
+    time_rank = np.empty(len(rows), dtype=np.int64)
+    timestamps = date.iloc[dated].to_numpy().astype("datetime64[ns]").astype(np.int64)
+    time_rank[np.lexsort((ids, timestamps))] = np.arange(len(rows))
+
+    # Seeded series: their stored window precedes the rows (window sequence)
+    # and their stored EWMA is the first value of the EWMA sequence
+    seed_codes, seed_values, seed_order, ewma_codes, ewma_values = [], [], [], [], []
+    for code, key in enumerate(keys):
+        if key in state:
+            ewma, window_rates = state[key]
+            seed_codes.append(np.full(len(window_rates), code))
+            seed_values.append(window_rates)
+            seed_order.append(np.arange(-len(window_rates), 0))
+            ewma_codes.append(code)
+            ewma_values.append(ewma)
+
+    def series_sorted(extra_codes, extra_values, extra_order):
+        all_codes = np.concatenate([extra_codes, codes]).astype(np.int64)
+        all_values = np.concatenate([extra_values, rate])
+        is_row = np.r_[np.zeros(len(extra_codes), bool), np.ones(len(codes), bool)]
+        # Series, then seeds (negative order) and rows by time, as one integer key
+        rank = np.concatenate([extra_order, time_rank])
+        offset = -int(rank.min(initial=0))
+        order = np.argsort(all_codes * (len(codes) + offset) + rank + offset)
+        return all_codes[order], all_values[order], is_row[order], order[is_row[order]] - len(extra_codes)
+
+    empty = np.array([], dtype=np.int64)
+    w_codes, w_values, w_is_row, w_rows = series_sorted(
+        np.concatenate(seed_codes) if seed_codes else empty,
+        np.concatenate(seed_values) if seed_values else np.array([]),
+        np.concatenate(seed_order) if seed_order else empty)
+    history, median, mad = _window_stats(w_codes, w_values, window, np.flatnonzero(w_is_row))
+
+    e_codes, e_values, e_is_row, e_rows = series_sorted(np.asarray(ewma_codes, dtype=np.int64),
+                                                        np.asarray(ewma_values, dtype=float),
+                                                        np.full(len(ewma_codes), -1))
+    ewma = _ewma(e_codes, e_values, 2.0 / (span + 1))
+    first = np.r_[True, e_codes[1:] != e_codes[:-1]]
+    baseline = np.where(first, np.nan, np.r_[np.nan, ewma[:-1]])
+
+    row_baseline = np.empty(len(rows))
+    row_baseline[e_rows] = baseline[e_is_row]
+    row_history = np.empty(len(rows), dtype=np.int64)
+    row_history[w_rows] = history
+    row_median = np.empty(len(rows))
+    row_median[w_rows] = median
+    row_mad = np.empty(len(rows))
+    row_mad[w_rows] = mad
+
+    z = _MAD_SCALE * (rate - row_median) / np.maximum(row_mad, TS_MIN_MAD)
+    with np.errstate(invalid="ignore"):
+        anomaly = (row_history >= TS_MIN_HISTORY) & (z > TS_Z_THRESHOLD) & (rate > row_baseline)
+    for col, values in zip(TS_COLUMNS, (row_baseline, row_median, z, row_history, anomaly)):
+        columns[col][dated] = values
+    scores = pd.DataFrame(columns, index=df.index)
+
+    # New state: last EWMA and last `window` window values of each touched series
+    w_ends = np.r_[np.flatnonzero(w_codes[1:] != w_codes[:-1]), len(w_codes) - 1]
+    e_ends = np.r_[np.flatnonzero(e_codes[1:] != e_codes[:-1]), len(e_codes) - 1]
+    w_starts = np.r_[0, w_ends[:-1] + 1]
+    new_state = {}
+    for start, end, e_end in zip(w_starts, w_ends, e_ends):
+        key = keys[w_codes[end]]
+        new_state[key] = (float(ewma[e_end]), w_values[max(start, end + 1 - window):end + 1].copy())
+    return scores, new_state
+
+
+def _state_from_baselines(baselines: Optional[Baselines]) -> Dict[SeriesKey, Tuple[float, np.ndarray]]:
+    return {(b, i, s): (float(ewma), np.asarray(rates, dtype=float)) for b, i, s, ewma, rates in baselines or []}
+
+
+def timeseries_scores(df: pd.DataFrame, baselines: Optional[Baselines] = None, window: int = TS_WINDOW,
+                      span: int = TS_EWMA_SPAN) -> pd.DataFrame:
+    """TS_COLUMNS for every row of `df` (rows without a Date get no history and no flag)."""
+    scores, _ = _score(df, _state_from_baselines(baselines), window, span)
+    return scores
+
+
+class StreamingDetector:
+    """
+    Bounded-memory scorer for rows arriving over time: per series it keeps
+    the EWMA and the last `window` rates, and at most `max_series` series
+    (least recently updated dropped first).
+    """
+
+    def __init__(self, baselines: Optional[Baselines] = None, window: int = TS_WINDOW, span: int = TS_EWMA_SPAN,
+                 max_series: int = TS_STREAM_MAX_SERIES):
+        self.window = window
+        self.span = span
+        self.max_series = max_series
+        self._lock = threading.Lock()
+        self._state: "OrderedDict[SeriesKey, Tuple[float, np.ndarray]]" = OrderedDict()
+        self._absorb(_state_from_baselines(baselines))
+
+    def _absorb(self, state: Dict[SeriesKey, Tuple[float, np.ndarray]]):
+        for key, value in state.items():
+            self._state[key] = value
+            self._state.move_to_end(key)
+        while len(self._state) > self.max_series:
+            self._state.popitem(last=False)
+
+    def score(self, df: pd.DataFrame) -> pd.DataFrame:
+        """TS_COLUMNS of new rows, each against the history before it; the rows then join the history."""
+        with self._lock:
+            scores, state = _score(df, self._state, self.window, self.span)
+            self._absorb(state)
+        return scores
+
+    def update(self, df: pd.DataFrame):
+        """Adds rows to the history without returning their scores."""
+        self.score(df)
+
+    def extend(self, baselines: Baselines):
+        """Adds exported series state (e.g. from load_history_baselines), replacing the series it covers."""
+        with self._lock:
+            self._absorb(_state_from_baselines(baselines))
+
+    def baselines(self, branch: Optional[str] = None) -> Baselines:
+        """Exported state (of one branch's series), for timeseries_scores or a new detector."""
+        with self._lock:
+            return [[*key, ewma, rates.tolist()] for key, (ewma, rates) in self._state.items()
+                    if branch is None or key[0] == branch]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"series": len(self._state), "max_series": self.max_series, "window": self.window,
+                    "rates_held": int(sum(len(rates) for _, rates in self._state.values()))}
+
+
+def load_history_baselines(branch: str, year: int, month: str, months: int = TS_HISTORY_MONTHS) -> Optional[Baselines]:
+    """
+    Baselines of `branch` from the `months` months before `month` `year` in
+    waste_logs (snapshot-cached loads); None unless DETECTION_MODE is "timeseries".
+    """
+    if DETECTION_MODE != "timeseries":
+        return None
+    from db import load_mysql_data
+
+    start = pd.Timestamp(f"{month} 1, {year}")
+    detector = StreamingDetector()
+    for back in range(months, 0, -1):
+        previous = start - pd.DateOffset(months=back)
+        history = load_mysql_data(branch_name=branch, year=previous.year, month_name=previous.strftime("%B"))
+        if not history.empty:
+            detector.update(history)
+    return detector.baselines(branch)
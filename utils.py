@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 from typing import Dict, Any
 
@@ -9,20 +10,50 @@ def safe_rate(wastage, planned):
     except (TypeError, ZeroDivisionError):
         return 0.0
 
+def safe_rate_series(wastage: pd.Series, planned: pd.Series) -> pd.Series:
+    """Vectorized safe_rate: 0.0 wherever planned is missing or non-positive."""
+    # Compute in float64 even when the loader stored quantities as float32
+    wastage = pd.to_numeric(wastage, errors='coerce').astype(float).fillna(0.0)
+    planned = pd.to_numeric(planned, errors='coerce').astype(float)
+    valid = planned.notna() & (planned > 0)
+    rate = wastage.where(valid, 0.0) / planned.where(valid, 1.0)
+    return rate.where(valid, 0.0).astype(float)
+
 def combined(dev, hr):
     if dev and hr: return "Both"
     if dev: return "Deviation"
     if hr: return "HighRate"
     return "None"
 
+CAUSE_FLAG_COLUMNS = [
+    ("Expiry_Flag", "Expired_Used"),
+    ("Station_Inefficiency", "Station_Inefficiency"),
+    ("Shift_Issue", "Shift_Issue"),
+    ("Peak_Pressure_Issue", "Peak_Pressure"),
+    ("Heat_Spoilage_Flag", "Heat_Spoilage"),
+    ("Cold_Overprep_Flag", "Cold_Overprep"),
+    ("Supplier_Quality_Issue", "Supplier_Quality"),
+    ("Supplier_Rotation_Issue", "Supplier_Rotation"),
+]
+
 def combine_causes(row):
-    causes = []
-    if row.get("Expiry_Flag"): causes.append("Expired_Used")
-    if row.get("Station_Inefficiency"): causes.append("Station_Inefficiency")
-    if row.get("Shift_Issue"): causes.append("Shift_Issue")
-    if row.get("Peak_Pressure_Issue"): causes.append("Peak_Pressure")
-    if row.get("Heat_Spoilage_Flag"): causes.append("Heat_Spoilage")
-    if row.get("Cold_Overprep_Flag"): causes.append("Cold_Overprep")
-    if row.get("Supplier_Quality_Issue"): causes.append("Supplier_Quality")
-    if row.get("Supplier_Rotation_Issue"): causes.append("Supplier_Rotation")
-    return ";".join(causes) if causes else "None"
\ No newline at end of file
+    causes = [cause for flag_col, cause in CAUSE_FLAG_COLUMNS if row.get(flag_col)]
+    return ";".join(causes) if causes else "None"
+
+def combined_series(dev: pd.Series, hr: pd.Series) -> pd.Series:
+    """Vectorized combined()."""
+    dev = dev.astype(bool)
+    hr = hr.astype(bool)
+    values = np.select([dev & hr, dev, hr], ["Both", "Deviation", "HighRate"], default="None")
+    return pd.Series(values, index=dev.index, dtype=object)
+
+def combine_causes_frame(df: pd.DataFrame) -> pd.Series:
+    """Vectorized combine_causes() over the flag columns of a whole frame."""
+    causes = pd.Series("", index=df.index, dtype=object)
+    for flag_col, cause in CAUSE_FLAG_COLUMNS:
+        if flag_col not in df.columns:
+            continue
+        mask = df[flag_col].astype(bool)
+        causes = causes.where(~mask, causes + ";" + cause)
+    causes = causes.str.lstrip(";")
+    return causes.where(causes != "", "None")
\ No newline at end of file